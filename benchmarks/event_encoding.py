@@ -0,0 +1,87 @@
+# benchmarks/event_encoding.py
+
+"""
+Events/second a single worker can serialize for each encoder, wire format and compression.
+
+    python benchmarks/event_encoding.py [--seconds 1.0]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from marketpulse.utils import wire_format  # noqa: E402
+from marketpulse.utils.wire_format import available_formats, compress_stream  # noqa: E402
+
+
+def recommendation_event(holdings: int = 60) -> dict:
+    """A task_complete event shaped like a real recommendations payload (tens of KB)"""
+    return {
+        "type": "task_complete",
+        "task": "recommendations",
+        "data": {
+            "trading_recommendations": [
+                {
+                    "ticker": f"T{i:03d}",
+                    "company": f"Company {i} Holdings Inc.",
+                    "action": ["buy", "hold", "sell"][i % 3],
+                    "confidence": "medium",
+                    "target_allocation": round(100 / holdings, 2),
+                    "rationale": "Sentiment improved after earnings; sector momentum positive. " * 3,
+                    "risks": ["rate sensitivity", "supply chain", "valuation"]
+                }
+                for i in range(holdings)
+            ],
+            "summary": "Maintain core technology exposure while trimming concentrated positions. " * 10
+        }
+    }
+
+
+def measure(label: str, encode, seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        encode()
+        count += 1
+    rate = count / (time.perf_counter() - started)
+    print(f"{label:<32} {rate:>12,.0f} events/s")
+    return rate
+
+
+async def _compress_all(chunks, encoding):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    return [part async for part in compress_stream(source(), encoding)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stream event serialization")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Time budget per measurement")
+    args = parser.parse_args()
+
+    event = recommendation_event()
+    print(f"payload: {len(wire_format.ENCODERS['json'](event)) / 1024:.1f} KB as JSON\n")
+
+    for name, encoder in wire_format.ENCODERS.items():
+        wire_format.dumps = encoder
+        for fmt in available_formats():
+            measure(f"{name} / {fmt}", lambda: wire_format.encode_event(event, fmt, "run:1"), args.seconds)
+
+    wire_format.dumps = wire_format.get_encoder()
+    chunk = wire_format.encode_event(event, "sse", "run:1")
+    for encoding in ("gzip", "br"):
+        if encoding == "br" and wire_format.brotli is None:
+            continue
+        compressed = sum(len(part) for part in asyncio.run(_compress_all([chunk], encoding)))
+        print(f"\n{encoding}: {len(chunk)} -> {compressed} bytes per event")
+        compressor = wire_format.StreamCompressor(encoding)
+        measure(f"sse + {encoding}", lambda: compressor.compress(wire_format.encode_event(event, "sse", "run:1")), args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# benchmarks/hot_paths.py
+
+"""
+Per-call cost of the code that runs on every stage, tool call or streamed event.
+
+    python benchmarks/hot_paths.py [--entries 10000] [--filter clean_json] [--against <commit>] [--no-save] [--json]
+
+Corpora:
+  - the checked-in market_analysis_2025-03-2*.json reports, one stage output per LLM response
+  - synthetic malformed LLM responses built from them (prose around fences, trailing commas,
+    escaped quotes, truncation)
+  - tool and stage cache directories of --entries files each, so lookups hit a realistically full directory
+
+Each run is appended to benchmarks/results/hot_paths.jsonl with its commit, flagged dirty when the
+tree had uncommitted changes (so the numbers are not that commit's), and compared with the previous
+run (or the latest clean run of --against <commit>).
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from marketpulse.clean_json import clean_and_parse_json  # noqa: E402
+from marketpulse.utils.stage_cache import StageCache  # noqa: E402
+from marketpulse.utils.stream_utils import StreamEvent, format_sse_event, process_task_result  # noqa: E402
+from marketpulse.utils.wire_format import encode_event  # noqa: E402
+
+RESULTS_FILE = os.path.join(ROOT, "benchmarks", "results", "hot_paths.jsonl")
+
+
+def load_reports() -> List[Dict[str, Any]]:
+    """Stage outputs from the checked-in analysis reports"""
+    outputs = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "market_analysis_2025-03-2*.json"))):
+        with open(path, "r") as f:
+            outputs.extend(json.load(f).values())
+    return outputs
+
+
+def llm_responses(outputs: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Raw LLM answers as the parsers see them, clean and in the malformed shapes agents produce"""
+    clean = [json.dumps(output, indent=2) for output in outputs]
+    return {
+        "valid": clean,
+        "fenced": [f"Here is the analysis you asked for.\n\n```json\n{text}\n```\n\nLet me know if you need more." for text in clean],
+        "trailing_commas": [text.replace("\n    }", ",\n    }").replace("\n  ]", ",\n  ]") for text in clean],
+        "escaped_quotes": [text.replace('"', '\\"') for text in clean],
+        "truncated": [text[:len(text) // 2] for text in clean]
+    }
+
+
+def run_coroutine(coroutine) -> Any:
+    """Drive a coroutine that never really suspends, without an event loop's per-call overhead"""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def cycle(values: List[Any]) -> Callable[[], Any]:
+    """Next corpus item on every call, so one case covers the whole corpus"""
+    state = {"index": 0}
+
+    def next_value():
+        value = values[state["index"] % len(values)]
+        state["index"] += 1
+        return value
+    return next_value
+
+
+def quietly(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Swallow exceptions and the parsers' debug prints; failing inputs are part of the corpus"""
+    def call():
+        try:
+            return fn()
+        except Exception:
+            return None
+    return call
+
+
+def populate_caches(workdir: str, entries: int, payload: str) -> Dict[str, str]:
+    """Fill the tool caches and a stage cache with `entries` files each; returns one cached key per cache"""
+    now = time.time()
+    for directory, name in (("news", "query_{}"), ("quotes", "T{}"), ("influencers", "person_{}")):
+        path = os.path.join(workdir, ".cache", directory)
+        os.makedirs(path, exist_ok=True)
+        for i in range(entries):
+            file_path = os.path.join(path, f"{name.format(i)}.json")
+            with open(file_path, "w") as f:
+                f.write(payload)
+            os.utime(file_path, (now, now))
+    stages = StageCache(os.path.join(workdir, ".cache", "stages"), enabled=True)
+    for i in range(entries):
+        stages.set(f"{i:064x}", payload, stage="collect_global_news_task")
+    return {"news": "query 42", "quote": "T42", "influencer": "person 42", "stage": f"{42:064x}"}
+
+
+def build_cases(outputs: List[Dict[str, Any]], workdir: str, entries: int) -> Dict[str, Callable[[], Any]]:
+    responses = llm_responses(outputs)
+    cases: Dict[str, Callable[[], Any]] = {}
+
+    for shape, texts in responses.items():
+        text = cycle(texts)
+        cases[f"clean_and_parse_json/{shape}"] = quietly(lambda text=text: clean_and_parse_json(text()))
+        cases[f"process_task_result/{shape}"] = quietly(lambda text=text: run_coroutine(process_task_result("stage", text())))
+
+    try:
+        from marketpulse.flows.market_analysis_flow import MarketSentimentFlow
+    except Exception as e:
+        print(f"Skipping _extract_json_from_response: {e}", file=sys.stderr)
+    else:
+        for shape, texts in responses.items():
+            text = cycle(texts)
+            # It never touches self, so call it unbound rather than build a whole flow
+            cases[f"extract_json_from_response/{shape}"] = quietly(
+                lambda text=text: MarketSentimentFlow._extract_json_from_response(None, text())
+            )
+
+    # The largest report section as a task_complete event, the biggest thing a stream carries
+    largest = max(outputs, key=lambda output: len(json.dumps(output)))
+    event = StreamEvent("task_complete", task="recommendations", data=largest)
+    cases["event/to_dict"] = event.to_dict
+    cases["event/encode_sse"] = lambda: encode_event(event.to_dict(), "sse", "0123456789abcdef:12")
+    cases["event/encode_ndjson"] = lambda: encode_event(event.to_dict(), "ndjson", "0123456789abcdef:12")
+    cases["event/format_sse_event"] = lambda: format_sse_event(event.to_dict(), "0123456789abcdef:12")
+
+    keys = populate_caches(workdir, entries, json.dumps(largest))
+    stages = StageCache(os.path.join(workdir, ".cache", "stages"), enabled=True)
+    cases[f"stage_cache/hit_{entries}"] = lambda: stages.get(keys["stage"])
+    cases[f"stage_cache/miss_{entries}"] = lambda: stages.get("f" * 64)
+    # Only cache hits run, so the providers are never called; the search wrapper still wants a key
+    os.environ.setdefault("BING_SUBSCRIPTION_KEY", "unused")
+    try:
+        from marketpulse.tools.market_tool import FinancialNewsSearchTool, InfluencerMonitorTool, StockQuoteTool
+        news, quotes, influencers = FinancialNewsSearchTool(), StockQuoteTool(), InfluencerMonitorTool()
+    except Exception as e:
+        print(f"Skipping tool cache checks: {e}", file=sys.stderr)
+    else:
+        cases[f"tool_cache/news_hit_{entries}"] = lambda: news._run(keys["news"])
+        cases[f"tool_cache/quote_hit_{entries}"] = lambda: quotes._run(keys["quote"])
+        cases[f"tool_cache/influencer_hit_{entries}"] = lambda: influencers._run(keys["influencer"])
+    return cases
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best of `repeat` rounds, each long enough (>= 0.2s) to be timed reliably, in microseconds per call"""
+    timer = timeit.Timer(fn)
+    calls, _ = timer.autorange()
+    rounds = timer.repeat(repeat=repeat, number=calls)
+    return {"us_per_call": round(min(rounds) / calls * 1e6, 3), "calls": calls}
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def tree_dirty() -> Optional[bool]:
+    """Whether tracked files differ from HEAD, ignoring the results history itself"""
+    try:
+        return bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no", "--", ".", ":!benchmarks/results"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results: Dict[str, Any], previous: Dict[str, Any]):
+    print(f"\n{'case':<44} {'before us':>10} {'after us':>10} {'change':>8}")
+    for case, result in results.items():
+        before = previous.get(case)
+        if before is None:
+            continue
+        change = result["us_per_call"] / before["us_per_call"] - 1 if before["us_per_call"] else 0.0
+        print(f"{case:<44} {before['us_per_call']:>10.2f} {result['us_per_call']:>10.2f} {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark JSON cleanup, cache lookups and event formatting")
+    parser.add_argument("--entries", type=int, default=10000, help="Files per cache directory")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per case (the best is kept)")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON-lines history of runs")
+    parser.add_argument("--against", help="Compare with the latest clean run of this commit instead of the previous run")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    parser.add_argument("--json", action="store_true", help="Print this run as JSON")
+    args = parser.parse_args()
+
+    outputs = load_reports()
+    if not outputs:
+        print("No market_analysis_2025-03-2*.json reports found")
+        sys.exit(1)
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ["USAGE_LOG_DIR"] = os.path.join(workdir, ".logs", "usage")
+        cases = build_cases(outputs, workdir, args.entries)
+        # The parsers print and log every response they fail on; keep that out of the report
+        logging.disable(logging.CRITICAL)
+        with open(os.devnull, "w") as devnull:
+            for name, fn in cases.items():
+                if args.filter and args.filter not in name:
+                    continue
+                with contextlib.redirect_stdout(devnull):
+                    results[name] = measure(fn, args.repeat)
+                if not args.json:
+                    print(f"{name:<44} {results[name]['us_per_call']:>12.2f} us/call", flush=True)
+        logging.disable(logging.NOTSET)
+        os.chdir(ROOT)
+
+    run = {
+        "commit": current_commit(),
+        "dirty": tree_dirty(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "entries": args.entries,
+        "results": results
+    }
+    if args.json:
+        print(json.dumps(run, indent=2))
+
+    history = load_history(args.results)
+    if args.against:
+        previous = next(
+            (entry for entry in reversed(history) if entry.get("commit") == args.against and not entry.get("dirty")), None
+        )
+        if previous is None:
+            print(f"No clean recorded run for commit {args.against}")
+    else:
+        previous = history[-1] if history else None
+    if previous is not None and not args.json:
+        dirty = " with uncommitted changes" if previous.get("dirty") else ""
+        print(f"\nCompared with {previous.get('commit')}{dirty} ({previous.get('timestamp')}):")
+        compare(results, previous["results"])
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, "a") as f:
+            f.write(json.dumps(run) + "\n")
+
+
+if __name__ == "__main__":
+    main()
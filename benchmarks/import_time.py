@@ -0,0 +1,82 @@
+# benchmarks/import_time.py
+
+"""
+Cold import time of the API and CLI entry points, measured with `python -X importtime` in fresh interpreters.
+
+    python benchmarks/import_time.py [--runs 5] [--top 10] [--json] [--max-ms 1500]
+
+Each run is a new process, so bytecode caches are warm but no module is already imported.
+Exits non-zero when the median of any target exceeds --max-ms.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+TARGETS = ["marketpulse.main", "marketpulse.cli"]
+
+
+def import_profile(module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds for every module pulled in by importing `module`"""
+    env = {**os.environ, "PYTHONPATH": SRC + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def measure(module: str, runs: int) -> Tuple[float, List[Tuple[str, float]]]:
+    """Median total milliseconds, plus the slowest modules from the median run"""
+    profiles = sorted((import_profile(module) for _ in range(runs)), key=lambda p: p.get(module, 0))
+    median = profiles[len(profiles) // 2]
+    total_ms = statistics.median(p.get(module, 0) for p in profiles) / 1000
+    heaviest = sorted(
+        ((name, us / 1000) for name, us in median.items() if name != module), key=lambda item: item[1], reverse=True
+    )
+    return total_ms, heaviest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the entry points")
+    parser.add_argument("modules", nargs="*", default=TARGETS, help="Modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--max-ms", type=float, help="Fail if any median import exceeds this budget")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        total_ms, heaviest = measure(module, args.runs)
+        results[module] = {"median_ms": round(total_ms, 1), "heaviest": [[name, round(ms, 1)] for name, ms in heaviest[:args.top]]}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, result in results.items():
+            print(f"{module}: {result['median_ms']:.0f} ms (median of {args.runs})")
+            for name, ms in result["heaviest"]:
+                print(f"    {ms:>8.1f} ms  {name}")
+
+    over = [module for module, result in results.items() if args.max_ms and result["median_ms"] > args.max_ms]
+    if over:
+        print(f"Over the {args.max_ms:.0f} ms budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# benchmarks/load_test.py
+
+"""
+How many concurrent /api/sentiment/analyze streams one worker sustains.
+
+    python benchmarks/load_test.py [--concurrency 1,4,16,64] [--backend synthetic|stubs] [--url URL]
+        [--stage-latency-ms 200] [--job-workers 16] [--format sse|ndjson] [--json]
+
+Without --url the app is served in this process by uvicorn on a localhost port, with either a
+synthetic flow (--backend synthetic: six stages that sleep and emit recommendation-sized events)
+or the real flows against the stub LLM and providers from stubs.py (--backend stubs). With --url
+an already running server is loaded instead.
+
+Every client sends a distinct portfolio from its own X-Forwarded-For address, so streams neither
+share a flow nor trip the per-client limit (a --url server needs TRUSTED_PROXY_COUNT=1 for that). Per concurrency level it reports time to first event,
+gaps between events, completion latency percentiles, completed streams per second and the error
+rate (HTTP errors such as 429, error events and streams that ended without completing), then
+names the knee: the last level where throughput still grew by at least 10% without errors.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from stubs import StubServers, canned_answer  # noqa: E402
+
+SYNTHETIC_STAGES = [
+    "global_news", "portfolio_news", "influencer_data", "sentiment_analysis", "portfolio_metrics", "recommendations"
+]
+
+
+def synthetic_runner(stage_latency: float, padding_kb: int):
+    """A stand-in flow: every stage sleeps for stage_latency, then emits a result of realistic size"""
+    result = json.loads(canned_answer(padding_kb))
+
+    async def runner(portfolio: Dict[str, Any], preferences: Dict[str, Any], **options):
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        for stage in SYNTHETIC_STAGES:
+            yield {"type": "status", "message": f"Running {stage}...", "task": stage}
+            await asyncio.sleep(stage_latency)
+            yield {"type": "task_complete", "task": stage, "data": result}
+        yield {"type": "complete", "message": "Market sentiment analysis complete"}
+    return runner
+
+
+def client_request(index: int) -> Dict[str, Any]:
+    """A portfolio unique to this client, so identical-request deduplication does not kick in"""
+    return {
+        "portfolio": {"holdings": [
+            {"ticker": "AAPL", "company": "Apple Inc.", "allocation": 10 + index % 50, "sector": "Technology"},
+            {"ticker": f"L{index:04d}", "company": f"Load Client {index}", "allocation": 5, "sector": "Industrials"}
+        ]},
+        "preferences": {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+    }
+
+
+class InProcessServer:
+    """The FastAPI app under uvicorn on a free localhost port, in a background thread"""
+
+    def __init__(self, app):
+        import uvicorn
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="load-test-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "InProcessServer":
+        self.thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not start within 30s")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def run_client(http: httpx.AsyncClient, index: int, wire_format: str) -> Dict[str, Any]:
+    """Open one analysis stream and time its events"""
+    accept = "application/x-ndjson" if wire_format == "ndjson" else "text/event-stream"
+    headers = {"Accept": accept, "X-Forwarded-For": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+    started = time.perf_counter()
+    arrivals: List[float] = []
+    outcome = "incomplete"
+    try:
+        async with http.stream("POST", "/api/sentiment/analyze", json=client_request(index), headers=headers) as response:
+            if response.status_code != 200:
+                return {"outcome": f"http_{response.status_code}", "arrivals": [], "total": time.perf_counter() - started}
+            async for line in response.aiter_lines():
+                payload = line[len("data:"):].strip() if line.startswith("data:") else line.strip()
+                if wire_format == "sse" and not line.startswith("data:"):
+                    continue
+                if not payload:
+                    continue
+                arrivals.append(time.perf_counter() - started)
+                event_type = json.loads(payload).get("type")
+                if event_type == "error":
+                    outcome = "error_event"
+                elif event_type == "complete":
+                    outcome = "completed"
+    except httpx.HTTPError as e:
+        outcome = f"transport_{type(e).__name__}"
+    return {"outcome": outcome, "arrivals": arrivals, "total": time.perf_counter() - started}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))], 4)
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 4)}
+
+
+async def run_level(base_url: str, concurrency: int, offset: int, wire_format: str, timeout: float) -> Dict[str, Any]:
+    """Start `concurrency` streams at once and summarize them"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as http:
+        started = time.perf_counter()
+        runs = await asyncio.gather(*(run_client(http, offset + i, wire_format) for i in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    completed = [run for run in runs if run["outcome"] == "completed"]
+    outcomes: Dict[str, int] = {}
+    for run in runs:
+        outcomes[run["outcome"]] = outcomes.get(run["outcome"], 0) + 1
+    gaps = [later - earlier for run in runs for earlier, later in zip(run["arrivals"], run["arrivals"][1:])]
+    return {
+        "concurrency": concurrency,
+        "completed": len(completed),
+        "error_rate": round(1 - len(completed) / concurrency, 4),
+        "outcomes": outcomes,
+        "streams_per_second": round(len(completed) / wall, 3),
+        "time_to_first_event": percentiles([run["arrivals"][0] for run in runs if run["arrivals"]]),
+        "inter_event_gap": percentiles(gaps),
+        "completion": percentiles([run["total"] for run in completed])
+    }
+
+
+def find_knee(levels: List[Dict[str, Any]], min_gain: float = 0.10) -> Optional[int]:
+    """Last concurrency level that still added at least min_gain throughput without any errors"""
+    knee = None
+    previous = None
+    for level in levels:
+        if level["error_rate"] > 0:
+            break
+        if previous is not None and level["streams_per_second"] < previous * (1 + min_gain):
+            break
+        knee = level["concurrency"]
+        previous = level["streams_per_second"]
+    return knee
+
+
+def print_levels(levels: List[Dict[str, Any]]):
+    print(f"{'clients':>7} {'ok':>5} {'err%':>6} {'streams/s':>10} {'ttfe p50':>9} {'ttfe p95':>9} "
+          f"{'gap p95':>8} {'gap max':>8} {'done p50':>9} {'done p95':>9} {'done p99':>9}")
+    for level in levels:
+        ttfe, gap, done = level["time_to_first_event"], level["inter_event_gap"], level["completion"]
+
+        def cell(value, width):
+            return f"{value:>{width}.3f}" if value is not None else f"{'-':>{width}}"
+        print(f"{level['concurrency']:>7} {level['completed']:>5} {level['error_rate'] * 100:>6.1f} "
+              f"{level['streams_per_second']:>10.3f} {cell(ttfe['p50'], 9)} {cell(ttfe['p95'], 9)} "
+              f"{cell(gap['p95'], 8)} {cell(gap['max'], 8)} {cell(done['p50'], 9)} {cell(done['p95'], 9)} "
+              f"{cell(done['p99'], 9)}")
+        failures = {outcome: count for outcome, count in level["outcomes"].items() if outcome != "completed"}
+        if failures:
+            print(f"        failures: {failures}")
+
+
+def sweep(base_url: str, concurrency_levels: List[int], wire_format: str, timeout: float) -> List[Dict[str, Any]]:
+    levels = []
+    offset = 0
+    for concurrency in concurrency_levels:
+        levels.append(asyncio.run(run_level(base_url, concurrency, offset, wire_format, timeout)))
+        # New client identities and portfolios per level, so nothing carries over between levels
+        offset += concurrency
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test concurrent analysis streams")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrent stream counts to sweep")
+    parser.add_argument("--url", help="Load an already running server instead of serving the app in-process")
+    parser.add_argument("--backend", choices=["synthetic", "stubs"], default="synthetic",
+                        help="In-process flow: synthetic stages, or the real flows against stub backends")
+    parser.add_argument("--stage-latency-ms", type=float, default=200,
+                        help="Per-stage latency (synthetic) or per-LLM-call latency (stubs)")
+    parser.add_argument("--padding-kb", type=int, default=4, help="Extra KB in each stage result")
+    parser.add_argument("--job-workers", type=int, default=None,
+                        help="Concurrent flows for the in-process server (default: the largest concurrency level)")
+    parser.add_argument("--format", choices=["sse", "ndjson"], default="sse", help="Stream format to request")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds before a stream counts as failed")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    if args.url:
+        levels = sweep(args.url.rstrip("/"), concurrency_levels, args.format, args.timeout)
+    else:
+        os.environ.setdefault("DEMO_REFRESH_SECONDS", "0")
+        # Clients are told apart by the X-Forwarded-For address they send, as if behind one proxy
+        os.environ.setdefault("TRUSTED_PROXY_COUNT", "1")
+        os.environ.setdefault("PREWARM_IMPORTS", "false" if args.backend == "synthetic" else "true")
+        stubs = StubServers(llm_latency=args.stage_latency_ms / 1000, padding_kb=args.padding_kb).start()
+        try:
+            if args.backend == "stubs":
+                stubs.configure_environment()
+            from marketpulse import jobs
+            from marketpulse.main import app
+            runner = synthetic_runner(args.stage_latency_ms / 1000, args.padding_kb) if args.backend == "synthetic" else None
+            workers = args.job_workers or max(concurrency_levels)
+            # Admission limits sized to the sweep, so the server's own capacity is what gets measured
+            jobs._job_manager = jobs.JobManager(
+                runner=runner, workers=workers, max_queued=max(concurrency_levels), max_per_client=1
+            )
+            with InProcessServer(app) as server:
+                levels = sweep(server.url, concurrency_levels, args.format, args.timeout)
+        finally:
+            stubs.stop()
+
+    knee = find_knee(levels)
+    if args.json:
+        print(json.dumps({"levels": levels, "knee": knee}, indent=2))
+        return
+    print_levels(levels)
+    print(f"\nKnee: {knee} concurrent streams" if knee else "\nKnee: errors or no scaling from the first level")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# benchmarks/pipeline.py
+
+"""
+End-to-end latency, throughput and memory of MarketSentimentFlow and ResumeCustomizationFlow,
+run offline against local stand-ins for the LLM, Bing and Alpha Vantage (see stubs.py).
+
+    python benchmarks/pipeline.py [--flows market,resume] [--concurrency 1,4,16] [--rounds 3]
+        [--llm-latency-ms 200] [--search-latency-ms 50] [--quote-latency-ms 20]
+        [--baseline benchmarks/baselines/pipeline.json] [--save-baseline] [--require-baseline] [--tolerance 0.25] [--json]
+
+Each concurrency level runs that many flows at once in a fresh working directory, so tool caches
+start cold; the stage cache is disabled. Levels are repeated --rounds times and the best figure of
+each kept, as a single round of threaded crews is too noisy to compare. Reports per-stage and total latency, flows per minute and
+the process memory high-water mark. With a baseline recorded for the same settings, exits non-zero
+when p50 latency or a stage got slower, or throughput dropped, by more than --tolerance. A missing or
+non-matching baseline, or runs it has no results for, is only a warning, unless --require-baseline
+(as in CI) makes it a failure. Each flow is built once before its first level, so import time isn't counted.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from stubs import StubServers  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "pipeline.json")
+
+RESUME_INPUT = {
+    "resume_data": {
+        "name": "Alex Doe",
+        "experience": [
+            {"title": "Backend Engineer", "company": "Acme", "years": 4,
+             "highlights": ["Built streaming APIs", "Cut p95 latency by 40%"]}
+        ],
+        "skills": ["Python", "FastAPI", "PostgreSQL", "Kubernetes"]
+    },
+    "job_description": "Senior Python engineer to build low-latency market data services.",
+    "company_name": "Example Capital"
+}
+
+
+def load_example(name: str) -> Dict[str, Any]:
+    with open(os.path.join(ROOT, "examples", name), "r") as f:
+        return json.load(f)
+
+
+def make_flow(name: str):
+    """A fresh flow instance; imported lazily so the stub environment is in place first"""
+    if name == "market":
+        from marketpulse.flows.market_analysis_flow import MarketSentimentFlow
+        return MarketSentimentFlow(load_example("portfolio.json"), load_example("preferences.json"))
+    if name == "resume":
+        from resumepulse.flows.resume_customization_flow import ResumeCustomizationFlow
+        return ResumeCustomizationFlow(**RESUME_INPUT)
+    raise ValueError(f"Unknown flow {name}; use market or resume")
+
+
+def warm_up(name: str):
+    """Import the flow and build one instance untimed, so the first level doesn't pay crewai's import cost"""
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        make_flow(name)
+        os.chdir(ROOT)
+
+
+async def run_flow(name: str) -> Dict[str, Any]:
+    """Run one flow to completion, timing each stage from its status event to its result"""
+    flow = make_flow(name)
+    started = time.perf_counter()
+    stage_started: Dict[str, float] = {}
+    stages: Dict[str, float] = {}
+    ok = False
+    async for event in flow.iter_events():
+        now = time.perf_counter()
+        if event.type == "status" and event.task:
+            stage_started[event.task] = now
+        elif event.type in ("task_complete", "error") and event.task in stage_started:
+            stages[event.task] = now - stage_started.pop(event.task)
+        if event.type == "complete":
+            ok = True
+    return {"total": time.perf_counter() - started, "stages": stages, "ok": ok}
+
+
+def peak_rss_mb() -> float:
+    """Process memory high-water mark so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_level(name: str, concurrency: int) -> Dict[str, Any]:
+    """Run `concurrency` flows at once and summarize them"""
+    started = time.perf_counter()
+    runs = await asyncio.gather(*(run_flow(name) for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    totals = [run["total"] for run in runs]
+    stage_names = sorted({stage for run in runs for stage in run["stages"]})
+    return {
+        "flows": concurrency,
+        "failed": sum(1 for run in runs if not run["ok"]),
+        "p50_seconds": round(statistics.median(totals), 3),
+        "p95_seconds": round(percentile(totals, 0.95), 3),
+        "throughput_per_minute": round(concurrency / wall * 60, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": {
+            stage: round(statistics.mean(run["stages"][stage] for run in runs if stage in run["stages"]), 3)
+            for stage in stage_names
+        }
+    }
+
+
+def best_of(rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The best of each figure across rounds of one level (failures and memory take the worst)"""
+    stage_names = sorted({stage for result in rounds for stage in result["stages"]})
+    return {
+        "flows": rounds[0]["flows"],
+        "rounds": len(rounds),
+        "failed": max(result["failed"] for result in rounds),
+        "p50_seconds": min(result["p50_seconds"] for result in rounds),
+        "p95_seconds": min(result["p95_seconds"] for result in rounds),
+        "throughput_per_minute": max(result["throughput_per_minute"] for result in rounds),
+        "peak_rss_mb": max(result["peak_rss_mb"] for result in rounds),
+        "stages": {
+            stage: min(result["stages"][stage] for result in rounds if stage in result["stages"])
+            for stage in stage_names
+        }
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions against the baseline; stages under 50ms are too noisy to judge"""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if result["failed"] > before.get("failed", 0):
+            regressions.append(f"{key}: failed flows {before.get('failed', 0)} -> {result['failed']}")
+        if result["p50_seconds"] > before["p50_seconds"] * (1 + tolerance):
+            regressions.append(f"{key}: p50 {before['p50_seconds']}s -> {result['p50_seconds']}s")
+        if result["throughput_per_minute"] < before["throughput_per_minute"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {before['throughput_per_minute']} -> {result['throughput_per_minute']} flows/min"
+            )
+        for stage, seconds in result["stages"].items():
+            previous = before["stages"].get(stage)
+            if previous is not None and previous >= 0.05 and seconds > previous * (1 + tolerance):
+                regressions.append(f"{key}: stage {stage} {previous}s -> {seconds}s")
+    return regressions
+
+
+def print_results(results: Dict[str, Any]):
+    print(f"{'run':<14} {'p50 s':>8} {'p95 s':>8} {'flows/min':>10} {'failed':>7} {'peak MB':>8}")
+    for key, result in results.items():
+        print(f"{key:<14} {result['p50_seconds']:>8.3f} {result['p95_seconds']:>8.3f} "
+              f"{result['throughput_per_minute']:>10.2f} {result['failed']:>7} {result['peak_rss_mb']:>8.1f}")
+        for stage, seconds in result["stages"].items():
+            print(f"    {stage:<28} {seconds:>8.3f}s")
+
+
+def warn_unchecked(reason: str, required: bool):
+    print(f"WARNING {reason}", file=sys.stderr)
+    if required:
+        sys.exit(2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipelines offline against stub backends")
+    parser.add_argument("--flows", default="market,resume", help="Comma-separated flows: market, resume")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated numbers of concurrent flows")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each level is run; the best figures are kept")
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="Injected latency per LLM call")
+    parser.add_argument("--search-latency-ms", type=float, default=50, help="Injected latency per Bing search")
+    parser.add_argument("--quote-latency-ms", type=float, default=20, help="Injected latency per Alpha Vantage quote")
+    parser.add_argument("--padding-kb", type=int, default=4, help="Extra KB in each LLM answer")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Record these results as the new baseline")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="Fail when there is no baseline recorded for these settings")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing, as a fraction")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    settings = {
+        "llm_latency_ms": args.llm_latency_ms,
+        "search_latency_ms": args.search_latency_ms,
+        "quote_latency_ms": args.quote_latency_ms,
+        "padding_kb": args.padding_kb
+    }
+    stubs = StubServers(args.llm_latency_ms / 1000, args.search_latency_ms / 1000, args.quote_latency_ms / 1000,
+                        padding_kb=args.padding_kb)
+    results: Dict[str, Any] = {}
+    with stubs:
+        stubs.configure_environment()
+        for name in [flow.strip() for flow in args.flows.split(",") if flow.strip()]:
+            warm_up(name)
+            for concurrency in [int(level) for level in args.concurrency.split(",")]:
+                rounds = []
+                for _ in range(args.rounds):
+                    # Fresh working directory per round, so every round starts with cold tool caches
+                    with tempfile.TemporaryDirectory() as workdir:
+                        os.chdir(workdir)
+                        rounds.append(asyncio.run(run_level(name, concurrency)))
+                        os.chdir(ROOT)
+                results[f"{name}@{concurrency}"] = best_of(rounds)
+
+    if args.json:
+        print(json.dumps({"settings": settings, "stub_requests": dict(stubs.requests), "results": results}, indent=2))
+    else:
+        print_results(results)
+        print(f"\nstub requests: {dict(stubs.requests)}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        warn_unchecked(f"No baseline at {args.baseline} (record one with --save-baseline); not comparing",
+                       args.require_baseline)
+        return
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        warn_unchecked("Baseline was recorded with different latencies; not comparing", args.require_baseline)
+        return
+    missing = [key for key in results if key not in baseline["results"]]
+    if missing:
+        warn_unchecked(f"Baseline has no results for {', '.join(missing)}; those runs are not checked",
+                       args.require_baseline)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# benchmarks/stubs.py
+
+"""
+Local stand-ins for the OpenAI chat completions API, Bing web search and Alpha Vantage, so the
+pipeline can be benchmarked end to end without keys, network or per-call cost.
+
+    with StubServers(llm_latency=0.2, search_latency=0.05, quote_latency=0.02) as stubs:
+        stubs.configure_environment()
+        ...  # import and run flows
+
+Each endpoint sleeps for its configured latency before answering, and counts its requests.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+def canned_answer(padding_kb: int = 4) -> str:
+    """A final answer shaped like the stages' JSON outputs, padded so JSON cleanup has realistic work to do"""
+    return json.dumps({
+        "summary": "Markets were mixed as investors weighed rate expectations against earnings. " * 4,
+        "market_sentiment": {"overall": "neutral", "score": 0.1},
+        "company_news": [
+            {"ticker": "AAPL", "headline": "Apple beats estimates", "sentiment": "positive", "impact": "medium"}
+        ],
+        "sector_news": [{"sector": "Technology", "sentiment": "positive"}],
+        "influencer_statements": [{"name": "Jerome Powell", "statement": "Rates stay on hold", "sentiment": "neutral"}],
+        "trading_recommendations": [
+            {"ticker": "AAPL", "company": "Apple Inc.", "action": "hold", "confidence": "medium", "rationale": "Steady"}
+        ],
+        "details": "x" * (padding_kb * 1024)
+    })
+
+
+def tool_call_arguments(tool: Dict[str, Any]) -> Dict[str, Any]:
+    """Plausible arguments for a tool from its JSON schema: every required parameter gets a string"""
+    parameters = tool.get("function", {}).get("parameters", {})
+    return {name: "AAPL" for name in parameters.get("required", [])}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_StubHTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if parts.path.endswith("/search"):
+            self.server.stubs.count("bing")
+            time.sleep(self.server.stubs.search_latency)
+            self._send_json({"webPages": {"value": [
+                {"name": f"{query.get('q', '')} result {i}", "url": f"https://example.com/{i}",
+                 "snippet": "Analysts expect steady growth as demand holds up. " * 3}
+                for i in range(int(query.get("count", 10)))
+            ]}})
+        elif parts.path.endswith("/query"):
+            self.server.stubs.count("alphavantage")
+            time.sleep(self.server.stubs.quote_latency)
+            symbol = query.get("symbol", "AAPL")
+            self._send_json({"Global Quote": {
+                "01. symbol": symbol, "05. price": "187.42", "06. volume": "51234567",
+                "07. latest trading day": time.strftime("%Y-%m-%d"), "09. change": "1.18", "10. change percent": "0.63%"
+            }})
+        else:
+            self._send_json({"error": f"unknown path {parts.path}"}, status=404)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.stubs.count("llm")
+        time.sleep(self.server.stubs.llm_latency)
+        completion = self.server.stubs.completion(request)
+        if not request.get("stream"):
+            self._send_json(completion)
+            return
+        # Streaming clients get the whole answer as a single delta chunk
+        choice = completion["choices"][0]
+        chunk = {**completion, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": choice["message"], "finish_reason": choice["finish_reason"]}]}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode())
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stubs: "StubServers"
+
+
+class StubServers:
+    """One localhost HTTP server answering for the LLM, Bing and Alpha Vantage, with injected latencies in seconds"""
+
+    def __init__(self, llm_latency: float = 0.0, search_latency: float = 0.0, quote_latency: float = 0.0,
+                 padding_kb: int = 4, use_tools: bool = True):
+        self.llm_latency = llm_latency
+        self.search_latency = search_latency
+        self.quote_latency = quote_latency
+        self.padding_kb = padding_kb
+        # Answer an agent's first turn with a tool call, so the tools and the provider stubs are exercised too
+        self.use_tools = use_tools
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server: Optional[_StubHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        messages: List[Dict[str, Any]] = request.get("messages", [])
+        tools = request.get("tools") or []
+        called_tool = any(message.get("role") == "tool" for message in messages)
+        if self.use_tools and tools and not called_tool:
+            tool = tools[0]
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": tool["function"]["name"], "arguments": json.dumps(tool_call_arguments(tool))}
+            }]}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": canned_answer(self.padding_kb)}
+            finish_reason = "stop"
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 4
+        completion_tokens = len(message.get("content") or "") // 4 + 10
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def start(self) -> "StubServers":
+        self._server = _StubHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.stubs = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="benchmark-stubs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def configure_environment(self):
+        """Point the OpenAI client, the tools and their keys at the stubs; call before importing the flows"""
+        os.environ.update({
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_API_BASE": f"{self.url}/v1",
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "BING_SUBSCRIPTION_KEY": "stub",
+            "BING_SEARCH_URL": f"{self.url}/v7.0/search",
+            "ALPHA_VANTAGE_API_KEY": "stub",
+            "ALPHAVANTAGE_URL": f"{self.url}/query",
+            # Crew outputs are cached across runs by default; a benchmark wants every stage to run
+            "STAGE_CACHE_ENABLED": "false",
+            "CREWAI_DISABLE_TELEMETRY": "true"
+        })
+
+    def __enter__(self) -> "StubServers":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
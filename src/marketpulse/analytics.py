@@ -0,0 +1,105 @@
+# src/marketpulse/analytics.py
+
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+
+def load_cached_quotes(tickers: Iterable[str], cache_dir: str = ".cache/quotes") -> Dict[str, float]:
+    """Read last known prices from the stock_quote tool cache without calling the API"""
+    quotes = {}
+    for ticker in tickers:
+        cache_file = f"{cache_dir}/{str(ticker).upper()}.json"
+        if not os.path.exists(cache_file):
+            continue
+        try:
+            with open(cache_file, 'r') as f:
+                quotes[ticker] = float(json.load(f)["price"])
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    return quotes
+
+
+def _herfindahl(weights: np.ndarray) -> float:
+    """Herfindahl-Hirschman index on the 0-10,000 scale for weights that sum to 1"""
+    return float(np.sum(np.square(weights)) * 10000)
+
+
+def compute_portfolio_metrics(
+    portfolio: Dict[str, Any],
+    preferences: Dict[str, Any],
+    quotes: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """
+    Compute P&L, weights, limit breaches and concentration for a portfolio in one vectorized pass.
+    Holdings without a quote fall back to purchase price (zero P&L) and are listed as unpriced.
+    """
+    holdings = portfolio.get("holdings", [])
+    if quotes is None:
+        quotes = load_cached_quotes(h.get("ticker") for h in holdings)
+
+    if not holdings:
+        return {"holdings": [], "total_market_value": 0.0, "total_unrealized_pnl": 0.0, "sector_weights": {},
+                "hhi": 0.0, "sector_hhi": 0.0, "limit_breaches": [], "unpriced": []}
+
+    tickers = [h.get("ticker") for h in holdings]
+    sectors = np.array([h.get("sector") or "Unknown" for h in holdings])
+    shares = np.array([float(h.get("shares") or 0) for h in holdings])
+    cost = np.array([float(h.get("purchase_price") or 0) for h in holdings])
+    stated = np.array([float(h.get("allocation") or 0) for h in holdings])
+    priced = np.array([t in quotes for t in tickers])
+    price = np.where(priced, [quotes.get(t, 0.0) for t in tickers], cost)
+
+    cost_basis = shares * cost
+    market_value = shares * price
+    pnl = market_value - cost_basis
+    pnl_pct = np.divide(pnl, cost_basis, out=np.zeros_like(pnl), where=cost_basis > 0) * 100
+
+    # Weights come from market value when share counts are known, otherwise from stated allocations
+    total_value = market_value.sum()
+    if total_value > 0:
+        weights = market_value / total_value
+    elif stated.sum() > 0:
+        weights = stated / stated.sum()
+    else:
+        weights = np.full(len(holdings), 1 / len(holdings))
+    weight_pct = weights * 100
+
+    unique_sectors, sector_index = np.unique(sectors, return_inverse=True)
+    sector_weights = np.bincount(sector_index, weights=weights, minlength=len(unique_sectors))
+
+    max_size = preferences.get("max_position_size")
+    min_size = preferences.get("min_position_size")
+    breaches = []
+    if max_size is not None:
+        for i in np.flatnonzero(weight_pct > float(max_size)):
+            breaches.append({"ticker": tickers[i], "limit": "max", "weight": round(float(weight_pct[i]), 2),
+                             "drift": round(float(weight_pct[i] - float(max_size)), 2)})
+    if min_size is not None:
+        for i in np.flatnonzero(weight_pct < float(min_size)):
+            breaches.append({"ticker": tickers[i], "limit": "min", "weight": round(float(weight_pct[i]), 2),
+                             "drift": round(float(weight_pct[i] - float(min_size)), 2)})
+
+    return {
+        "holdings": [
+            {
+                "ticker": tickers[i],
+                "weight": round(float(weight_pct[i]), 2),
+                "allocation_drift": round(float(weight_pct[i] - stated[i]), 2) if stated[i] else None,
+                "unrealized_pnl": round(float(pnl[i]), 2),
+                "unrealized_pnl_pct": round(float(pnl_pct[i]), 2)
+            }
+            for i in range(len(holdings))
+        ],
+        "total_market_value": round(float(total_value), 2),
+        "total_unrealized_pnl": round(float(pnl.sum()), 2),
+        "sector_weights": {
+            str(sector): round(float(weight * 100), 2) for sector, weight in zip(unique_sectors, sector_weights)
+        },
+        "hhi": round(_herfindahl(weights), 1),
+        "sector_hhi": round(_herfindahl(sector_weights), 1),
+        "limit_breaches": breaches,
+        "unpriced": [tickers[i] for i in np.flatnonzero(~priced)]
+    }
@@ -0,0 +1,227 @@
+# src/marketpulse/batch.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import yaml
+
+from .utils.portfolio_chunks import select_portfolio_news
+
+
+@dataclass
+class BatchItem:
+    """One portfolio to analyze in a batch run"""
+    id: str
+    portfolio: Dict[str, Any]
+    preferences: Dict[str, Any]
+
+    @property
+    def tickers(self) -> frozenset:
+        return frozenset(h.get("ticker") for h in self.portfolio.get("holdings", []) if h.get("ticker"))
+
+
+@dataclass
+class BatchSummary:
+    """Outcome counts and throughput of a batch run"""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0.0
+    stage_runs: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def portfolios_per_minute(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return round(self.total / self.elapsed_seconds * 60, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_seconds": round(self.elapsed_seconds, 2),
+            "portfolios_per_minute": self.portfolios_per_minute,
+            "stage_runs": self.stage_runs
+        }
+
+
+def _load_file(path: str) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _to_item(record: Dict[str, Any], default_id: str, default_preferences: Optional[Dict[str, Any]]) -> BatchItem:
+    # Records are either {"id", "portfolio", "preferences"} or a bare portfolio with "holdings"
+    if "portfolio" in record:
+        portfolio = record["portfolio"]
+        preferences = record.get("preferences") or default_preferences
+    else:
+        portfolio = record
+        preferences = default_preferences
+    if preferences is None:
+        raise ValueError(f"Portfolio {default_id} has no preferences and no default was given")
+    return BatchItem(id=str(record.get("id", default_id)), portfolio=portfolio, preferences=preferences)
+
+
+def load_batch(source: str, default_preferences: Dict[str, Any] = None) -> List[BatchItem]:
+    """Load portfolios from a directory of JSON/YAML files or from a JSONL file"""
+    items = []
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if not filename.endswith(('.json', '.yaml', '.yml')):
+                continue
+            record = _load_file(os.path.join(source, filename))
+            items.append(_to_item(record, os.path.splitext(filename)[0], default_preferences))
+    elif os.path.isfile(source):
+        with open(source, 'r') as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    items.append(_to_item(json.loads(line), str(line_number), default_preferences))
+    else:
+        raise FileNotFoundError(f"Batch source {source} not found")
+    return items
+
+
+class BatchAnalyzer:
+    """
+    Analyze many portfolios while computing shared stages once:
+    global news and influencers once per batch, portfolio news once per unique ticker,
+    sentiment once per distinct ticker set and recommendations per portfolio.
+    """
+
+    def __init__(
+        self,
+        flow_factory: Callable[[Dict[str, Any], Dict[str, Any]], Any] = None,
+        concurrency: int = None,
+        on_result: Callable[[str, Dict[str, Any]], Optional[Awaitable[None]]] = None,
+        on_shared: Callable[[str, Dict[str, Any]], Optional[Awaitable[None]]] = None
+    ):
+        if flow_factory is None:
+            from .flows.market_analysis_flow import MarketSentimentFlow
+            flow_factory = MarketSentimentFlow
+        self.flow_factory = flow_factory
+        self.concurrency = concurrency or int(os.getenv("BATCH_CONCURRENCY", "4"))
+        self.on_result = on_result
+        # Called once per shared stage (global_news, influencer_data) as soon as it is computed
+        self.on_shared = on_shared
+
+    async def _notify(self, callback, key: str, value: Dict[str, Any]):
+        if callback is not None:
+            outcome = callback(key, value)
+            if asyncio.iscoroutine(outcome):
+                await outcome
+
+    async def _emit(self, item_id: str, result: Dict[str, Any]):
+        await self._notify(self.on_result, item_id, result)
+
+    def _union_portfolio(self, items: List[BatchItem]) -> Dict[str, Any]:
+        holdings = {}
+        for item in items:
+            for holding in item.portfolio.get("holdings", []):
+                holdings.setdefault(holding.get("ticker"), holding)
+        return {"holdings": list(holdings.values())}
+
+    async def run(self, items: List[BatchItem]) -> BatchSummary:
+        """Run the batch, emitting each portfolio's result as soon as it is ready"""
+        summary = BatchSummary(total=len(items))
+        if not items:
+            return summary
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Shared stages run on a flow over the union of all holdings
+        shared = self.flow_factory(self._union_portfolio(items), items[0].preferences)
+        global_news, influencer_data, all_portfolio_news = await asyncio.gather(
+            shared.collect_global_news(),
+            shared.monitor_key_influencers(),
+            shared.analyze_portfolio_news()
+        )
+        summary.stage_runs.update({"global_news": 1, "influencer_data": 1, "portfolio_news": 1})
+
+        if not (global_news and influencer_data and all_portfolio_news):
+            for item in items:
+                summary.failed += 1
+                await self._emit(item.id, {"error": "Failed to compute shared market stages"})
+            summary.elapsed_seconds = time.monotonic() - started
+            return summary
+        await self._notify(self.on_shared, "global_news", global_news)
+        await self._notify(self.on_shared, "influencer_data", influencer_data)
+
+        def seeded_flow(item: BatchItem, **results):
+            # Seeded results also become their tasks' outputs, which is how later stages get them as context
+            flow = self.flow_factory(item.portfolio, item.preferences)
+            flow.seed_stage("global_news", global_news)
+            flow.seed_stage("influencer_data", influencer_data)
+            for name, value in results.items():
+                flow.seed_stage(name, value)
+            return flow
+
+        groups: Dict[frozenset, List[BatchItem]] = {}
+        for item in items:
+            groups.setdefault(item.tickers, []).append(item)
+        summary.stage_runs["sentiment_analysis"] = len(groups)
+        summary.stage_runs["recommendations"] = len(items)
+
+        async def recommend(item: BatchItem, sentiment: Dict[str, Any]):
+            portfolio_news = select_portfolio_news(all_portfolio_news, item.portfolio)
+            try:
+                async with semaphore:
+                    flow = seeded_flow(item, portfolio_news=portfolio_news, sentiment_analysis=sentiment)
+                    recommendations = await flow.generate_recommendations()
+            except Exception as e:
+                logging.error(f"Error in batch recommendations for {item.id}: {str(e)}")
+                recommendations = None
+
+            if recommendations:
+                summary.succeeded += 1
+                await self._emit(item.id, {
+                    "global_news": global_news,
+                    "portfolio_news": portfolio_news,
+                    "influencer_data": influencer_data,
+                    "sentiment_analysis": sentiment,
+                    "recommendations": recommendations
+                })
+            else:
+                summary.failed += 1
+                await self._emit(item.id, {"error": "Failed to generate recommendations"})
+
+        async def analyze_group(members: List[BatchItem]):
+            try:
+                async with semaphore:
+                    representative = members[0]
+                    flow = seeded_flow(
+                        representative,
+                        portfolio_news=select_portfolio_news(all_portfolio_news, representative.portfolio)
+                    )
+                    sentiment = await flow.analyze_market_sentiment()
+            except Exception as e:
+                logging.error(f"Error in batch sentiment analysis: {str(e)}")
+                sentiment = None
+
+            if not sentiment:
+                for item in members:
+                    summary.failed += 1
+                    await self._emit(item.id, {"error": "Failed to analyze market sentiment"})
+                return
+            await asyncio.gather(*(recommend(item, sentiment) for item in members))
+
+        await asyncio.gather(*(analyze_group(members) for members in groups.values()))
+        summary.elapsed_seconds = time.monotonic() - started
+        return summary
+
+
+async def run_batch(
+    items: List[BatchItem],
+    concurrency: int = None,
+    on_result: Callable[[str, Dict[str, Any]], Optional[Awaitable[None]]] = None
+) -> BatchSummary:
+    """Convenience wrapper running a batch with the default flow"""
+    return await BatchAnalyzer(concurrency=concurrency, on_result=on_result).run(items)
@@ -6,10 +6,16 @@ import warnings
 import asyncio
 from datetime import datetime
 import argparse
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
 
-from .flows.market_analysis_flow import MarketSentimentFlow
+from .batch import load_batch, run_batch
+from .flows.stages import stage_tasks
+from .utils.cassette import configure_cassette, eject_cassette
+from .utils.profiling import profile_run
+from .utils.tracing import configure_tracing, shutdown_tracing, span
+from .utils.usage import UsageLedger, set_usage_ledger
+from .utils.usage_log import read_usage, summarize_usage
 
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 
@@ -57,44 +63,45 @@ def save_output(data: Dict[str, Any], filename: str = None):
     
     print(f"Analysis saved to {filename}")
 
-async def run_analysis(portfolio_file: str, preferences_file: str, output_file: str = None):
-    """Run the market sentiment analysis"""
+async def run_analysis(portfolio_file: str, preferences_file: str, output_file: str = None, stages: List[str] = None):
+    """Run the market sentiment analysis, optionally only the requested stages and their dependencies"""
     print("Loading portfolio and preferences...")
     portfolio = load_portfolio(portfolio_file)
     preferences = load_preferences(preferences_file)
     
     print("Starting market sentiment analysis...")
-    flow = MarketSentimentFlow(portfolio, preferences)
+    # Imported here so `--help` and argument errors do not pay for loading crewai
+    from .flows.market_analysis_flow import MarketSentimentFlow
+    flow = MarketSentimentFlow(portfolio, preferences, stages=stages)
     results = {}
+    usage = UsageLedger()
+    set_usage_ledger(usage)
     
-    async for event in flow.stream_analysis():
-        # Parse the event
-        event_str = event.replace("data: ", "").strip()
-        if event_str:
-            try:
-                event_data = json.loads(event_str)
-                
-                # Display progress
-                if event_data.get("type") == "status":
-                    print(f"Status: {event_data.get('message')}")
-                
-                # Store completed task data
-                if event_data.get("type") == "task_complete":
-                    task_name = event_data.get("task")
-                    print(f"Completed: {task_name}")
-                    results[task_name] = event_data.get("data")
-                
-                # Handle errors
-                if event_data.get("type") == "error":
-                    print(f"Error: {event_data.get('message')}")
-                
-                # Handle completion
-                if event_data.get("type") == "complete":
-                    print(f"Analysis complete: {event_data.get('message')}")
-                    
-            except json.JSONDecodeError:
-                print(f"Warning: Could not parse event: {event_str[:50]}...")
+    # One root span per run, so the stages, crews and tool calls of a run share a trace
+    with span("cli analyze", {"marketpulse.holdings": len(portfolio.get("holdings", []))}):
+        # Typed events straight from the flow; SSE framing is only for HTTP clients
+        async for event in flow.iter_events():
+            # Display progress
+            if event.type == "status":
+                print(f"Status: {event.message}")
+        
+            # Store completed task data
+            if event.type == "task_complete":
+                print(f"Completed: {event.task}")
+                results[event.task] = event.data
+        
+            # Handle errors
+            if event.type == "error":
+                print(f"Error: {event.message}")
+        
+            # Handle completion
+            if event.type == "complete":
+                print(f"Analysis complete: {event.message}")
     
+    totals = usage.to_dict()
+    print(f"Usage: {totals['prompt_tokens'] + totals['completion_tokens']} tokens, "
+          f"{totals['api_calls']} API calls, ~${totals['estimated_cost_usd']:.4f}")
+
     # Save the results
     if results and output_file:
         save_output(results, output_file)
@@ -119,16 +126,141 @@ async def run_analysis(portfolio_file: str, preferences_file: str, output_file:
     
     return results
 
+async def run_batch_analysis(input_path: str, preferences_file: str = None, output_dir: str = None,
+                             concurrency: int = None):
+    """Run the analysis for every portfolio in a directory or JSONL file"""
+    default_preferences = load_preferences(preferences_file) if preferences_file else None
+    try:
+        items = load_batch(input_path, default_preferences)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not output_dir:
+        output_dir = f"batch_results_{datetime.now().strftime('%Y-%m-%d')}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Starting batch analysis of {len(items)} portfolios...")
+
+    def write_result(item_id: str, result: Dict[str, Any]):
+        # Results land on disk as each portfolio finishes, not at the end of the batch
+        with open(os.path.join(output_dir, f"{item_id}.json"), 'w') as f:
+            json.dump(result, f, indent=2)
+        status = "Failed" if "error" in result else "Completed"
+        print(f"{status}: {item_id}")
+
+    summary = await run_batch(items, concurrency=concurrency, on_result=write_result)
+
+    with open(os.path.join(output_dir, "summary.json"), 'w') as f:
+        json.dump(summary.to_dict(), f, indent=2)
+
+    print(f"\nBatch complete: {summary.succeeded} succeeded, {summary.failed} failed "
+          f"in {summary.elapsed_seconds:.1f}s ({summary.portfolios_per_minute} portfolios/minute)")
+    print(f"Results saved to {output_dir}")
+    return summary
+
+def show_usage(group_by: List[str], since: str = None, directory: str = None, as_json: bool = False):
+    """Print external API calls from the usage log, counted per combination of the group_by fields"""
+    rows = summarize_usage(read_usage(directory, since), group_by)
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return rows
+    if not rows:
+        print("No usage recorded.")
+        return rows
+
+    columns = list(group_by) + ["calls"]
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+    print(f"\nTotal: {sum(row['calls'] for row in rows)} calls")
+    return rows
+
 def main():
     """Command line interface for market sentiment analysis"""
     parser = argparse.ArgumentParser(description="Market Sentiment Analysis CLI")
-    parser.add_argument("--portfolio", "-p", required=True, help="Path to portfolio JSON or YAML file")
-    parser.add_argument("--preferences", "-pref", required=True, help="Path to preferences JSON or YAML file")
+    parser.add_argument("--portfolio", "-p", help="Path to portfolio JSON or YAML file")
+    parser.add_argument("--preferences", "-pref", help="Path to preferences JSON or YAML file")
     parser.add_argument("--output", "-o", help="Output file path (optional)")
-    
+    parser.add_argument("--stages", "-s",
+                        help="Comma-separated outputs to compute, e.g. sentiment_analysis,portfolio_news (default: all)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a CPU flamegraph (folded stacks) and top allocators for this run to PROFILE_DIR")
+    parser.add_argument("--cassette", choices=["record", "replay", "off"],
+                        help="Record external API and LLM calls to a cassette, or replay them offline (default: CASSETTE_MODE)")
+    parser.add_argument("--cassette-name", help="Cassette to record or replay (default: CASSETTE_NAME or 'default')")
+    parser.add_argument("--cassette-dir", help="Cassette directory (default: CASSETTE_DIR or .cassettes)")
+    parser.add_argument("--cassette-latency", action="store_true",
+                        help="When replaying, wait as long as each recorded call originally took")
+
+    subparsers = parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="Analyze many portfolios, sharing the common stages")
+    batch_parser.add_argument("--input", "-i", required=True, help="Directory of portfolio files or a JSONL file")
+    batch_parser.add_argument("--preferences", "-pref", help="Default preferences for portfolios without their own")
+    batch_parser.add_argument("--output-dir", "-o", help="Directory for per-portfolio results (optional)")
+    batch_parser.add_argument("--concurrency", "-c", type=int, help="Maximum concurrent per-portfolio stages")
+    usage_parser = subparsers.add_parser("usage", help="Summarize metered external API calls from the usage log")
+    usage_parser.add_argument("--by", default="provider,tool",
+                              help="Comma-separated fields to group by: provider, tool, day, tenant, stage, operation")
+    usage_parser.add_argument("--since", help="Only count calls on or after this day (YYYY-MM-DD)")
+    usage_parser.add_argument("--dir", help="Usage log directory (default: USAGE_LOG_DIR or .logs/usage)")
+    usage_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
     args = parser.parse_args()
-    
-    asyncio.run(run_analysis(args.portfolio, args.preferences, args.output))
+    # TRACING_EXPORTER=console or file traces a run locally
+    configure_tracing()
+    try:
+        if args.command != "usage":
+            configure_cassette(args.cassette, args.cassette_dir, args.cassette_name, args.cassette_latency or None)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    try:
+        run_command(parser, args)
+    finally:
+        eject_cassette()
+        shutdown_tracing()
+
+def run_command(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    if args.command == "batch":
+        asyncio.run(run_batch_analysis(args.input, args.preferences, args.output_dir, args.concurrency))
+        return
+
+    if args.command == "usage":
+        try:
+            show_usage([field.strip() for field in args.by.split(",") if field.strip()], args.since, args.dir, args.json)
+        except ValueError as e:
+            parser.error(str(e))
+        return
+
+    if not args.portfolio or not args.preferences:
+        parser.error("--portfolio and --preferences are required")
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()] if args.stages else None
+    if stages:
+        try:
+            stage_tasks(stages)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if not args.profile:
+        asyncio.run(run_analysis(args.portfolio, args.preferences, args.output, stages))
+        return
+
+    with profile_run(f"cli-{datetime.now().strftime('%Y%m%dT%H%M%S')}") as report:
+        asyncio.run(run_analysis(args.portfolio, args.preferences, args.output, stages))
+    print_profile(report)
+
+def print_profile(report: Dict[str, Any]):
+    """Tell the user where a run's profile went and what allocated the most"""
+    if "flamegraph" not in report:
+        print(f"Profile not written: {report.get('skipped', 'see log')}")
+        return
+    print(f"\nProfile: {report['samples']} samples over {report['elapsed_seconds']}s")
+    print(f"Flamegraph (folded stacks): {report['flamegraph']}")
+    print(f"Top allocators: {report['allocations']}")
+    for allocator in report["top_allocators"][:5]:
+        print(f"  {allocator['size_kb']:>10.1f} KiB  {allocator['location']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
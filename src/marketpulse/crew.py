@@ -3,6 +3,15 @@ from crewai.project import CrewBase, agent, crew, task
 from .tools.market_tool import FinancialNewsSearchTool, StockQuoteTool, InfluencerMonitorTool
 from dotenv import load_dotenv
 
+# Per-agent LLM settings, shared with the flow so stage cache keys track them
+AGENT_LLM_CONFIGS = {
+    "global_news_agent": {"temperature": 0.3, "model": "gpt-4o-mini"},
+    "portfolio_news_agent": {"temperature": 0.3, "model": "gpt-4o-mini"},
+    "influencer_monitor_agent": {"temperature": 0.3, "model": "gpt-4o-mini"},
+    "sentiment_analysis_agent": {"temperature": 0.0, "model": "gpt-4o-mini"},
+    "portfolio_strategy_agent": {"temperature": 0.7, "model": "gpt-4o-mini"}
+}
+
 @CrewBase
 class MarketSentimentCrew:
     """Market Sentiment Analysis crew for analyzing financial markets"""
@@ -18,7 +27,7 @@ class MarketSentimentCrew:
         return Agent(
             config=self.agents_config['global_news_agent'],
             tools=[self.news_tool],
-            llm_config={"temperature": 0.3, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["global_news_agent"],
             verbose=True
         )
 
@@ -27,7 +36,7 @@ class MarketSentimentCrew:
         return Agent(
             config=self.agents_config['portfolio_news_agent'],
             tools=[self.news_tool, self.stock_tool],
-            llm_config={"temperature": 0.3, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["portfolio_news_agent"],
             verbose=True
         )
 
@@ -36,7 +45,7 @@ class MarketSentimentCrew:
         return Agent(
             config=self.agents_config['influencer_monitor_agent'],
             tools=[self.influencer_tool],
-            llm_config={"temperature": 0.3, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["influencer_monitor_agent"],
             verbose=True
         )
 
@@ -44,7 +53,7 @@ class MarketSentimentCrew:
     def sentiment_analysis_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['sentiment_analysis_agent'],
-            llm_config={"temperature": 0.0, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["sentiment_analysis_agent"],
             verbose=True
         )
 
@@ -53,7 +62,7 @@ class MarketSentimentCrew:
         return Agent(
             config=self.agents_config['portfolio_strategy_agent'],
             tools=[self.stock_tool],
-            llm_config={"temperature": 0.7, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["portfolio_strategy_agent"],
             verbose=True
         )
 
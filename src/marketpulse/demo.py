@@ -0,0 +1,182 @@
+# src/marketpulse/demo.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows, where the server runs a single worker anyway
+    fcntl = None
+
+from .jobs import FlowRunner, run_market_flow
+from .utils.stream_utils import format_event_id
+from .utils.wire_format import encode_event
+
+DEMO_PORTFOLIO = {
+    "holdings": [
+        {"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"},
+        {"ticker": "MSFT", "company": "Microsoft Corp.", "allocation": 12, "sector": "Technology"},
+        {"ticker": "AMZN", "company": "Amazon.com Inc.", "allocation": 10, "sector": "Consumer Discretionary"},
+        {"ticker": "GOOGL", "company": "Alphabet Inc.", "allocation": 8, "sector": "Communication Services"},
+        {"ticker": "TSLA", "company": "Tesla Inc.", "allocation": 5, "sector": "Consumer Discretionary"}
+    ]
+}
+
+DEMO_PREFERENCES = {
+    "risk_tolerance": "moderate",
+    "preferred_sectors": ["Technology", "Healthcare"],
+    "preferred_regions": ["US", "Europe"],
+    "investment_horizon": "medium-term"
+}
+
+
+class DemoStore:
+    """Precomputed demo analysis, refreshed on a schedule and replayed from memory"""
+
+    def __init__(self, path: str = None, refresh_seconds: int = None, runner: FlowRunner = None):
+        self.path = path or os.getenv("DEMO_CACHE_PATH", ".cache/demo/result.json")
+        if refresh_seconds is None:
+            refresh_seconds = int(os.getenv("DEMO_REFRESH_SECONDS", "21600"))
+        self.refresh_seconds = refresh_seconds
+        self.runner = runner or run_market_flow
+        self.events: List[Dict[str, Any]] = []
+        self.generated_at: Optional[float] = None
+        # Serialized events per wire format, rebuilt whenever the stored run changes
+        self._encoded: Dict[str, List[bytes]] = {}
+        self._refresh_lock = asyncio.Lock()
+        self.load()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.events)
+
+    @property
+    def run_id(self) -> str:
+        """Identifies the stored run in SSE event ids, so resumes never mix two refreshes"""
+        return f"demo-{int(self.generated_at or 0)}"
+
+    def is_stale(self) -> bool:
+        return self.generated_at is None or time.time() - self.generated_at > self.refresh_seconds
+
+    def load(self) -> bool:
+        """Load the last stored run from disk, e.g. after a restart"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+            self.events = stored["events"]
+            self.generated_at = stored["generated_at"]
+            self._encoded = {}
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error loading demo result from {self.path}: {str(e)}")
+            return False
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({"generated_at": self.generated_at, "events": self.events}, f)
+        os.replace(tmp_file, self.path)
+
+    async def refresh(self) -> bool:
+        """Run the demo flow once; the stored result is only replaced by a run that completed"""
+        async with self._refresh_lock:
+            events = []
+            try:
+                async for event in self.runner(DEMO_PORTFOLIO, DEMO_PREFERENCES):
+                    events.append(event)
+            except Exception as e:
+                logging.error(f"Error refreshing demo result: {str(e)}")
+                return False
+            if not events or events[-1].get("type") != "complete":
+                logging.error("Demo refresh did not complete; keeping the previous result")
+                return False
+            self.events = events
+            self.generated_at = time.time()
+            self._encoded = {}
+            self._save()
+            return True
+
+    def _lock_refresh(self):
+        """Take the cross-process refresh lock without blocking; None when another worker holds it"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        handle = open(f"{self.path}.lock", "a")
+        if fcntl is None:
+            return handle
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    async def refresh_if_stale(self) -> Optional[bool]:
+        """
+        Refresh a stale result from one worker only: whoever takes the lock runs the flow, the others
+        pick up its result.json. Returns None while another worker is refreshing.
+        """
+        if not self.is_stale():
+            return True
+        # Another worker may already have stored a fresh run
+        self.load()
+        if not self.is_stale():
+            return True
+        lock = self._lock_refresh()
+        if lock is None:
+            return None
+        try:
+            self.load()
+            if not self.is_stale():
+                return True
+            return await self.refresh()
+        finally:
+            lock.close()
+
+    async def run_forever(self):
+        """Refresh whenever the stored result is older than refresh_seconds"""
+        while True:
+            refreshed = await self.refresh_if_stale()
+            if refreshed:
+                wait = max(self.generated_at + self.refresh_seconds - time.time(), 1)
+            elif refreshed is None:
+                # Check back for the refreshing worker's result
+                wait = min(self.refresh_seconds, 30)
+            else:
+                # Retry failed runs sooner than the regular schedule
+                wait = min(self.refresh_seconds, 300)
+            await asyncio.sleep(wait)
+
+    def encoded_events(self, wire_format: str = "sse") -> List[bytes]:
+        """The stored events serialized (with their ids) for one wire format"""
+        if wire_format not in self._encoded:
+            run_id = self.run_id
+            self._encoded[wire_format] = [
+                encode_event(event, wire_format, format_event_id(run_id, index)) for index, event in enumerate(self.events)
+            ]
+        return self._encoded[wire_format]
+
+    async def replay_encoded(self, wire_format: str = "sse", pace: float = 0, after: int = 0) -> AsyncGenerator[bytes, None]:
+        """Yield the stored sequence pre-serialized, from event `after` on, pausing `pace` seconds between events"""
+        chunks = self.encoded_events(wire_format)
+        for index in range(after, len(chunks)):
+            if pace and index > after:
+                await asyncio.sleep(pace)
+            yield chunks[index]
+
+
+_demo_store: Optional[DemoStore] = None
+
+
+def get_demo_store() -> DemoStore:
+    """Return the process-wide demo store"""
+    global _demo_store
+    if _demo_store is None:
+        _demo_store = DemoStore()
+    return _demo_store
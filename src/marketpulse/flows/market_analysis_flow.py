@@ -7,9 +7,24 @@ from typing import Dict, Any, Optional, AsyncGenerator, List
 import json
 import asyncio
 import logging
+import os
 import re
+import time
+from ..analytics import compute_portfolio_metrics
 from ..clean_json import clean_and_parse_json
-from ..crew import MarketSentimentCrew
+from ..crew import MarketSentimentCrew, AGENT_LLM_CONFIGS
+from .stages import MARKET_STAGES, stage_tasks
+from ..utils.cancellation import cancellation_step_callback, check_cancelled
+from ..utils.metrics import STAGE_DURATION
+from ..utils.portfolio_chunks import merge_portfolio_news, partition_holdings
+from ..utils.stage_cache import compute_stage_key, get_stage_cache
+from ..utils.stream_utils import StreamEvent
+from ..utils.task_context import set_task_output
+from ..utils.task_graph import TaskGraph, run_graph
+from ..utils.tracing import set_attributes, span
+from ..utils.usage import BudgetExceeded, check_stage_budget, current_usage_ledger, record_llm_usage, set_usage_stage
+
+TASKS_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "tasks.yaml")
 
 class MarketSentimentState(FlowState):
     portfolio: Dict[str, Any]
@@ -18,16 +33,31 @@ class MarketSentimentState(FlowState):
     portfolio_news: Optional[Dict[str, Any]] = None
     influencer_data: Optional[Dict[str, Any]] = None
     sentiment_analysis: Optional[Dict[str, Any]] = None
+    portfolio_metrics: Optional[Dict[str, Any]] = None
     recommendations: Optional[Dict[str, Any]] = None
 
 class MarketSentimentFlow(Flow[MarketSentimentState]):
-    def __init__(self, portfolio: Dict[str, Any], preferences: Dict[str, Any]):
-        self.initial_state = MarketSentimentState(
-            portfolio=portfolio,
-            preferences=preferences
-        )
-        super().__init__()
+    STAGES = MARKET_STAGES
+
+    @classmethod
+    def stage_tasks(cls, stages: Optional[List[str]]) -> Optional[List[str]]:
+        """Map requested output names (e.g. sentiment_analysis) to their tasks; None means every stage"""
+        return stage_tasks(stages, cls.STAGES)
+
+    def __init__(self, portfolio: Dict[str, Any], preferences: Dict[str, Any], stages: Optional[List[str]] = None):
+        super().__init__(initial_state=MarketSentimentState(portfolio=portfolio, preferences=preferences))
         self._initialize_crew()
+        self.stage_cache = get_stage_cache()
+        self.task_graph = TaskGraph.from_yaml(TASKS_CONFIG_PATH)
+        # Local quantitative pre-pass, not an LLM task, so it isn't declared in tasks.yaml
+        self.task_graph.add_node("compute_portfolio_metrics", dependents=["generate_recommendations_task"])
+        # Only the requested outputs and what they depend on are run
+        targets = self.stage_tasks(stages)
+        self.selected_tasks = self.task_graph.closure(targets) if targets else set(self.STAGES)
+        # Portfolios larger than one chunk are analyzed map-reduce style
+        self.chunk_size = int(os.getenv("PORTFOLIO_CHUNK_SIZE", "25"))
+        self.chunk_concurrency = int(os.getenv("PORTFOLIO_CHUNK_CONCURRENCY", "4"))
+        self.chunk_strategy = os.getenv("PORTFOLIO_CHUNK_STRATEGY", "sector")
 
     def _initialize_crew(self):
         """Initialize crew instance with separate crews for each task"""
@@ -91,6 +121,71 @@ class MarketSentimentFlow(Flow[MarketSentimentState]):
                     logging.error(f"Failed to parse JSON: {str(e)}\nRaw text: {text[:200]}...")
                     return None
 
+    async def _kickoff_stage(self, crew: Crew, agent_name: str, task_name: str, inputs: Dict[str, Any],
+                       tools: List[Any] = None, context: Dict[str, Any] = None) -> Optional[Dict]:
+        """Kick off a single-task crew, reusing the cached output when the stage inputs are unchanged"""
+        llm_config = AGENT_LLM_CONFIGS[agent_name]
+        # Tokens and API calls spent from here on, including in crew threads, count against this stage
+        set_usage_stage(task_name)
+        key = compute_stage_key(
+            agent_config=self.crew_instance.agents_config.get(agent_name),
+            task_config=self.crew_instance.tasks_config.get(task_name),
+            model=llm_config["model"],
+            temperature=llm_config["temperature"],
+            inputs={"inputs": inputs, "context": context or {}},
+            tool_digests={tool.name: tool.cache_digest() for tool in (tools or [])}
+        )
+
+        # One read serves both the hit and, under budget pressure, an expired fallback
+        cached, fresh = self.stage_cache.lookup(key, stage=task_name)
+        set_attributes({"marketpulse.stage_cache_hit": fresh})
+        if fresh:
+            # Downstream tasks read this one's output through `context:`, as if the crew had run
+            set_task_output(crew.tasks[0], cached)
+            return self._extract_json_from_response(cached)
+
+        # Stage boundary checkpoint; inside the crew, tools and the step callback check the same token
+        check_cancelled()
+        try:
+            check_stage_budget(task_name)
+        except BudgetExceeded as e:
+            # Out of budget: an expired cached output beats no output; otherwise the stage is skipped
+            ledger = current_usage_ledger()
+            ledger.record_budget_action(task_name, "downgrade" if cached is not None else "short_circuit", str(e))
+            if cached is None:
+                raise
+            set_task_output(crew.tasks[0], cached)
+            return self._extract_json_from_response(cached)
+        crew.step_callback = cancellation_step_callback
+        with span("crew.kickoff", {"crew.agent": agent_name, "crew.task": task_name, "llm.model": llm_config["model"]}):
+            # Crews block on LLM calls; run them off the event loop so independent stages overlap
+            result = await asyncio.to_thread(crew.kickoff, inputs=inputs)
+            self._record_token_usage(agent_name, llm_config["model"], result)
+        if not hasattr(result.tasks_output[0], 'raw'):
+            return None
+        raw = result.tasks_output[0].raw
+        data = self._extract_json_from_response(raw)
+        if data:
+            # Only outputs the flow can use are worth serving again
+            self.stage_cache.set(key, raw, stage=task_name)
+        return data
+
+    def _record_token_usage(self, agent_name: str, model: str, result: Any):
+        """Account the LLM tokens a crew kickoff reported to its agent, this stage and the run"""
+        counts = record_llm_usage(agent_name, model, getattr(result, "token_usage", None))
+        set_attributes({f"llm.usage.{kind}": tokens for kind, tokens in counts.items()})
+
+    def seed_stage(self, name: str, result: Dict[str, Any]):
+        """
+        Use a stage result computed elsewhere (e.g. shared across a batch) instead of running the stage:
+        stored in the state and, for crew stages, set as the task's output so dependent tasks get it as context
+        """
+        setattr(self.state, name, result)
+        task_name = next(task for task, stage in self.STAGES.items() if stage["event"] == name)
+        task = getattr(self.crew_instance, task_name, None)
+        if task is not None:
+            set_task_output(task(), json.dumps(result))
+
     def _get_key_influencers(self) -> List[str]:
         """Get list of key influencers to monitor based on market relevance"""
         return [
@@ -115,136 +210,176 @@ class MarketSentimentFlow(Flow[MarketSentimentState]):
     async def collect_global_news(self):
         """Start the analysis by collecting global financial news"""
         try:
-            result = self.global_news_crew.kickoff(inputs={})
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.global_news = data
-                    return data
+            data = await self._kickoff_stage(
+                self.global_news_crew, "global_news_agent", "collect_global_news_task",
+                inputs={}, tools=[self.crew_instance.news_tool]
+            )
+            if data:
+                self.state.global_news = data
+                return data
         except Exception as e:
             logging.error(f"Error in collect_global_news: {str(e)}")
         return None
 
     @listen(collect_global_news)
-    async def analyze_portfolio_news(self, global_news_result):
+    async def analyze_portfolio_news(self, global_news_result=None):
         """Analyze news specific to the user's portfolio"""
         try:
-            result = self.portfolio_news_crew.kickoff(inputs={
-                "portfolio": self._format_portfolio_for_task()
-            })
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.portfolio_news = data
-                    return data
+            holdings = self.state.portfolio.get("holdings", [])
+            if len(holdings) > self.chunk_size:
+                data = await self._analyze_portfolio_news_chunked(holdings)
+            else:
+                data = await self._kickoff_stage(
+                    self.portfolio_news_crew, "portfolio_news_agent", "analyze_portfolio_news_task",
+                    inputs={"portfolio": self._format_portfolio_for_task()},
+                    tools=[self.crew_instance.news_tool, self.crew_instance.stock_tool]
+                )
+            if data:
+                self.state.portfolio_news = data
+                return data
         except Exception as e:
             logging.error(f"Error in analyze_portfolio_news: {str(e)}")
         return None
 
+    async def _analyze_portfolio_news_chunked(self, holdings: List[Dict[str, Any]]) -> Optional[Dict]:
+        """Map holdings chunks over parallel sub-crews, then merge company_news and sector_news"""
+        chunks = partition_holdings(holdings, self.chunk_size, self.chunk_strategy)
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def analyze_chunk(chunk: List[Dict[str, Any]]) -> Optional[Dict]:
+            async with semaphore:
+                # Each sub-crew gets its own agent/task copies so kickoffs don't share state
+                return await self._kickoff_stage(
+                    self.portfolio_news_crew.copy(), "portfolio_news_agent", "analyze_portfolio_news_task",
+                    inputs={"portfolio": json.dumps({"holdings": chunk})},
+                    tools=[self.crew_instance.news_tool, self.crew_instance.stock_tool]
+                )
+
+        results = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        succeeded = [result for result in results if isinstance(result, dict)]
+        if len(succeeded) < len(chunks):
+            logging.error(f"analyze_portfolio_news: {len(chunks) - len(succeeded)} of {len(chunks)} chunks failed")
+        if not succeeded:
+            return None
+        merged = merge_portfolio_news(succeeded)
+        # The chunks ran on copies of the task; the sentiment task reads its context from the original
+        set_task_output(self.portfolio_news_crew.tasks[0], json.dumps(merged))
+        return merged
+
     @listen(analyze_portfolio_news)
-    async def monitor_key_influencers(self, portfolio_news_result):
+    async def monitor_key_influencers(self, portfolio_news_result=None):
         """Monitor statements from key market influencers"""
         try:
             # Get a list of influencers to monitor
             influencers = self._get_key_influencers()
             
             # Execute the task
-            result = self.influencer_crew.kickoff(inputs={})
-            
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.influencer_data = data
-                    return data
+            data = await self._kickoff_stage(
+                self.influencer_crew, "influencer_monitor_agent", "monitor_key_influencers_task",
+                inputs={}, tools=[self.crew_instance.influencer_tool]
+            )
+            if data:
+                self.state.influencer_data = data
+                return data
         except Exception as e:
             logging.error(f"Error in monitor_key_influencers: {str(e)}")
         return None
 
     @listen(monitor_key_influencers)
-    async def analyze_market_sentiment(self, influencer_result):
+    async def analyze_market_sentiment(self, influencer_result=None):
         """Analyze overall market sentiment based on all collected data"""
         try:
-            result = self.sentiment_crew.kickoff(inputs={})
-            
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.sentiment_analysis = data
-                    return data
+            data = await self._kickoff_stage(
+                self.sentiment_crew, "sentiment_analysis_agent", "analyze_market_sentiment_task",
+                inputs={},
+                context={
+                    "global_news": self.state.global_news,
+                    "portfolio_news": self.state.portfolio_news,
+                    "influencer_data": self.state.influencer_data
+                }
+            )
+            if data:
+                self.state.sentiment_analysis = data
+                return data
         except Exception as e:
             logging.error(f"Error in analyze_market_sentiment: {str(e)}")
         return None
 
+    async def compute_portfolio_metrics(self):
+        """Compute P&L, limit drift and concentration so the strategist doesn't do the arithmetic"""
+        try:
+            self.state.portfolio_metrics = compute_portfolio_metrics(self.state.portfolio, self.state.preferences)
+            return self.state.portfolio_metrics
+        except Exception as e:
+            logging.error(f"Error in compute_portfolio_metrics: {str(e)}")
+        return None
+
     @listen(analyze_market_sentiment)
-    async def generate_recommendations(self, sentiment_result):
+    async def generate_recommendations(self, sentiment_result=None):
         """Generate portfolio recommendations based on sentiment analysis"""
         try:
-            result = self.recommendation_crew.kickoff(inputs={
-                "portfolio": self._format_portfolio_for_task(),
-                "preferences": self._format_preferences_for_task()
-            })
-            
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.recommendations = data
-                    return data
+            if self.state.portfolio_metrics is None:
+                await self.compute_portfolio_metrics()
+            data = await self._kickoff_stage(
+                self.recommendation_crew, "portfolio_strategy_agent", "generate_recommendations_task",
+                inputs={
+                    "portfolio": self._format_portfolio_for_task(),
+                    "preferences": self._format_preferences_for_task(),
+                    "portfolio_metrics": json.dumps(self.state.portfolio_metrics, separators=(",", ":"))
+                },
+                tools=[self.crew_instance.stock_tool],
+                context={"sentiment_analysis": self.state.sentiment_analysis}
+            )
+            if data:
+                self.state.recommendations = data
+                return data
         except Exception as e:
             logging.error(f"Error in generate_recommendations: {str(e)}")
         return None
 
-    async def stream_analysis(self) -> AsyncGenerator[str, None]:
-        """Stream the analysis process"""
+    async def iter_events(self) -> AsyncGenerator[StreamEvent, None]:
+        """Run the analysis, yielding each typed progress event as soon as its stage's context is ready"""
         try:
-            yield self._format_event("status", "Starting market sentiment analysis...")
-            await asyncio.sleep(0.1)
-
-            global_news = await self.collect_global_news()
-            if global_news:
-                yield self._format_event("task_complete", task="global_news", data=global_news)
-                yield self._format_event("status", "Analyzing portfolio-specific news...")
-                
-                portfolio_news = await self.analyze_portfolio_news(global_news)
-                if portfolio_news:
-                    yield self._format_event("task_complete", task="portfolio_news", data=portfolio_news)
-                    yield self._format_event("status", "Monitoring key market influencers...")
-                    
-                    influencer_data = await self.monitor_key_influencers(portfolio_news)
-                    if influencer_data:
-                        yield self._format_event("task_complete", task="influencer_data", data=influencer_data)
-                        yield self._format_event("status", "Analyzing market sentiment...")
-                        
-                        sentiment_analysis = await self.analyze_market_sentiment(influencer_data)
-                        if sentiment_analysis:
-                            yield self._format_event("task_complete", task="sentiment_analysis", data=sentiment_analysis)
-                            yield self._format_event("status", "Generating trading recommendations...")
-                            
-                            recommendations = await self.generate_recommendations(sentiment_analysis)
-                            if recommendations:
-                                yield self._format_event("task_complete", task="recommendations", data=recommendations)
-                                yield self._format_event("complete", "Market sentiment analysis complete")
-                            else:
-                                yield self._format_event("error", "Failed to generate recommendations")
-                        else:
-                            yield self._format_event("error", "Failed to analyze market sentiment")
-                    else:
-                        yield self._format_event("error", "Failed to monitor key influencers")
-                else:
-                    yield self._format_event("error", "Failed to analyze portfolio news")
-            else:
-                yield self._format_event("error", "Failed to collect global news")
-                    
+            yield self._build_event("status", "Starting market sentiment analysis...")
+
+            runners = {
+                task_name: self._traced_stage(task_name, getattr(self, stage["method"]))
+                for task_name, stage in self.STAGES.items() if task_name in self.selected_tasks
+            }
+            failed = False
+            started_at = {}
+            async for node_event in run_graph(self.task_graph, runners):
+                stage = self.STAGES[node_event.node]
+                if node_event.kind in ("completed", "failed") and node_event.node in started_at:
+                    STAGE_DURATION.labels(stage=stage["event"], outcome=node_event.kind).observe(
+                        time.perf_counter() - started_at.pop(node_event.node)
+                    )
+                if node_event.kind == "started":
+                    started_at[node_event.node] = time.perf_counter()
+                    yield self._build_event("status", stage["status"], task=stage["event"])
+                elif node_event.kind == "completed":
+                    yield self._build_event("task_complete", task=stage["event"], data=node_event.result)
+                elif node_event.kind == "failed":
+                    failed = True
+                    yield self._build_event("error", stage["error"], task=stage["event"])
+
+            if not failed:
+                yield self._build_event("complete", "Market sentiment analysis complete")
+
         except Exception as e:
-            logging.error(f"Error in stream_analysis: {str(e)}")
-            yield self._format_event("error", f"Error during analysis: {str(e)}")
-
-    def _format_event(self, event_type: str, message: str = None, task: str = None, data: Dict = None) -> str:
-        """Format an event for SSE streaming"""
-        event = {"type": event_type}
-        if message:
-            event["message"] = message
-        if task:
-            event["task"] = task
-        if data:
-            event["data"] = data
-        return f"data: {json.dumps(event)}\n\n"
\ No newline at end of file
+            logging.error(f"Error in iter_events: {str(e)}")
+            yield self._build_event("error", f"Error during analysis: {str(e)}")
+
+    def _traced_stage(self, task_name: str, runner):
+        """Wrap a stage runner in a span; run_graph starts each runner in its own task, under the flow's span"""
+        async def traced():
+            with span(f"stage {self.STAGES[task_name]['event']}", {"marketpulse.task": task_name}) as current:
+                result = await runner()
+                # Stage methods log and swallow their own errors, so success is the result itself
+                current.set_attribute("marketpulse.stage_succeeded", bool(result))
+                return result
+        return traced
+
+    def _build_event(self, event_type: str, message: str = None, task: str = None, data: Dict = None) -> StreamEvent:
+        """Build a stream event"""
+        return StreamEvent(event_type, message=message or None, task=task or None, data=data or None)
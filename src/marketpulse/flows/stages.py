@@ -0,0 +1,55 @@
+# src/marketpulse/flows/stages.py
+
+from typing import Dict, List, Optional
+
+# Event name and progress messages for each stage, keyed by its task in tasks.yaml.
+# Kept apart from the flow so the API can validate stage names without importing crewai.
+MARKET_STAGES = {
+    "collect_global_news_task": {
+        "event": "global_news",
+        "method": "collect_global_news",
+        "status": "Collecting global financial news...",
+        "error": "Failed to collect global news"
+    },
+    "analyze_portfolio_news_task": {
+        "event": "portfolio_news",
+        "method": "analyze_portfolio_news",
+        "status": "Analyzing portfolio-specific news...",
+        "error": "Failed to analyze portfolio news"
+    },
+    "monitor_key_influencers_task": {
+        "event": "influencer_data",
+        "method": "monitor_key_influencers",
+        "status": "Monitoring key market influencers...",
+        "error": "Failed to monitor key influencers"
+    },
+    "analyze_market_sentiment_task": {
+        "event": "sentiment_analysis",
+        "method": "analyze_market_sentiment",
+        "status": "Analyzing market sentiment...",
+        "error": "Failed to analyze market sentiment"
+    },
+    "compute_portfolio_metrics": {
+        "event": "portfolio_metrics",
+        "method": "compute_portfolio_metrics",
+        "status": "Computing portfolio metrics...",
+        "error": "Failed to compute portfolio metrics"
+    },
+    "generate_recommendations_task": {
+        "event": "recommendations",
+        "method": "generate_recommendations",
+        "status": "Generating trading recommendations...",
+        "error": "Failed to generate recommendations"
+    }
+}
+
+
+def stage_tasks(stages: Optional[List[str]], stage_config: Dict[str, Dict[str, str]] = MARKET_STAGES) -> Optional[List[str]]:
+    """Map requested output names (e.g. sentiment_analysis) to their tasks; None means every stage"""
+    if not stages:
+        return None
+    tasks = {stage["event"]: task_name for task_name, stage in stage_config.items()}
+    unknown = [name for name in stages if name not in tasks]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}. Available: {', '.join(tasks)}")
+    return [tasks[name] for name in stages]
@@ -0,0 +1,549 @@
+# src/marketpulse/jobs.py
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, List, Optional, Tuple
+
+from .utils.cancellation import CancelToken, set_cancel_token
+from .utils.metrics import FLOWS_IN_FLIGHT, JOBS, QUEUE_DEPTH
+from .utils.profiling import profile_run
+from .utils.tracing import Context, span
+from .utils.usage import UsageBudget, UsageLedger, set_usage_ledger
+
+# Runs one analysis (portfolio, preferences, **options) and yields its events as dicts, the form jobs buffer and replay
+FlowRunner = Callable[..., AsyncGenerator[Dict[str, Any], None]]
+
+
+async def run_market_flow(
+    portfolio: Dict[str, Any], preferences: Dict[str, Any], stages: Optional[List[str]] = None
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """Default runner: a MarketSentimentFlow, limited to the requested stages if any"""
+    from .flows.market_analysis_flow import MarketSentimentFlow
+    flow = MarketSentimentFlow(portfolio, preferences, stages=stages)
+    async for event in flow.iter_events():
+        yield event.to_dict()
+
+
+def fingerprint_request(
+    portfolio: Dict[str, Any], preferences: Dict[str, Any], options: Optional[Dict[str, Any]] = None
+) -> str:
+    """Identify requests that would produce the same analysis"""
+    request = {"portfolio": portfolio, "preferences": preferences}
+    if options:
+        request["options"] = options
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AdmissionError(Exception):
+    """Raised when a submission would exceed the queue or per-client limits"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """One submitted analysis, its event log and its result"""
+
+    def __init__(
+        self,
+        portfolio: Dict[str, Any],
+        preferences: Dict[str, Any],
+        replay_buffer: int = None,
+        client_id: str = None,
+        options: Optional[Dict[str, Any]] = None,
+        trace_context: Optional[Context] = None,
+        tenant: str = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.portfolio = portfolio
+        self.preferences = preferences
+        self.client_id = client_id
+        # Who is billed for the run: an authenticated tenant, else the client itself
+        self.tenant = tenant or client_id
+        # Extra runner keyword arguments, e.g. {"stages": [...]}, plus an optional usage "budget" and "profile" flag
+        self.options = options or {}
+        self.fingerprint = fingerprint_request(portfolio, preferences, self.options)
+        # The submitting request's span, so the run shows up inside that request's trace
+        self.trace_context = trace_context
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Bounded replay buffer; event ids keep counting past whatever has been dropped
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=replay_buffer or int(os.getenv("JOB_REPLAY_BUFFER", "1000")))
+        self.next_event_id = 0
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.usage: Optional[UsageLedger] = None
+        # Where the CPU profile and allocation report went, for runs submitted with profiling on
+        self.profile: Optional[Dict[str, Any]] = None
+        self.cancel_token = CancelToken()
+        # Stream-only jobs are cancelled once their last subscriber goes away
+        self.cancel_when_abandoned = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._abandon_handle: Optional[asyncio.TimerHandle] = None
+        self._condition = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    async def publish(self, event: Dict[str, Any]):
+        """Record an event and wake subscribers"""
+        if event.get("type") == "task_complete":
+            self.result[event.get("task")] = event.get("data")
+        elif event.get("type") == "error":
+            self.error = event.get("message")
+        async with self._condition:
+            self.events.append(event)
+            self.next_event_id += 1
+            self._condition.notify_all()
+
+    async def finish(self, status: str):
+        async with self._condition:
+            self.status = status
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    @property
+    def first_event_id(self) -> int:
+        """Id of the oldest event still in the replay buffer"""
+        return self.next_event_id - len(self.events)
+
+    async def subscribe_with_ids(self, after: int = 0) -> AsyncGenerator[Tuple[int, Dict[str, Any]], None]:
+        """
+        Replay buffered events from id `after` onwards, then follow live events until the job finishes.
+        Yields (event_id, event); events already dropped from the buffer are skipped.
+        """
+        event_id = after
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.next_event_id > event_id or self.finished)
+                event_id = max(event_id, self.first_event_id)
+                pending = list(self.events)[event_id - self.first_event_id:]
+                finished = self.finished
+            for event in pending:
+                yield event_id, event
+                event_id += 1
+            if finished and event_id >= self.next_event_id:
+                return
+
+    async def subscribe(self, after: int = 0) -> AsyncGenerator[Dict[str, Any], None]:
+        """Replay events from id `after` onwards, then follow live events until the job finishes"""
+        async for _, event in self.subscribe_with_ids(after):
+            yield event
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": self.next_event_id
+        }
+        if self.usage is not None:
+            job["usage"] = self.usage.to_dict()
+        if self.profile is not None:
+            job["profile"] = self.profile
+        if self.finished:
+            job["result"] = self.result
+            job["error"] = self.error
+        return job
+
+
+class BatchRun:
+    """
+    A batch analysis admitted by JobManager.admit_batch. Batches stream on their own connection rather than
+    through the job queue, but hold one of the client's slots and bill the tenant like a job does.
+    """
+
+    def __init__(self, manager: "JobManager", client_id: Optional[str], tenant: Optional[str], usage: UsageLedger):
+        self.manager = manager
+        self.client_id = client_id
+        self.tenant = tenant
+        self.usage = usage
+        self.charged_usd = 0.0
+        self.closed = False
+
+    def charge(self):
+        """Bill the tenant for what the batch spent since the last charge, e.g. once per finished portfolio"""
+        cost = self.usage.cost_usd - self.charged_usd
+        if cost > 0:
+            self.manager._charge_tenant(self.tenant, cost)
+            self.charged_usd += cost
+
+    def close(self):
+        """Bill any remaining spend and free the client slot; safe to call more than once"""
+        if self.closed:
+            return
+        self.closed = True
+        self.charge()
+        self.manager._release_client(self.client_id)
+
+
+class JobManager:
+    """
+    Runs submitted analyses on a bounded pool of background workers.
+    Admission is bounded too: at most max_queued jobs wait for a worker, each client
+    may have at most max_per_client jobs queued or running, and with a tenant budget
+    each tenant (an authenticated API key's tenant, else the client) may spend at most that many
+    estimated USD per UTC day.
+    """
+
+    def __init__(
+        self,
+        runner: FlowRunner = None,
+        workers: int = None,
+        retention_seconds: int = None,
+        max_queued: int = None,
+        max_per_client: int = None,
+        abandon_grace_seconds: float = None,
+        tenant_daily_budget_usd: float = None
+    ):
+        self.runner = runner or run_market_flow
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        if retention_seconds is None:
+            retention_seconds = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+        self.retention_seconds = retention_seconds
+        if max_queued is None:
+            max_queued = int(os.getenv("JOB_MAX_QUEUED", "20"))
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client or int(os.getenv("JOB_MAX_PER_CLIENT", "2"))
+        if abandon_grace_seconds is None:
+            abandon_grace_seconds = float(os.getenv("JOB_ABANDON_GRACE_SECONDS", "0.5"))
+        # Short grace period so a quick Last-Event-ID reconnect keeps the run alive
+        self.abandon_grace_seconds = abandon_grace_seconds
+        if tenant_daily_budget_usd is None and os.getenv("TENANT_DAILY_BUDGET_USD"):
+            tenant_daily_budget_usd = float(os.getenv("TENANT_DAILY_BUDGET_USD"))
+        self.tenant_daily_budget_usd = tenant_daily_budget_usd
+        # Estimated spend per client for the current UTC day: {client_id: (day, usd)}
+        self.tenant_spend: Dict[str, Tuple[str, float]] = {}
+        self.jobs: Dict[str, Job] = {}
+        # Queued or running jobs by request fingerprint, so duplicates share one flow
+        self.inflight: Dict[str, Job] = {}
+        self.deduplicated = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.running = 0
+        self.client_jobs: Dict[str, int] = {}
+        # Seeds Retry-After estimates until the first job finishes
+        self.average_duration = float(os.getenv("JOB_EXPECTED_SECONDS", "60"))
+        self._waiting: List[Job] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use, or the previous loop is gone (e.g. a restarted test client)
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._waiting = []
+        self.running = 0
+        self._worker_tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.finished or job.cancel_token.cancelled:
+                # Cancelled while it was still waiting; cancel() already freed its slot
+                self._queue.task_done()
+                continue
+            # Run in its own task so cancelling the job never takes the worker down with it. Created before
+            # any await, so from here on cancel() always goes through the task.
+            job.task = asyncio.create_task(self._run(job))
+            self.running += 1
+            FLOWS_IN_FLIGHT.inc()
+            if job in self._waiting:
+                self._waiting.remove(job)
+            QUEUE_DEPTH.set(len(self._waiting))
+            try:
+                await self._announce_positions()
+                await asyncio.wait({job.task})
+                if job.task.cancelled() and not job.finished:
+                    # Cancelled before _run got to its first line, so its cleanup never ran
+                    self._forget(job)
+                    await job.publish({"type": "cancelled", "message": f"Analysis cancelled: {job.cancel_token.reason}"})
+                    await job.finish("cancelled")
+            finally:
+                self.running -= 1
+                FLOWS_IN_FLIGHT.dec()
+                self._release(job)
+                self._queue.task_done()
+
+    async def _announce_positions(self):
+        """Tell every waiting job where it now stands in the queue"""
+        for position, job in enumerate(self._waiting, start=1):
+            await job.publish({"type": "queued", "position": position, "message": f"Queued, position {position}"})
+
+    def _release_client(self, client_id: Optional[str]):
+        if client_id is not None:
+            remaining = self.client_jobs.get(client_id, 1) - 1
+            if remaining > 0:
+                self.client_jobs[client_id] = remaining
+            else:
+                self.client_jobs.pop(client_id, None)
+
+    def _release(self, job: Job):
+        self._release_client(job.client_id)
+        if job.started_at is not None:
+            self.average_duration = 0.8 * self.average_duration + 0.2 * (time.time() - job.started_at)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a worker frees up for one more job"""
+        return max(1, math.ceil(self.average_duration * (len(self._waiting) + 1) / self.workers))
+
+    def tenant_remaining(self, tenant: Optional[str]) -> Optional[float]:
+        """USD left in a tenant's daily budget, or None when tenants are not budgeted"""
+        if self.tenant_daily_budget_usd is None or tenant is None:
+            return None
+        day, spent = self.tenant_spend.get(tenant, (None, 0.0))
+        if day != datetime.now(timezone.utc).date().isoformat():
+            spent = 0.0
+        return self.tenant_daily_budget_usd - spent
+
+    def _charge_tenant(self, tenant: Optional[str], cost_usd: float):
+        if self.tenant_daily_budget_usd is None or tenant is None:
+            return
+        today = datetime.now(timezone.utc).date().isoformat()
+        day, spent = self.tenant_spend.get(tenant, (today, 0.0))
+        self.tenant_spend[tenant] = (today, (spent if day == today else 0.0) + cost_usd)
+
+    def _check_limits(self, client_id: Optional[str], tenant: Optional[str] = None):
+        remaining = self.tenant_remaining(tenant or client_id)
+        if remaining is not None and remaining <= 0:
+            self.rejected += 1
+            JOBS.labels(outcome="rejected").inc()
+            now = datetime.now(timezone.utc)
+            tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+            raise AdmissionError(
+                f"Daily usage budget of ${self.tenant_daily_budget_usd:.2f} spent for this tenant",
+                math.ceil((tomorrow - now).total_seconds())
+            )
+        if client_id is not None and self.client_jobs.get(client_id, 0) >= self.max_per_client:
+            self.rejected += 1
+            JOBS.labels(outcome="rejected").inc()
+            raise AdmissionError(
+                f"Too many concurrent analyses for this client (limit {self.max_per_client})", self.retry_after()
+            )
+        if len(self._waiting) >= self.max_queued:
+            self.rejected += 1
+            JOBS.labels(outcome="rejected").inc()
+            raise AdmissionError(f"Analysis queue is full ({self.max_queued} waiting)", self.retry_after())
+
+    def check_admission(
+        self,
+        portfolio: Dict[str, Any],
+        preferences: Dict[str, Any],
+        client_id: str = None,
+        options: Optional[Dict[str, Any]] = None,
+        tenant: str = None
+    ):
+        """Raise AdmissionError if submitting this request now would be rejected; joining an in-flight job always succeeds"""
+        if fingerprint_request(portfolio, preferences, options) not in self.inflight:
+            self._check_limits(client_id, tenant)
+
+    def admit_batch(self, client_id: str = None, tenant: str = None) -> BatchRun:
+        """
+        Admit a batch under the same per-client limit and tenant budget as single analyses, or raise
+        AdmissionError. The batch holds a client slot until BatchRun.close() and spends from a ledger
+        capped by what is left of the tenant's daily budget.
+        """
+        self._check_limits(client_id, tenant)
+        if client_id is not None:
+            self.client_jobs[client_id] = self.client_jobs.get(client_id, 0) + 1
+        tenant = tenant or client_id
+        usage = UsageLedger(self._usage_budget(tenant), tenant=tenant, run_id=uuid.uuid4().hex)
+        return BatchRun(self, client_id, tenant, usage)
+
+    def _usage_budget(self, tenant: Optional[str], requested: Optional[Dict[str, Any]] = None) -> Optional[UsageBudget]:
+        """The request's own budget, capped by what is left of the tenant's daily budget"""
+        budget = UsageBudget.from_dict(requested)
+        remaining = self.tenant_remaining(tenant)
+        if remaining is not None:
+            budget = budget or UsageBudget()
+            budget.max_cost_usd = remaining if budget.max_cost_usd is None else min(budget.max_cost_usd, remaining)
+        return budget
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        # Crew threads and tool calls started from here see the job's token and usage ledger
+        set_cancel_token(job.cancel_token)
+        job.usage = UsageLedger(
+            self._usage_budget(job.tenant, job.options.get("budget")), tenant=job.tenant, run_id=job.id
+        )
+        set_usage_ledger(job.usage)
+        options = {key: value for key, value in job.options.items() if key not in ("budget", "profile")}
+        # Nothing is sampled or traced unless an admin asked for a profile of this run
+        profiler = profile_run(job.id) if job.options.get("profile") else contextlib.nullcontext()
+        completed = cancelled = False
+        final = None
+        attributes = {"marketpulse.job_id": job.id, "marketpulse.stages": ",".join(job.options.get("stages") or [])}
+        try:
+            with span("analysis", attributes, context=job.trace_context) as current:
+                with profiler as job.profile:
+                    async for event in self.runner(job.portfolio, job.preferences, **options):
+                        if event.get("type") == "complete":
+                            # The final event tells the client what the run cost
+                            event = {**event, "usage": job.usage.to_dict()}
+                            completed = True
+                            if job.profile is not None:
+                                # Held back until the profile is written, so it can say where the files are
+                                final = event
+                                continue
+                        await job.publish(event)
+                if final is not None:
+                    await job.publish({**final, "profile": job.profile})
+                current.set_attribute("marketpulse.completed", completed)
+        except asyncio.CancelledError:
+            cancelled = True
+        except Exception as e:
+            logging.error(f"Error in job {job.id}: {str(e)}")
+            await job.publish({"type": "error", "message": f"Error during analysis: {str(e)}"})
+        finally:
+            self._forget(job)
+            self._charge_tenant(job.tenant, job.usage.cost_usd)
+        if cancelled:
+            await job.publish({
+                "type": "cancelled",
+                "message": f"Analysis cancelled: {job.cancel_token.reason}",
+                "usage": job.usage.to_dict()
+            })
+            await job.finish("cancelled")
+        else:
+            await job.finish("completed" if completed else "failed")
+            JOBS.labels(outcome=job.status).inc()
+
+    def _forget(self, job: Job):
+        if self.inflight.get(job.fingerprint) is job:
+            del self.inflight[job.fingerprint]
+
+    def cancel(self, job: Job, reason: str = "cancelled") -> bool:
+        """Stop a queued or running job; running crews stop at their next tool call or agent step"""
+        if job.finished or job.cancel_token.cancelled:
+            return False
+        job.cancel_token.cancel(reason)
+        self.cancelled += 1
+        JOBS.labels(outcome="cancelled").inc()
+        logging.info(f"Cancelling job {job.id}: {reason}")
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Never started: free its queue slot now, the worker skips it later
+            if job in self._waiting:
+                self._waiting.remove(job)
+                QUEUE_DEPTH.set(len(self._waiting))
+            self._forget(job)
+            self._release(job)
+            # Finished right away, so a worker dequeuing it before finish() runs still skips it
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            asyncio.get_running_loop().create_task(job.finish("cancelled"))
+        return True
+
+    def _cancel_if_abandoned(self, job: Job):
+        job._abandon_handle = None
+        if job.subscribers == 0 and job.cancel_when_abandoned:
+            self.cancel(job, "client disconnected")
+
+    async def follow(self, job: Job, after: int = 0) -> AsyncGenerator[Tuple[int, Dict[str, Any]], None]:
+        """Subscribe to a job while counting the subscriber, so abandoned stream-only jobs get cancelled"""
+        job.subscribers += 1
+        if job._abandon_handle is not None:
+            job._abandon_handle.cancel()
+            job._abandon_handle = None
+        try:
+            async for item in job.subscribe_with_ids(after):
+                yield item
+        finally:
+            job.subscribers -= 1
+            if job.subscribers == 0 and job.cancel_when_abandoned and not job.finished:
+                job._abandon_handle = asyncio.get_running_loop().call_later(
+                    self.abandon_grace_seconds, self._cancel_if_abandoned, job
+                )
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def submit(
+        self,
+        portfolio: Dict[str, Any],
+        preferences: Dict[str, Any],
+        dedupe: bool = True,
+        client_id: str = None,
+        cancel_when_abandoned: bool = False,
+        options: Optional[Dict[str, Any]] = None,
+        trace_context: Optional[Context] = None,
+        tenant: str = None
+    ) -> Job:
+        """
+        Queue an analysis and return its job immediately.
+        An identical request that is already queued or running is returned instead of starting a new flow.
+        With cancel_when_abandoned the job is cancelled once no stream follows it (see follow()).
+        Raises AdmissionError when the wait queue or the client's concurrency limit is full, or the tenant
+        (default: the client) has spent its daily budget.
+        """
+        self._ensure_workers()
+        self._prune()
+        if dedupe:
+            existing = self.inflight.get(fingerprint_request(portfolio, preferences, options))
+            if existing is not None:
+                self.deduplicated += 1
+                JOBS.labels(outcome="deduplicated").inc()
+                # Anyone who asked for a detached job keeps it alive for everyone
+                existing.cancel_when_abandoned = existing.cancel_when_abandoned and cancel_when_abandoned
+                return existing
+        self._check_limits(client_id, tenant)
+
+        job = Job(
+            portfolio, preferences, client_id=client_id, options=options, trace_context=trace_context, tenant=tenant
+        )
+        job.cancel_when_abandoned = cancel_when_abandoned
+        self.jobs[job.id] = job
+        self.inflight[job.fingerprint] = job
+        if client_id is not None:
+            self.client_jobs[client_id] = self.client_jobs.get(client_id, 0) + 1
+        busy = self.running + len(self._waiting) >= self.workers
+        self._waiting.append(job)
+        QUEUE_DEPTH.set(len(self._waiting))
+        if busy:
+            # Every worker is taken: the client sees its place in line until one frees up
+            position = len(self._waiting)
+            await job.publish({"type": "queued", "position": position, "message": f"Queued, position {position}"})
+        await self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job that is queued, running or still within its retention window"""
+        self._prune()
+        return self.jobs.get(job_id)
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
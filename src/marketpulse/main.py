@@ -1,14 +1,66 @@
 # src/market_sentiment/main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from .flows.market_analysis_flow import MarketSentimentFlow
-from typing import AsyncGenerator, Dict, Any, List
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from .batch import BatchAnalyzer, BatchItem
+from .flows.stages import stage_tasks
+from .demo import DEMO_PORTFOLIO, DEMO_PREFERENCES, get_demo_store
+from .jobs import AdmissionError, BatchRun, Job, get_job_manager
+from .utils.cassette import configure_cassette, eject_cassette
+from .utils.cancellation import CancelToken, set_cancel_token
+from .utils.lazy_imports import prewarm_enabled, prewarm_imports
+from .utils.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, STREAM_BYTES, mark_dead_workers, mark_worker_dead, multiprocess_dir,
+    render as render_metrics
+)
+from .utils.profiling import profile_dir, profiling_active, safe_run_id
+from .utils.stage_cache import get_stage_cache
+from .utils.stream_utils import format_event_id, parse_last_event_id
+from .utils.tracing import Span, SpanKind, configure_tracing, context_with, shutdown_tracing, span, start_span
+from .utils.usage import set_usage_ledger
+from .utils.wire_format import MEDIA_TYPES, compress_stream, encode_event, negotiate_encoding, negotiate_format
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Callable, Dict, Any, List, Optional
 import asyncio
-from pydantic import BaseModel
+import logging
+import os
+import secrets
+from pydantic import BaseModel, Field
+
+def __getattr__(name: str):
+    # crewai is only imported once a flow actually runs; keep main.MarketSentimentFlow working for callers
+    if name == "MarketSentimentFlow":
+        from .flows.market_analysis_flow import MarketSentimentFlow
+        return MarketSentimentFlow
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Keep the demo result precomputed in the background while the app is up"""
+    configure_tracing()
+    # CASSETTE_MODE=replay serves recorded provider and LLM responses, e.g. for demos and load tests
+    configure_cassette()
+    demo_store = get_demo_store()
+    background = []
+    if demo_store.refresh_seconds > 0:
+        background.append(asyncio.create_task(demo_store.run_forever()))
+    if prewarm_enabled():
+        # Startup finishes first, so health checks pass while crewai loads in a thread
+        background.append(asyncio.create_task(asyncio.to_thread(prewarm_imports)))
+    metrics_dir = multiprocess_dir()
+    if metrics_dir:
+        # Workers that crashed never ran their shutdown; stop counting their in-flight gauges
+        mark_dead_workers(metrics_dir)
+    yield
+    for task in background:
+        task.cancel()
+    mark_worker_dead()
+    eject_cassette()
+    shutdown_tracing()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +71,14 @@ app.add_middleware(
     expose_headers=["Content-Type", "text/event-stream"]
 )
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Content-Type": "text/event-stream",
+    "X-Accel-Buffering": "no",
+    "Transfer-Encoding": "chunked"
+}
+
 class Portfolio(BaseModel):
     """User portfolio model"""
     holdings: List[Dict[str, Any]]
@@ -29,72 +89,481 @@ class Preferences(BaseModel):
     preferred_sectors: List[str] = []
     preferred_regions: List[str] = []
     investment_horizon: str
+    # Position limits in percent of portfolio value; holdings outside them are reported as limit breaches
+    max_position_size: Optional[float] = Field(None, ge=0, le=100)
+    min_position_size: Optional[float] = Field(None, ge=0, le=100)
+
+class UsageBudgetModel(BaseModel):
+    """Per-request usage limits; stages stop (or fall back to stale cached output) once one is reached"""
+    max_tokens: Optional[int] = Field(None, ge=0)
+    max_cost_usd: Optional[float] = Field(None, ge=0)
+    max_api_calls: Optional[int] = Field(None, ge=0)
 
 class SentimentRequest(BaseModel):
     """Request model for sentiment analysis"""
     portfolio: Portfolio
     preferences: Preferences
+    # Outputs to compute (e.g. ["sentiment_analysis"]); their dependencies run, everything else is skipped
+    stages: Optional[List[str]] = None
+    budget: Optional[UsageBudgetModel] = None
+
+class BatchPortfolio(BaseModel):
+    """One client portfolio in a batch request; id defaults to its position"""
+    id: Optional[str] = None
+    portfolio: Portfolio
+    preferences: Preferences
+
+class BatchSentimentRequest(BaseModel):
+    """Request model for batch sentiment analysis"""
+    portfolios: List[BatchPortfolio]
+
+# Per-portfolio stages sent with each portfolio_complete event; shared stages are sent once
+BATCH_PORTFOLIO_STAGES = ("portfolio_news", "sentiment_analysis", "recommendations")
+active_batches = 0
+
+def reserve_batch_slot() -> Optional[Callable[[], None]]:
+    """
+    Take one of BATCH_MAX_ACTIVE batch slots before the response starts, so simultaneous requests cannot
+    all pass the check. Returns the slot's release function (safe to call more than once), or None when full.
+    """
+    global active_batches
+    if active_batches >= int(os.getenv("BATCH_MAX_ACTIVE", "2")):
+        return None
+    active_batches += 1
+    released = False
+
+    def release():
+        global active_batches
+        nonlocal released
+        if not released:
+            released = True
+            active_batches -= 1
+    return release
+
+async def count_stream_bytes(chunks: AsyncGenerator[bytes, None], route: str, wire_format: str) -> AsyncGenerator[bytes, None]:
+    """Pass chunks through, counting the bytes actually written to the client"""
+    async for chunk in chunks:
+        STREAM_BYTES.labels(route=route, format=wire_format).inc(len(chunk))
+        yield chunk
 
-async def event_generator(portfolio: Dict[str, Any], preferences: Dict[str, Any]) -> AsyncGenerator[str, None]:
-    """Generate SSE events from sentiment analysis flow"""
-    flow = MarketSentimentFlow(portfolio, preferences)
-    async for event in flow.stream_analysis():
-        yield event
+def stream_response(
+    generator: AsyncGenerator, wire_format: str, http_request: Request, background: Optional[BackgroundTask] = None
+) -> StreamingResponse:
+    """Wrap an event generator in a streaming response, compressed when the client accepts it"""
+    headers = dict(SSE_HEADERS, **{"Content-Type": MEDIA_TYPES[wire_format], "Vary": "Accept, Accept-Encoding"})
+    encoding = negotiate_encoding(http_request.headers.get("accept-encoding"))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    # Label by route template, not the raw path, so job ids don't become label values
+    route = getattr(http_request.scope.get("route"), "path", "unknown")
+    return StreamingResponse(
+        count_stream_bytes(compress_stream(generator, encoding), route, wire_format),
+        media_type=MEDIA_TYPES[wire_format],
+        headers=headers,
+        background=background
+    )
+
+def client_key(http_request: Request) -> str:
+    """
+    Identify the caller for per-client limits. Behind TRUSTED_PROXY_COUNT proxies (default 0) the caller is
+    the hop the outermost of them appended to X-Forwarded-For; hops further left are client-supplied and
+    never trusted. Without proxies, or when the header is short of hops, it is the peer address.
+    """
+    trusted = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+    forwarded = http_request.headers.get("x-forwarded-for")
+    if trusted > 0 and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= trusted:
+            return hops[-trusted]
+    return http_request.client.host if http_request.client else "unknown"
+
+def tenant_key(http_request: Request) -> str:
+    """
+    Who is billed against TENANT_DAILY_BUDGET_USD: the tenant of the request's X-API-Key, looked up in
+    TENANT_API_KEYS ("key=tenant,key=tenant"), else the client address. Unknown keys get 401.
+    """
+    api_key = http_request.headers.get("x-api-key")
+    if not api_key:
+        return client_key(http_request)
+    for entry in os.getenv("TENANT_API_KEYS", "").split(","):
+        key, _, tenant = entry.strip().partition("=")
+        if key and tenant and secrets.compare_digest(api_key, key):
+            return f"tenant:{tenant}"
+    raise HTTPException(status_code=401, detail="Invalid API key")
+
+def flow_options(request: SentimentRequest) -> Dict[str, Any]:
+    """Job options for a request (stages, usage budget), rejecting unknown stage names with 422"""
+    options = {}
+    if request.stages:
+        try:
+            stage_tasks(request.stages)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        options["stages"] = sorted(set(request.stages))
+    budget = request.budget.dict(exclude_none=True) if request.budget is not None else {}
+    if budget:
+        options["budget"] = budget
+    return options
+
+def admit(
+    portfolio: Dict[str, Any],
+    preferences: Dict[str, Any],
+    client_id: Optional[str],
+    options: Optional[Dict[str, Any]] = None,
+    tenant: Optional[str] = None
+):
+    """Fail fast with 429 and Retry-After instead of opening a stream that cannot be served"""
+    try:
+        get_job_manager().check_admission(portfolio, preferences, client_id, options, tenant)
+    except AdmissionError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def event_generator(
+    portfolio: Dict[str, Any],
+    preferences: Dict[str, Any],
+    last_event_id: Optional[str] = None,
+    client_id: Optional[str] = None,
+    wire_format: str = "sse",
+    options: Optional[Dict[str, Any]] = None,
+    request_span: Optional[Span] = None,
+    tenant: Optional[str] = None
+) -> AsyncGenerator[bytes, None]:
+    """Generate stream events from sentiment analysis flow, sharing one flow between identical requests"""
+    job_manager = get_job_manager()
+    job, after = None, 0
+    resume = parse_last_event_id(last_event_id)
+    if resume is not None:
+        # Reconnect: pick up the original run where the client left off instead of re-running it
+        job = job_manager.get(resume[0])
+        after = resume[1] + 1
+        if job is not None and job.status == "cancelled":
+            job = None
+    if job is None:
+        try:
+            job = await job_manager.submit(
+                portfolio, preferences, client_id=client_id, cancel_when_abandoned=True, options=options,
+                trace_context=context_with(request_span) if request_span is not None else None, tenant=tenant
+            )
+            after = 0
+        except AdmissionError as e:
+            # Lost a race for the last slot after the up-front admission check
+            yield encode_event({"type": "error", "message": str(e), "retry_after": e.retry_after}, wire_format)
+            return
+    if request_span is not None:
+        # Requests that joined an in-flight or resumed run find its spans under this job id
+        request_span.set_attribute("marketpulse.job_id", job.id)
+        request_span.set_attribute("marketpulse.resumed", after > 0)
+    # Late joiners replay everything the running flow has emitted so far; when the last
+    # client disconnects, the flow is cancelled instead of running on for nobody
+    async for event_id, event in job_manager.follow(job, after):
+        yield encode_event(event, wire_format, format_event_id(job.id, event_id))
         await asyncio.sleep(0)
 
+async def traced_stream(chunks: AsyncGenerator[bytes, None], request_span: Span) -> AsyncGenerator[bytes, None]:
+    """Keep a request's span open until its stream has been fully sent (or the client went away)"""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception as e:
+        request_span.record_exception(e)
+        raise
+    finally:
+        request_span.end()
+
+def require_admin(x_admin_token: Optional[str]):
+    """Reject admin requests unless they carry the configured ADMIN_TOKEN"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def profile_options(options: Dict[str, Any], x_profile: Optional[str], x_admin_token: Optional[str]) -> Dict[str, Any]:
+    """Profile this run when an admin sends X-Profile: true; one run is profiled at a time"""
+    if not x_profile or x_profile.lower() not in ("1", "true", "yes"):
+        return options
+    require_admin(x_admin_token)
+    active = profiling_active()
+    if active is not None:
+        raise HTTPException(status_code=409, detail=f"Run {active} is already being profiled")
+    return {**options, "profile": True}
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, merged across workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/api/sentiment/analyze")
-async def analyze_sentiment(request: SentimentRequest):
-    """Analyze market sentiment for a user's portfolio"""
+async def analyze_sentiment(
+    request: SentimentRequest,
+    http_request: Request,
+    last_event_id: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Analyze market sentiment for a user's portfolio; send Last-Event-ID to resume a dropped stream"""
+    portfolio_dict = request.portfolio.dict()
+    preferences_dict = request.preferences.dict()
+    options = profile_options(flow_options(request), x_profile, x_admin_token)
+    client_id = client_key(http_request)
+    tenant = tenant_key(http_request)
+    wire_format = negotiate_format(http_request.headers.get("accept"))
+    if parse_last_event_id(last_event_id) is None:
+        admit(portfolio_dict, preferences_dict, client_id, options, tenant)
+    # Root span for the request; the flow, its stages, crews and tool calls nest under it
+    request_span = start_span(
+        "POST /api/sentiment/analyze",
+        {"http.request.method": "POST", "http.route": "/api/sentiment/analyze", "client.address": client_id,
+         "marketpulse.holdings": len(portfolio_dict["holdings"]), "marketpulse.wire_format": wire_format},
+        kind=SpanKind.SERVER
+    )
     try:
-        portfolio_dict = request.portfolio.dict()
-        preferences_dict = request.preferences.dict()
-        
-        return StreamingResponse(
-            event_generator(portfolio_dict, preferences_dict),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream",
-                "X-Accel-Buffering": "no",
-                "Transfer-Encoding": "chunked"
-            }
+        return stream_response(
+            traced_stream(
+                event_generator(
+                    portfolio_dict, preferences_dict, last_event_id, client_id, wire_format, options, request_span,
+                    tenant
+                ),
+                request_span
+            ),
+            wire_format,
+            http_request
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+async def demo_event_generator(
+    pace: float, last_event_id: Optional[str] = None, wire_format: str = "sse"
+) -> AsyncGenerator[bytes, None]:
+    """Replay the precomputed demo analysis without running any crews"""
+    demo_store = get_demo_store()
+    after = 0
+    resume = parse_last_event_id(last_event_id)
+    if resume is not None and resume[0] == demo_store.run_id:
+        after = resume[1] + 1
+    # Every demo visitor gets the same bytes, so they are encoded once per refresh
+    async for chunk in demo_store.replay_encoded(wire_format, pace, after):
+        yield chunk
+
 @app.get("/api/sentiment/demo")
-async def analyze_sentiment_demo():
-    """Demo endpoint with sample portfolio data"""
-    sample_portfolio = {
-        "holdings": [
-            {"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"},
-            {"ticker": "MSFT", "company": "Microsoft Corp.", "allocation": 12, "sector": "Technology"},
-            {"ticker": "AMZN", "company": "Amazon.com Inc.", "allocation": 10, "sector": "Consumer Discretionary"},
-            {"ticker": "GOOGL", "company": "Alphabet Inc.", "allocation": 8, "sector": "Communication Services"},
-            {"ticker": "TSLA", "company": "Tesla Inc.", "allocation": 5, "sector": "Consumer Discretionary"}
-        ]
-    }
+async def analyze_sentiment_demo(
+    http_request: Request, pace: Optional[float] = None, last_event_id: Optional[str] = Header(None)
+):
+    """Demo endpoint with sample portfolio data, served from the precomputed result"""
+    if pace is None:
+        pace = float(os.getenv("DEMO_REPLAY_PACE", "0"))
+    wire_format = negotiate_format(http_request.headers.get("accept"))
+    demo_store = get_demo_store()
+    if demo_store.ready:
+        generator = demo_event_generator(max(pace, 0), last_event_id, wire_format)
+    else:
+        # Nothing precomputed yet (first boot); concurrent visitors still share one live flow
+        client_id = client_key(http_request)
+        admit(DEMO_PORTFOLIO, DEMO_PREFERENCES, client_id)
+        generator = event_generator(DEMO_PORTFOLIO, DEMO_PREFERENCES, last_event_id, client_id, wire_format)
     
-    sample_preferences = {
-        "risk_tolerance": "moderate",
-        "preferred_sectors": ["Technology", "Healthcare"],
-        "preferred_regions": ["US", "Europe"],
-        "investment_horizon": "medium-term"
+    return stream_response(generator, wire_format, http_request)
+
+async def batch_event_generator(
+    items: List[BatchItem], wire_format: str = "sse", release: Callable[[], None] = None,
+    batch_run: Optional[BatchRun] = None
+) -> AsyncGenerator[bytes, None]:
+    """
+    Run a batch and multiplex shared stages and per-portfolio results over one stream, then free its slot.
+    With a batch_run, usage goes to its ledger and the tenant is billed as each portfolio finishes.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel_token = CancelToken()
+
+    def on_shared(stage: str, data: Dict[str, Any]):
+        queue.put_nowait({"type": "task_complete", "task": stage, "data": data})
+
+    def on_result(portfolio_id: str, result: Dict[str, Any]):
+        if "error" in result:
+            queue.put_nowait({"type": "error", "portfolio_id": portfolio_id, "message": result["error"]})
+        else:
+            data = {stage: result.get(stage) for stage in BATCH_PORTFOLIO_STAGES}
+            queue.put_nowait({"type": "portfolio_complete", "portfolio_id": portfolio_id, "data": data})
+        if batch_run is not None:
+            batch_run.charge()
+
+    async def run():
+        set_cancel_token(cancel_token)
+        if batch_run is not None:
+            set_usage_ledger(batch_run.usage)
+        try:
+            with span("POST /api/sentiment/batch", {"marketpulse.portfolios": len(items)}, kind=SpanKind.SERVER):
+                summary = await BatchAnalyzer(on_result=on_result, on_shared=on_shared).run(items)
+            complete = {"type": "complete", "message": "Batch analysis complete", "data": summary.to_dict()}
+            if batch_run is not None:
+                complete["usage"] = batch_run.usage.to_dict()
+            queue.put_nowait(complete)
+        except Exception as e:
+            logging.error(f"Error in batch analysis: {str(e)}")
+            queue.put_nowait({"type": "error", "message": f"Error during batch analysis: {str(e)}"})
+        finally:
+            if batch_run is not None:
+                # Spend after a disconnect is billed too
+                batch_run.charge()
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        yield encode_event({"type": "status", "message": f"Starting batch analysis of {len(items)} portfolios..."}, wire_format)
+        while (event := await queue.get()) is not None:
+            yield encode_event(event, wire_format)
+    finally:
+        if release is not None:
+            release()
+        if not task.done():
+            # Nobody is reading the results any more
+            cancel_token.cancel("client disconnected")
+            task.cancel()
+
+@app.post("/api/sentiment/batch")
+async def analyze_sentiment_batch(request: BatchSentimentRequest, http_request: Request):
+    """
+    Analyze many portfolios at once, streaming every result over a single connection tagged by portfolio_id.
+    Admitted like a single analysis (per-client limit, tenant daily budget) on top of BATCH_MAX_ACTIVE.
+    """
+    max_portfolios = int(os.getenv("BATCH_MAX_PORTFOLIOS", "100"))
+    if not request.portfolios:
+        raise HTTPException(status_code=422, detail="At least one portfolio is required")
+    if len(request.portfolios) > max_portfolios:
+        raise HTTPException(status_code=422, detail=f"At most {max_portfolios} portfolios per batch")
+    items = [
+        BatchItem(id=entry.id or str(index), portfolio=entry.portfolio.dict(), preferences=entry.preferences.dict())
+        for index, entry in enumerate(request.portfolios, start=1)
+    ]
+    if len({item.id for item in items}) != len(items):
+        raise HTTPException(status_code=422, detail="Portfolio ids must be unique")
+    client_id = client_key(http_request)
+    tenant = tenant_key(http_request)
+    release_slot = reserve_batch_slot()
+    if release_slot is None:
+        raise HTTPException(status_code=429, detail="Too many batch analyses running", headers={"Retry-After": "60"})
+    try:
+        batch_run = get_job_manager().admit_batch(client_id, tenant)
+    except AdmissionError as e:
+        release_slot()
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    def release():
+        batch_run.close()
+        release_slot()
+
+    wire_format = negotiate_format(http_request.headers.get("accept"))
+    # The background task frees the slots even if the stream is never iterated
+    return stream_response(
+        batch_event_generator(items, wire_format, release, batch_run), wire_format, http_request,
+        BackgroundTask(release)
+    )
+
+async def job_event_generator(
+    job: Job, last_event_id: Optional[str] = None, wire_format: str = "sse"
+) -> AsyncGenerator[bytes, None]:
+    """
+    Replay a job's events so far (or those after Last-Event-ID), then follow it until it finishes.
+    Takes the job the endpoint already looked up, as it may expire from the manager before streaming starts.
+    """
+    after = 0
+    resume = parse_last_event_id(last_event_id)
+    if resume is not None and resume[0] == job.id:
+        after = resume[1] + 1
+    async for event_id, event in job.subscribe_with_ids(after):
+        yield encode_event(event, wire_format, format_event_id(job.id, event_id))
+
+@app.post("/api/sentiment/jobs", status_code=202)
+async def submit_sentiment_job(
+    request: SentimentRequest,
+    http_request: Request,
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Queue an analysis and return its job id without waiting for the flow"""
+    options = profile_options(flow_options(request), x_profile, x_admin_token)
+    tenant = tenant_key(http_request)
+    try:
+        with span("POST /api/sentiment/jobs", {"http.route": "/api/sentiment/jobs"}, kind=SpanKind.SERVER) as current:
+            job = await get_job_manager().submit(
+                request.portfolio.dict(),
+                request.preferences.dict(),
+                client_id=client_key(http_request),
+                options=options,
+                trace_context=context_with(current),
+                tenant=tenant
+            )
+    except AdmissionError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
     }
-    
-    return StreamingResponse(
-        event_generator(sample_portfolio, sample_preferences),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-            "X-Accel-Buffering": "no",
-            "Transfer-Encoding": "chunked"
-        }
-    )
\ No newline at end of file
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll a job's status; finished jobs include their result until the retention window passes"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job_manager = get_job_manager()
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    job_manager.cancel(job, "cancelled by client")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, http_request: Request, last_event_id: Optional[str] = Header(None)):
+    """Attach to a job's event stream; disconnecting does not affect the job"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    wire_format = negotiate_format(http_request.headers.get("accept"))
+    return stream_response(job_event_generator(job, last_event_id, wire_format), wire_format, http_request)
+
+@app.get("/api/admin/cache/stages")
+async def stage_cache_stats(x_admin_token: Optional[str] = Header(None)):
+    """Report stage cache hit rate since process start"""
+    require_admin(x_admin_token)
+    return get_stage_cache().stats()
+
+@app.delete("/api/admin/cache/stages")
+async def invalidate_stage_cache(stage: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """Drop cached stage outputs, optionally only those for one task (e.g. collect_global_news_task)"""
+    require_admin(x_admin_token)
+    removed = get_stage_cache().invalidate(stage)
+    return {"removed": removed}
+
+@app.get("/api/admin/profiles/{run_id}")
+async def get_profile(run_id: str, kind: str = "flamegraph", x_admin_token: Optional[str] = Header(None)):
+    """Download a profiled run's folded CPU stacks (kind=flamegraph) or its top allocators (kind=allocations)"""
+    require_admin(x_admin_token)
+    suffixes = {"flamegraph": ".folded", "allocations": "-allocations.txt"}
+    if kind not in suffixes:
+        raise HTTPException(status_code=422, detail=f"kind must be one of {', '.join(suffixes)}")
+    path = os.path.join(profile_dir(), f"{safe_run_id(run_id)}{suffixes[kind]}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path, "r") as f:
+        return PlainTextResponse(f.read())
+
+@app.post("/api/admin/demo/refresh")
+async def refresh_demo(x_admin_token: Optional[str] = Header(None)):
+    """Recompute the demo result now instead of waiting for the schedule"""
+    require_admin(x_admin_token)
+    refreshed = await get_demo_store().refresh()
+    if not refreshed:
+        raise HTTPException(status_code=502, detail="Demo refresh failed; previous result kept")
+    return {"generated_at": get_demo_store().generated_at}
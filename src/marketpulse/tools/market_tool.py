@@ -1,6 +1,3 @@
-import logging
-logging.getLogger('opentelemetry.trace').setLevel(logging.ERROR)
-
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
@@ -9,6 +6,31 @@ import os
 import requests
 from datetime import datetime, timedelta
 import json
+import functools
+from ..utils.cancellation import check_cancelled
+from ..utils.metrics import TOOL_CACHE, TOOL_LATENCY
+from ..utils.tracing import http_span, set_attributes, span
+from ..utils.usage import allow_api_call, record_api_call
+
+# Overridable so benchmarks and local runs can point the tools at stand-in servers
+BING_SEARCH_URL = os.getenv("BING_SEARCH_URL", "https://api.bing.microsoft.com/v7.0/search")
+ALPHAVANTAGE_URL = os.getenv("ALPHAVANTAGE_URL", "https://www.alphavantage.co/query")
+
+
+def instrumented(run):
+    """Record each tool call's latency and trace it as a span, labelled with the tool name"""
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        with span(f"tool {self.name}", {"tool.name": self.name, "tool.input": str(args[0]) if args else None}), \
+                TOOL_LATENCY.labels(tool=self.name).time():
+            return run(self, *args, **kwargs)
+    return wrapper
+
+
+def record_cache(tool_name: str, hit: bool):
+    """Count a tool cache lookup and mark the current tool span with its outcome"""
+    TOOL_CACHE.labels(tool=tool_name, result="hit" if hit else "miss").inc()
+    set_attributes({"marketpulse.cache_hit": hit})
 
 class NewsSearchInput(BaseModel):
     """Input schema for NewsSearchTool."""
@@ -31,11 +53,18 @@ class FinancialNewsSearchTool(BaseTool):
         super().__init__()
         self.bing_search = BingSearchAPIWrapper(
             bing_subscription_key=os.getenv('BING_SUBSCRIPTION_KEY'),
-            bing_search_url="https://api.bing.microsoft.com/v7.0/search"
+            bing_search_url=BING_SEARCH_URL
         )
 
+    def cache_digest(self) -> str:
+        """Identify the cache window results are currently served from (one per day)"""
+        return datetime.now().strftime('%Y-%m-%d')
+
+    @instrumented
     def _run(self, query: str) -> str:
         """Run the tool with caching and usage tracking"""
+        # Abandoned analyses stop here instead of spending API quota
+        check_cancelled()
         cache_dir = ".cache/news"
         os.makedirs(cache_dir, exist_ok=True)
         
@@ -47,19 +76,18 @@ class FinancialNewsSearchTool(BaseTool):
         if os.path.exists(cache_file):
             file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
             if file_time.date() == datetime.now().date():
+                record_cache(self.name, True)
                 with open(cache_file, 'r') as f:
                     return f.read()
         
         # If no cache or cache is old, make the actual API call
+        record_cache(self.name, False)
+        if not allow_api_call("bing"):
+            return "No live news available: this analysis has used its API call budget."
         try:
-            results = self.bing_search.run(f"financial news {query}")
-            
-            # Create logs directory if it doesn't exist
-            os.makedirs(".logs", exist_ok=True)
-            
-            # Log usage
-            with open(".logs/bing_usage.log", "a") as log:
-                log.write(f"{datetime.now().isoformat()},query,{query}\n")
+            with http_span("GET", BING_SEARCH_URL):
+                results = self.bing_search.run(f"financial news {query}")
+            record_api_call("bing", self.name, "query", query)
             
             # Cache the results
             with open(cache_file, 'w') as f:
@@ -86,8 +114,14 @@ class StockQuoteTool(BaseTool):
     )
     args_schema: Type[BaseModel] = StockQuoteInput
 
+    def cache_digest(self) -> str:
+        """Identify the cache window quotes are currently served from (one per hour)"""
+        return datetime.now().strftime('%Y-%m-%dT%H')
+
+    @instrumented
     def _run(self, symbol: str) -> str:
         """Run the tool to get stock quote data"""
+        check_cancelled()
         cache_dir = ".cache/quotes"
         os.makedirs(cache_dir, exist_ok=True)
         
@@ -98,25 +132,25 @@ class StockQuoteTool(BaseTool):
         if os.path.exists(cache_file):
             file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
             if datetime.now() - file_time < timedelta(hours=1):
+                record_cache(self.name, True)
                 with open(cache_file, 'r') as f:
                     return f.read()
         
         # If no cache or cache is old, make the actual API call
+        record_cache(self.name, False)
+        if not allow_api_call("alphavantage"):
+            return f"No live quote available for {symbol}: this analysis has used its API call budget."
         try:
             # Using Alpha Vantage API as an example
             api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-            url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey={api_key}"
+            url = f"{ALPHAVANTAGE_URL}?function=GLOBAL_QUOTE&symbol={symbol}&apikey={api_key}"
             
-            response = requests.get(url)
+            with http_span("GET", url):
+                response = requests.get(url)
+                set_attributes({"http.response.status_code": response.status_code})
+            record_api_call("alphavantage", self.name, "quote", symbol)
             data = response.json()
             
-            # Create logs directory if it doesn't exist
-            os.makedirs(".logs", exist_ok=True)
-            
-            # Log usage
-            with open(".logs/alphavantage_usage.log", "a") as log:
-                log.write(f"{datetime.now().isoformat()},quote,{symbol}\n")
-            
             # Format the response
             if "Global Quote" in data and data["Global Quote"]:
                 quote = data["Global Quote"]
@@ -162,11 +196,18 @@ class InfluencerMonitorTool(BaseTool):
         super().__init__()
         self.bing_search = BingSearchAPIWrapper(
             bing_subscription_key=os.getenv('BING_SUBSCRIPTION_KEY'),
-            bing_search_url="https://api.bing.microsoft.com/v7.0/search"
+            bing_search_url=BING_SEARCH_URL
         )
 
+    def cache_digest(self) -> str:
+        """Identify the cache window statements are currently served from (four hours)"""
+        now = datetime.now()
+        return f"{now.strftime('%Y-%m-%d')}/{now.hour // 4}"
+
+    @instrumented
     def _run(self, person: str) -> str:
         """Run the tool with caching mechanism"""
+        check_cancelled()
         cache_dir = ".cache/influencers"
         os.makedirs(cache_dir, exist_ok=True)
         
@@ -178,21 +219,20 @@ class InfluencerMonitorTool(BaseTool):
         if os.path.exists(cache_file):
             file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
             if datetime.now() - file_time < timedelta(hours=4):
+                record_cache(self.name, True)
                 with open(cache_file, 'r') as f:
                     return f.read()
         
         # If no cache or cache is old, make the actual API call
+        record_cache(self.name, False)
+        if not allow_api_call("bing"):
+            return f"No recent statements available for {person}: this analysis has used its API call budget."
         try:
             # Craft a query focused on recent statements/actions with market impact
             query = f"{person} recent statement market finance economy (site:cnbc.com OR site:bloomberg.com OR site:reuters.com OR site:ft.com OR site:wsj.com)"
-            results = self.bing_search.run(query)
-            
-            # Create logs directory if it doesn't exist
-            os.makedirs(".logs", exist_ok=True)
-            
-            # Log usage
-            with open(".logs/bing_usage.log", "a") as log:
-                log.write(f"{datetime.now().isoformat()},influencer,{person}\n")
+            with http_span("GET", BING_SEARCH_URL):
+                results = self.bing_search.run(query)
+            record_api_call("bing", self.name, "influencer", person)
             
             # Cache the results
             with open(cache_file, 'w') as f:
@@ -0,0 +1,60 @@
+# src/marketpulse/utils/cancellation.py
+
+import asyncio
+import contextvars
+import threading
+from typing import Any, Optional
+
+
+class AnalysisCancelled(asyncio.CancelledError):
+    """
+    Raised at cancellation checkpoints once the analysis is abandoned.
+    Derives from CancelledError so stage-level `except Exception` handlers do not swallow it.
+    """
+
+
+class CancelToken:
+    """Thread-safe cancellation flag shared by a flow, its crews and their tool calls"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise AnalysisCancelled(self.reason)
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar(
+    "marketpulse_cancel_token", default=None
+)
+
+
+def set_cancel_token(token: CancelToken) -> contextvars.Token:
+    """Bind a token to the current context; asyncio.to_thread carries it into crew threads"""
+    return _current_token.set(token)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled():
+    """Cancellation checkpoint: a no-op outside a cancellable analysis"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellation_step_callback(step: Any):
+    """Crew step callback that stops an agent between LLM calls once its analysis is cancelled"""
+    check_cancelled()
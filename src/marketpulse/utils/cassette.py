@@ -0,0 +1,290 @@
+# src/marketpulse/utils/cassette.py
+
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+MODES = ("record", "replay")
+
+# Query parameters that carry credentials; dropped before anything is keyed or stored
+SECRET_PARAMS = {"apikey", "api_key", "key", "subscription-key", "token"}
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a call has no recording (and CASSETTE_STRICT is on or nothing is left)"""
+
+
+def _redact(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key.lower() not in SECRET_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def classify(url: str) -> Optional[str]:
+    """Which upstream a URL belongs to (bing, alphavantage, llm), or None for traffic that is left alone"""
+    if urlsplit(url).path.endswith(("/chat/completions", "/completions", "/responses", "/embeddings")):
+        return "llm"
+    if url.startswith(os.getenv("BING_SEARCH_URL", "https://api.bing.microsoft.com/v7.0/search")):
+        return "bing"
+    if url.startswith(os.getenv("ALPHAVANTAGE_URL", "https://www.alphavantage.co/query")):
+        return "alphavantage"
+    return None
+
+
+def _canonical_body(body: Optional[bytes]) -> bytes:
+    """JSON bodies are keyed on their content, not their key order or whitespace"""
+    if not body:
+        return b""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        return body
+
+
+def request_key(method: str, url: str, body: Optional[bytes]) -> str:
+    digest = hashlib.sha256()
+    for part in (method.upper().encode("utf-8"), _redact(url).encode("utf-8"), _canonical_body(body)):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _encode_body(content: bytes) -> Dict[str, str]:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry: Dict[str, Any]) -> bytes:
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+class Cassette:
+    """
+    Recorded responses of the external calls a run makes (Bing, Alpha Vantage, LLM completions).
+    Stored as gzipped JSON lines at <directory>/<name>.jsonl.gz, without credentials or request headers.
+    Replay matches each call on method, redacted URL and body; a call with no exact match gets the next
+    unused recording from the same provider, unless strict.
+    """
+
+    def __init__(self, mode: str, directory: str = None, name: str = None, simulate_latency: bool = None,
+                 strict: bool = None):
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {', '.join(MODES)}, not {mode}")
+        self.mode = mode
+        self.directory = directory or os.getenv("CASSETTE_DIR", ".cassettes")
+        self.name = name or os.getenv("CASSETTE_NAME", "default")
+        if simulate_latency is None:
+            simulate_latency = os.getenv("CASSETTE_REPLAY_LATENCY", "false").lower() in ("1", "true", "yes")
+        self.simulate_latency = simulate_latency
+        if strict is None:
+            strict = os.getenv("CASSETTE_STRICT", "false").lower() in ("1", "true", "yes")
+        self.strict = strict
+        self.entries: List[Dict[str, Any]] = []
+        self.replayed = 0
+        self._used: set = set()
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self.entries = self._load()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.jsonl.gz")
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"No cassette at {self.path}; record one with CASSETTE_MODE=record first")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def save(self):
+        """Write everything recorded so far (record mode only)"""
+        if self.mode != "record":
+            return
+        with self._lock:
+            entries = list(self.entries)
+        os.makedirs(self.directory, exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def record(self, provider: str, method: str, url: str, body: Optional[bytes], status: int,
+               content_type: Optional[str], content: bytes, elapsed: float):
+        entry = {
+            "provider": provider,
+            "method": method.upper(),
+            "url": _redact(url),
+            "key": request_key(method, url, body),
+            "status": status,
+            "content_type": content_type,
+            "elapsed": round(elapsed, 4),
+            **_encode_body(content)
+        }
+        with self._lock:
+            entry["seq"] = len(self.entries)
+            self.entries.append(entry)
+
+    def match(self, provider: str, method: str, url: str, body: Optional[bytes]) -> Dict[str, Any]:
+        """The recording to answer this call with"""
+        key = request_key(method, url, body)
+        with self._lock:
+            unused = [entry for entry in self.entries if entry["seq"] not in self._used]
+            entry = next((entry for entry in unused if entry["key"] == key), None)
+            if entry is None and not self.strict:
+                entry = next((entry for entry in unused if entry["provider"] == provider), None)
+                if entry is not None:
+                    logging.error(f"Cassette {self.name}: no exact recording for {method} {_redact(url)}, "
+                                  f"replaying the next {provider} response instead")
+            if entry is None:
+                # Identical calls made more often than recorded get the last matching response again
+                entry = next((entry for entry in reversed(self.entries) if entry["key"] == key), None)
+            if entry is None:
+                raise CassetteMiss(f"Cassette {self.name} has no recording for {method} {_redact(url)}")
+            self._used.add(entry["seq"])
+            self.replayed += 1
+        return entry
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return entry.get("elapsed", 0.0) if self.simulate_latency else 0.0
+
+
+_cassette: Optional[Cassette] = None
+_originals: Dict[Tuple[Any, str], Any] = {}
+_install_lock = threading.Lock()
+_exit_hook_registered = False
+
+
+def current_cassette() -> Optional[Cassette]:
+    return _cassette
+
+
+def configure_cassette(mode: str = None, directory: str = None, name: str = None,
+                       simulate_latency: bool = None) -> Optional[Cassette]:
+    """
+    Start recording or replaying external calls, per the arguments or CASSETTE_MODE (off by default).
+    Patches the requests and httpx transports, so tools and the LLM client are covered without changes.
+    """
+    global _cassette, _exit_hook_registered
+    mode = (mode or os.getenv("CASSETTE_MODE", "off")).lower()
+    if mode in ("", "off", "none", "false"):
+        return None
+    with _install_lock:
+        if _cassette is not None:
+            eject_cassette()
+        _cassette = Cassette(mode, directory, name, simulate_latency)
+        _install()
+        if not _exit_hook_registered:
+            atexit.register(_save_at_exit)
+            _exit_hook_registered = True
+    logging.info(f"Cassette {_cassette.name}: {mode} mode ({_cassette.path})")
+    return _cassette
+
+
+def _save_at_exit():
+    if _cassette is not None:
+        _cassette.save()
+
+
+def eject_cassette():
+    """Save a recording cassette and restore the real transports"""
+    global _cassette
+    if _cassette is None:
+        return
+    _cassette.save()
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+    _cassette = None
+
+
+def _install():
+    import httpx
+    import requests
+
+    def patch(owner, attribute, replacement):
+        _originals[(owner, attribute)] = getattr(owner, attribute)
+        setattr(owner, attribute, replacement)
+
+    original_requests_send = requests.Session.send
+    original_httpx_send = httpx.Client.send
+    original_async_send = httpx.AsyncClient.send
+
+    def requests_send(session, request, **kwargs):
+        cassette = _cassette
+        provider = classify(request.url) if cassette is not None else None
+        if provider is None:
+            return original_requests_send(session, request, **kwargs)
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        if cassette.mode == "replay":
+            entry = cassette.match(provider, request.method, request.url, body)
+            time.sleep(cassette.delay(entry))
+            response = requests.Response()
+            response.status_code = entry["status"]
+            response._content = _decode_body(entry)
+            response.headers = requests.structures.CaseInsensitiveDict(
+                {"Content-Type": entry["content_type"]} if entry.get("content_type") else {}
+            )
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            return response
+        started = time.perf_counter()
+        response = original_requests_send(session, request, **kwargs)
+        cassette.record(provider, request.method, request.url, body, response.status_code,
+                        response.headers.get("Content-Type"), response.content, time.perf_counter() - started)
+        return response
+
+    def replayed_httpx_response(entry: Dict[str, Any], request):
+        headers = {"Content-Type": entry["content_type"]} if entry.get("content_type") else {}
+        return httpx.Response(entry["status"], headers=headers, content=_decode_body(entry), request=request)
+
+    def httpx_send(client, request, **kwargs):
+        cassette = _cassette
+        provider = classify(str(request.url)) if cassette is not None else None
+        if provider is None:
+            return original_httpx_send(client, request, **kwargs)
+        body = request.read()
+        if cassette.mode == "replay":
+            entry = cassette.match(provider, request.method, str(request.url), body)
+            time.sleep(cassette.delay(entry))
+            return replayed_httpx_response(entry, request)
+        started = time.perf_counter()
+        response = original_httpx_send(client, request, **kwargs)
+        # Streamed completions are read in full here; the client then iterates the buffered body
+        content = response.read()
+        cassette.record(provider, request.method, str(request.url), body, response.status_code,
+                        response.headers.get("Content-Type"), content, time.perf_counter() - started)
+        return response
+
+    async def async_send(client, request, **kwargs):
+        import asyncio
+        cassette = _cassette
+        provider = classify(str(request.url)) if cassette is not None else None
+        if provider is None:
+            return await original_async_send(client, request, **kwargs)
+        body = await request.aread()
+        if cassette.mode == "replay":
+            entry = cassette.match(provider, request.method, str(request.url), body)
+            await asyncio.sleep(cassette.delay(entry))
+            return replayed_httpx_response(entry, request)
+        started = time.perf_counter()
+        response = await original_async_send(client, request, **kwargs)
+        content = await response.aread()
+        cassette.record(provider, request.method, str(request.url), body, response.status_code,
+                        response.headers.get("Content-Type"), content, time.perf_counter() - started)
+        return response
+
+    patch(requests.Session, "send", requests_send)
+    patch(httpx.Client, "send", httpx_send)
+    patch(httpx.AsyncClient, "send", async_send)
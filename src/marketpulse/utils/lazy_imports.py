@@ -0,0 +1,34 @@
+# src/marketpulse/utils/lazy_imports.py
+
+import importlib
+import logging
+import os
+import time
+from typing import Dict, List
+
+# Modules the first analysis would otherwise import on the request path (crewai alone is several seconds)
+PREWARM_MODULES: List[str] = [
+    "marketpulse.flows.market_analysis_flow",
+    "marketpulse.crew",
+    "marketpulse.tools.market_tool"
+]
+
+# Seconds each module took to import in the background, for startup diagnostics
+prewarm_timings: Dict[str, float] = {}
+
+
+def prewarm_enabled() -> bool:
+    return os.getenv("PREWARM_IMPORTS", "true").lower() not in ("0", "false", "no")
+
+
+def prewarm_imports(modules: List[str] = None) -> Dict[str, float]:
+    """Import heavy modules ahead of the first request; failures are logged and left for that request to surface"""
+    for name in modules or PREWARM_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logging.error(f"Error prewarming {name}: {str(e)}")
+            continue
+        prewarm_timings[name] = time.perf_counter() - started
+    return prewarm_timings
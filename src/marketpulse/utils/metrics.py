@@ -0,0 +1,105 @@
+# src/marketpulse/utils/metrics.py
+
+import glob
+import logging
+import os
+import re
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def multiprocess_dir() -> Optional[str]:
+    """
+    Directory shared by all uvicorn workers for prometheus_client's multiprocess mode; unset means
+    single-process metrics. It must be set before the workers start, as prometheus_client reads it at import.
+    """
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def render() -> bytes:
+    """Prometheus text for this process, or merged across every worker in multiprocess mode"""
+    directory = multiprocess_dir()
+    if not directory:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=directory)
+    return generate_latest(registry)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def mark_dead_workers(directory: str):
+    """Drop the live gauges of workers that died without shutting down cleanly (e.g. killed or crashed)"""
+    pids = set()
+    for path in glob.glob(os.path.join(directory, "gauge_live*_*.db")):
+        match = re.search(r"_(\d+)\.db$", path)
+        if match:
+            pids.add(int(match.group(1)))
+    for pid in pids:
+        if pid != os.getpid() and not _pid_alive(pid):
+            multiprocess.mark_process_dead(pid, directory)
+
+
+def mark_worker_dead():
+    """Remove this worker's live gauges on shutdown, so a recycled pid never inherits them"""
+    directory = multiprocess_dir()
+    if not directory:
+        return
+    try:
+        multiprocess.mark_process_dead(os.getpid(), directory)
+    except OSError as e:
+        logging.error(f"Error removing metrics files for worker {os.getpid()}: {str(e)}")
+
+
+# Application metrics. Gauges count live workers only; counters and histograms keep exited workers' totals.
+
+STAGE_DURATION = Histogram(
+    "marketpulse_stage_duration_seconds", "Flow stage duration", ["stage", "outcome"], buckets=STAGE_BUCKETS
+)
+STAGE_CACHE = Counter(
+    "marketpulse_stage_cache_total", "Stage result cache lookups", ["stage", "result"]
+)
+TOOL_LATENCY = Histogram(
+    "marketpulse_tool_latency_seconds", "Tool call latency, including cache lookups", ["tool"]
+)
+TOOL_CACHE = Counter(
+    "marketpulse_tool_cache_total", "Tool cache lookups", ["tool", "result"]
+)
+LLM_TOKENS = Counter(
+    "marketpulse_llm_tokens_total", "LLM tokens used per agent", ["agent", "kind"]
+)
+API_CALLS = Counter(
+    "marketpulse_external_api_calls_total", "Billable external API calls", ["provider"]
+)
+ESTIMATED_COST = Counter(
+    "marketpulse_estimated_cost_usd_total", "Estimated spend on LLM tokens and external APIs", ["kind"]
+)
+BUDGET_ACTIONS = Counter(
+    "marketpulse_budget_actions_total", "Stages downgraded or short-circuited by usage budgets", ["action"]
+)
+FLOWS_IN_FLIGHT = Gauge(
+    "marketpulse_flows_in_flight", "Analyses currently running", multiprocess_mode="livesum"
+)
+QUEUE_DEPTH = Gauge(
+    "marketpulse_job_queue_depth", "Analyses waiting for a worker", multiprocess_mode="livesum"
+)
+JOBS = Counter(
+    "marketpulse_jobs_total", "Analyses by outcome", ["outcome"]
+)
+STREAM_BYTES = Counter(
+    "marketpulse_stream_bytes_sent_total", "Bytes written to event streams, after compression", ["route", "format"]
+)
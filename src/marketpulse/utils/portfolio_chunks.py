@@ -0,0 +1,93 @@
+# src/marketpulse/utils/portfolio_chunks.py
+
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+
+def _position_size(holding: Dict[str, Any]) -> float:
+    """Best available measure of a holding's weight in the portfolio"""
+    if holding.get("allocation") is not None:
+        return float(holding["allocation"])
+    return float(holding.get("shares") or 0) * float(holding.get("purchase_price") or 0)
+
+
+def partition_holdings(holdings: List[Dict[str, Any]], chunk_size: int, strategy: str = "sector") -> List[List[Dict[str, Any]]]:
+    """
+    Split holdings into chunks of at most chunk_size.
+    "sector" keeps each sector together where it fits and packs small sectors into shared chunks;
+    "size" orders holdings by position size so each chunk covers a similar weight band.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if strategy not in ("sector", "size"):
+        raise ValueError(f"Unknown partition strategy: {strategy}")
+
+    if strategy == "size":
+        ordered = sorted(holdings, key=_position_size, reverse=True)
+        return [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+
+    by_sector: Dict[str, List[Dict[str, Any]]] = OrderedDict()
+    for holding in holdings:
+        by_sector.setdefault(holding.get("sector") or "Unknown", []).append(holding)
+
+    # Large sectors are split first, then the leftovers are packed first-fit, biggest first
+    groups = []
+    for sector_holdings in by_sector.values():
+        for i in range(0, len(sector_holdings), chunk_size):
+            groups.append(sector_holdings[i:i + chunk_size])
+    groups.sort(key=len, reverse=True)
+
+    chunks: List[List[Dict[str, Any]]] = []
+    for group in groups:
+        for chunk in chunks:
+            if len(chunk) + len(group) <= chunk_size:
+                chunk.extend(group)
+                break
+        else:
+            chunks.append(list(group))
+    return chunks
+
+
+def merge_portfolio_news(chunk_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce per-chunk analyze_portfolio_news_task outputs into a single result"""
+    companies: Dict[str, Dict[str, Any]] = OrderedDict()
+    sectors: Dict[str, Dict[str, Any]] = OrderedDict()
+
+    for result in chunk_results:
+        for company in result.get("company_news") or []:
+            key = company.get("ticker") or company.get("company")
+            if key not in companies:
+                companies[key] = dict(company, news_items=list(company.get("news_items") or []))
+                continue
+            merged = companies[key]
+            seen = {item.get("headline") for item in merged["news_items"]}
+            merged["news_items"].extend(
+                item for item in company.get("news_items") or [] if item.get("headline") not in seen
+            )
+
+        for sector in result.get("sector_news") or []:
+            name = sector.get("sector")
+            if name not in sectors:
+                sectors[name] = dict(sector, developments=list(sector.get("developments") or []))
+                continue
+            merged = sectors[name]
+            seen = {item.get("development") for item in merged["developments"]}
+            merged["developments"].extend(
+                item for item in sector.get("developments") or [] if item.get("development") not in seen
+            )
+
+    return {
+        "company_news": list(companies.values()),
+        "sector_news": list(sectors.values())
+    }
+
+
+def select_portfolio_news(portfolio_news: Dict[str, Any], portfolio: Dict[str, Any]) -> Dict[str, Any]:
+    """Cut a merged portfolio news result down to one portfolio's tickers and sectors"""
+    holdings = portfolio.get("holdings", [])
+    tickers = {h.get("ticker") for h in holdings}
+    sectors = {h.get("sector") for h in holdings}
+    return {
+        "company_news": [c for c in portfolio_news.get("company_news") or [] if c.get("ticker") in tickers],
+        "sector_news": [s for s in portfolio_news.get("sector_news") or [] if s.get("sector") in sectors]
+    }
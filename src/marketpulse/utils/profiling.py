@@ -0,0 +1,162 @@
+# src/marketpulse/utils/profiling.py
+
+import contextlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+# Only one profile runs at a time: the sampler and tracemalloc both see the whole process
+_active_lock = threading.Lock()
+_active_run: Optional[str] = None
+
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR", ".logs/profiles")
+
+
+def profiling_active() -> Optional[str]:
+    """Id of the run currently being profiled, if any"""
+    return _active_run
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # Function granularity (first line, not current line) so samples of one function merge in the flamegraph
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread each `interval` seconds from a background thread.
+    Unlike cProfile it costs nothing in the profiled code and covers crew worker threads, and the
+    result is in the folded format flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample_forever, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _sample_forever(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """One `root;...;leaf count` line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def top_allocators(snapshot: tracemalloc.Snapshot, limit: int = 25) -> List[Dict[str, Any]]:
+    """Source lines holding the most memory allocated since tracing started, largest first"""
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>")
+    ])
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+@contextlib.contextmanager
+def profile_run(run_id: str, directory: str = None, top: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Profile CPU and allocations for the with-block and write <run_id>.folded and <run_id>-allocations.txt.
+    Yields a dict that is filled in with the file paths and top allocators when the block exits. If another
+    run is already being profiled the block runs unprofiled and the dict says so.
+    """
+    global _active_run
+    directory = directory or profile_dir()
+    top = top or int(os.getenv("PROFILE_TOP_ALLOCATORS", "25"))
+    report: Dict[str, Any] = {"run_id": run_id}
+    with _active_lock:
+        busy = _active_run
+        if busy is None:
+            _active_run = run_id
+    if busy is not None:
+        logging.error(f"Not profiling {run_id}: run {busy} is already being profiled")
+        report["skipped"] = f"run {busy} is already being profiled"
+        yield report
+        return
+
+    profiler = SamplingProfiler()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        yield report
+    finally:
+        profiler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+        try:
+            report.update(_write_report(run_id, directory, profiler, snapshot, top, time.perf_counter() - started))
+        except OSError as e:
+            logging.error(f"Error writing profile for {run_id}: {str(e)}")
+        finally:
+            _active_run = None
+
+
+def _write_report(run_id: str, directory: str, profiler: SamplingProfiler, snapshot: tracemalloc.Snapshot,
+                  top: int, elapsed: float) -> Dict[str, Any]:
+    os.makedirs(directory, exist_ok=True)
+    name = safe_run_id(run_id)
+    folded_path = os.path.join(directory, f"{name}.folded")
+    with open(folded_path, "w") as f:
+        f.write(profiler.folded())
+
+    allocators = top_allocators(snapshot, top)
+    allocations_path = os.path.join(directory, f"{name}-allocations.txt")
+    with open(allocations_path, "w") as f:
+        for allocator in allocators:
+            f.write(f"{allocator['size_kb']:>10.1f} KiB {allocator['count']:>8} blocks  {allocator['location']}\n")
+
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "samples": profiler.samples,
+        "flamegraph": folded_path,
+        "allocations": allocations_path,
+        "top_allocators": allocators[:10]
+    }
+
+
+def safe_run_id(run_id: str) -> str:
+    """Run id usable as a file name (job ids are hex, CLI runs are timestamps)"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", run_id)
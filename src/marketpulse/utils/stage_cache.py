@@ -0,0 +1,161 @@
+# src/marketpulse/utils/stage_cache.py
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import STAGE_CACHE
+
+
+def _canonical(value: Any) -> Any:
+    """Reduce a config value to plain JSON types so the hash is stable across runs"""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_canonical(v) for v in value]
+        return sorted(items, key=json.dumps) if isinstance(value, set) else items
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    # Objects such as crewai Tasks referenced from `context:` hash by identity-free fields
+    for attr in ("name", "description"):
+        attr_value = getattr(value, attr, None)
+        if attr_value:
+            return str(attr_value)
+    return type(value).__name__
+
+
+def compute_stage_key(
+    agent_config: Dict[str, Any],
+    task_config: Dict[str, Any],
+    model: str,
+    temperature: float,
+    inputs: Dict[str, Any],
+    tool_digests: Dict[str, str] = None
+) -> str:
+    """Hash everything that determines a stage's prompt into a cache key"""
+    payload = {
+        "agent": _canonical(agent_config or {}),
+        "task": _canonical(task_config or {}),
+        "model": model,
+        "temperature": temperature,
+        "inputs": _canonical(inputs or {}),
+        "tools": _canonical(tool_digests or {})
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """File-backed cache of raw stage outputs keyed on a content hash"""
+
+    def __init__(self, cache_dir: str = None, ttl_seconds: int = None, enabled: bool = None):
+        self.cache_dir = cache_dir or os.getenv("STAGE_CACHE_DIR", ".cache/stages")
+        if ttl_seconds is None:
+            ttl_seconds = int(os.getenv("STAGE_CACHE_TTL", "14400"))
+        self.ttl = timedelta(seconds=ttl_seconds)
+        if enabled is None:
+            enabled = os.getenv("STAGE_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return f"{self.cache_dir}/{key}.json"
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[str]:
+        """Return the cached raw output for a key, or None when missing or expired (unless allow_stale)"""
+        raw, fresh = self.lookup(key)
+        return raw if fresh or allow_stale else None
+
+    def lookup(self, key: str, stage: str = None) -> Tuple[Optional[str], bool]:
+        """
+        Read a key once, returning (raw, fresh). An expired entry still comes back with fresh=False,
+        for callers that fall back to it, but counts as a miss.
+        """
+        raw = None
+        fresh = False
+        cache_file = self._path(key)
+        if self.enabled and os.path.exists(cache_file):
+            try:
+                file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
+                with open(cache_file, 'r') as f:
+                    raw = json.load(f)["raw"]
+                fresh = datetime.now() - file_time < self.ttl
+            except (OSError, ValueError, KeyError):
+                raw = None
+
+        self._record(hit=fresh)
+        if stage is not None:
+            STAGE_CACHE.labels(stage=stage, result="hit" if fresh else "miss").inc()
+        return raw, fresh
+
+    def set(self, key: str, raw: str, stage: str = None):
+        """Store a raw stage output under its key"""
+        if not self.enabled:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {"stage": stage, "created_at": datetime.now().isoformat(), "raw": raw}
+        # Write to a temp file first so concurrent readers never see a partial entry
+        tmp_file = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_file, self._path(key))
+
+    def invalidate(self, stage: str = None) -> int:
+        """Remove cached entries, optionally only those for one stage. Returns the count removed."""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        removed = 0
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            cache_file = f"{self.cache_dir}/{filename}"
+            if stage is not None:
+                try:
+                    with open(cache_file, 'r') as f:
+                        if json.load(f).get("stage") != stage:
+                            continue
+                except (OSError, ValueError):
+                    continue
+            try:
+                os.remove(cache_file)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the hit rate since process start"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "ttl_seconds": int(self.ttl.total_seconds())
+            }
+
+
+_stage_cache: Optional[StageCache] = None
+
+
+def get_stage_cache() -> StageCache:
+    """Return the process-wide stage cache shared by all flows"""
+    global _stage_cache
+    if _stage_cache is None:
+        _stage_cache = StageCache()
+    return _stage_cache
@@ -1,23 +1,61 @@
 # src/howdoyoufindme/utils/stream_utils.py
 
 import json
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
 
 from ..clean_json import clean_and_parse_json
+from .wire_format import encode_event
+
+
+@dataclass
+class StreamEvent:
+    """A progress event emitted by a flow; serialized only at the HTTP boundary"""
+    type: str
+    message: Optional[str] = None
+    task: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        event = {"type": self.type}
+        if self.message is not None:
+            event["message"] = self.message
+        if self.task is not None:
+            event["task"] = self.task
+        if self.data is not None:
+            event["data"] = self.data
+        return event
+
+    @classmethod
+    def from_dict(cls, event: Dict[str, Any]) -> "StreamEvent":
+        return cls(type=event["type"], message=event.get("message"), task=event.get("task"), data=event.get("data"))
 
 
 async def create_stream_event(
     event_type: str, message: str = None, task: str = None, data: Dict[str, Any] = None
 ) -> str:
     """Create a formatted stream event"""
-    event = {"type": event_type}
-    if message is not None:
-        event["message"] = message
-    if task is not None:
-        event["task"] = task
-    if data is not None:
-        event["data"] = data
-    return json.dumps(event) + "\n"
+    return json.dumps(StreamEvent(event_type, message, task, data).to_dict()) + "\n"
+
+
+def format_sse_event(event: Dict[str, Any], event_id: str = None) -> str:
+    """Format an event dict as a server-sent event, with an id line when the stream is resumable"""
+    return encode_event(event, "sse", event_id).decode("utf-8")
+
+
+def format_event_id(run_id: str, sequence: int) -> str:
+    """Build an SSE event id from the run it belongs to and its position in that run"""
+    return f"{run_id}:{sequence}"
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a Last-Event-ID header into (run_id, sequence); None if absent or malformed"""
+    if not value:
+        return None
+    run_id, _, sequence = value.strip().rpartition(":")
+    if not run_id or not sequence.isdigit():
+        return None
+    return run_id, int(sequence)
 
 
 async def process_task_result(task_name: str, raw_result: str) -> str:
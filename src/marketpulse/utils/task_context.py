@@ -0,0 +1,19 @@
+# src/marketpulse/utils/task_context.py
+
+from crewai import Task
+from crewai.tasks.task_output import TaskOutput
+
+
+def set_task_output(task: Task, raw: str):
+    """
+    Leave `raw` on the task as if its crew had just run it. Tasks that list it under `context:` read
+    its output when they kick off, so results from the stage cache, merged chunks or a shared batch
+    stage have to be put back here or downstream prompts go without them.
+    """
+    task.output = TaskOutput(
+        description=task.description,
+        name=task.name,
+        expected_output=task.expected_output,
+        raw=raw,
+        agent=task.agent.role if task.agent else ""
+    )
@@ -0,0 +1,145 @@
+# src/marketpulse/utils/task_graph.py
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import yaml
+
+
+@dataclass
+class NodeEvent:
+    """Progress of a single node while the graph runs"""
+    kind: str  # "started", "completed", "failed" or "skipped"
+    node: str
+    result: Any = None
+    error: Optional[str] = None
+
+
+class TaskGraph:
+    """Dependency graph of flow stages, built from the `context:` lists in tasks.yaml"""
+
+    def __init__(self, dependencies: Dict[str, List[str]]):
+        self.dependencies = {node: list(deps) for node, deps in dependencies.items()}
+        self._validate()
+
+    @classmethod
+    def from_config(cls, tasks_config: Dict[str, Dict[str, Any]]) -> "TaskGraph":
+        """Build the graph from a parsed tasks config"""
+        dependencies = {}
+        for task_name, task_config in tasks_config.items():
+            context = (task_config or {}).get("context") or []
+            dependencies[task_name] = [
+                dep if isinstance(dep, str) else getattr(dep, "name", str(dep)) for dep in context
+            ]
+        return cls(dependencies)
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "TaskGraph":
+        """Build the graph from a tasks.yaml file"""
+        with open(path, 'r') as f:
+            return cls.from_config(yaml.safe_load(f))
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self.order)
+
+    def add_node(self, node: str, dependencies: Iterable[str] = (), dependents: Iterable[str] = ()):
+        """Add a stage that is not declared in tasks.yaml (e.g. a local pre-pass)"""
+        self.dependencies[node] = list(dependencies)
+        for dependent in dependents:
+            self.dependencies[dependent].append(node)
+        self._validate()
+
+    def closure(self, targets: Iterable[str]) -> Set[str]:
+        """The targets plus everything they transitively depend on"""
+        needed: Set[str] = set()
+        stack = list(targets)
+        while stack:
+            node = stack.pop()
+            if node not in self.dependencies:
+                raise ValueError(f"Unknown task: {node}")
+            if node not in needed:
+                needed.add(node)
+                stack.extend(self.dependencies[node])
+        return needed
+
+    def _validate(self):
+        for node, deps in self.dependencies.items():
+            unknown = [dep for dep in deps if dep not in self.dependencies]
+            if unknown:
+                raise ValueError(f"Task {node} depends on unknown tasks: {', '.join(unknown)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order = []
+        visiting: Set[str] = set()
+        visited: Set[str] = set()
+
+        def visit(node: str):
+            if node in visited:
+                return
+            if node in visiting:
+                raise ValueError(f"Cycle detected in task graph at {node}")
+            visiting.add(node)
+            for dep in self.dependencies[node]:
+                visit(dep)
+            visiting.discard(node)
+            visited.add(node)
+            order.append(node)
+
+        for node in self.dependencies:
+            visit(node)
+        return order
+
+
+async def run_graph(
+    graph: TaskGraph,
+    runners: Dict[str, Callable[[], Awaitable[Any]]]
+) -> AsyncGenerator[NodeEvent, None]:
+    """
+    Run every node as soon as its dependencies have completed.
+    A node fails when its runner raises or returns a falsy result; its dependents are skipped.
+    """
+    results: Dict[str, Any] = {}
+    failed: Set[str] = set()
+    pending = [node for node in graph.order if node in runners]
+    running: Dict[asyncio.Task, str] = {}
+
+    try:
+        while pending or running:
+            for node in list(pending):
+                deps = [dep for dep in graph.dependencies[node] if dep in runners]
+                if any(dep in failed for dep in deps):
+                    pending.remove(node)
+                    failed.add(node)
+                    yield NodeEvent("skipped", node, error="dependency failed")
+                elif all(dep in results for dep in deps):
+                    pending.remove(node)
+                    running[asyncio.ensure_future(runners[node]())] = node
+                    yield NodeEvent("started", node)
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Error in task graph node {node}: {str(e)}")
+                    failed.add(node)
+                    yield NodeEvent("failed", node, error=str(e))
+                    continue
+                if result:
+                    results[node] = result
+                    yield NodeEvent("completed", node, result=result)
+                else:
+                    failed.add(node)
+                    yield NodeEvent("failed", node)
+    finally:
+        # Consumer went away or the graph errored: don't leave stages running unattended
+        for future in running:
+            future.cancel()
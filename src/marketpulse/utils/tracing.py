@@ -0,0 +1,144 @@
+# src/marketpulse/utils/tracing.py
+
+import contextlib
+import importlib
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional, Sequence
+from urllib.parse import urlsplit
+
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.trace import Span, SpanKind
+
+# Spans go nowhere until configure_tracing() installs an exporter
+_tracer: trace.Tracer = trace.NoOpTracer()
+_provider = None
+_lock = threading.Lock()
+
+
+class JsonLinesSpanExporter:
+    """Append finished spans to a local file, one JSON object per line, for offline runs"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("TRACING_FILE", ".logs/traces.jsonl")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Any]):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def _build_exporter(name: str):
+    """Exporter by TRACING_EXPORTER name: console, file, otlp, or a dotted `module:Class` path"""
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if name == "file":
+        return JsonLinesSpanExporter()
+    if name == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def configure_tracing(exporter: Any = None) -> bool:
+    """
+    Install the exporter named by TRACING_EXPORTER (default none), or the given exporter instance.
+    Uses a provider of our own so crewai's telemetry setup is left alone. Returns whether tracing is on.
+    """
+    global _tracer, _provider
+    with _lock:
+        name = os.getenv("TRACING_EXPORTER", "none").lower() if exporter is None else None
+        if exporter is None and name in ("", "none", "off", "false"):
+            return _provider is not None
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+        try:
+            span_exporter = exporter or _build_exporter(name)
+        except Exception as e:
+            logging.error(f"Error configuring tracing exporter {name}: {str(e)}")
+            return False
+        if _provider is not None:
+            _provider.shutdown()
+        _provider = TracerProvider(resource=Resource.create({
+            "service.name": os.getenv("OTEL_SERVICE_NAME", "marketpulse")
+        }))
+        # Explicit exporters (tests, scripts) see spans immediately; network exporters batch
+        processor = SimpleSpanProcessor(span_exporter) if exporter is not None else BatchSpanProcessor(span_exporter)
+        _provider.add_span_processor(processor)
+        _tracer = _provider.get_tracer("marketpulse")
+        return True
+
+
+def shutdown_tracing():
+    """Flush pending spans and go back to the no-op tracer"""
+    global _tracer, _provider
+    with _lock:
+        if _provider is not None:
+            _provider.shutdown()
+        _provider = None
+        _tracer = trace.NoOpTracer()
+
+
+def get_tracer() -> trace.Tracer:
+    return _tracer
+
+
+@contextlib.contextmanager
+def span(name: str, attributes: Dict[str, Any] = None, context: Optional[Context] = None,
+         kind: SpanKind = SpanKind.INTERNAL) -> Iterator[Span]:
+    """Current span for the with-block; exceptions are recorded and the span marked as errored"""
+    with _tracer.start_as_current_span(name, context=context, kind=kind, attributes=_clean(attributes)) as current:
+        yield current
+
+
+def set_attributes(attributes: Dict[str, Any]):
+    """Annotate whatever span is current, e.g. with a cache hit from inside a tool"""
+    trace.get_current_span().set_attributes(_clean(attributes))
+
+
+def start_span(name: str, attributes: Dict[str, Any] = None, kind: SpanKind = SpanKind.INTERNAL) -> Span:
+    """Start a span that is not made current; end it yourself (used for streamed responses)"""
+    return _tracer.start_span(name, kind=kind, attributes=_clean(attributes))
+
+
+def context_with(current: Span) -> Context:
+    """Context to parent work that runs elsewhere (e.g. on a job worker) under `current`"""
+    return trace.set_span_in_context(current)
+
+
+@contextlib.contextmanager
+def http_span(method: str, url: str) -> Iterator[Span]:
+    """Client span for an outbound HTTP call; the query string is dropped so API keys stay out of traces"""
+    parts = urlsplit(url)
+    attributes = {
+        "http.request.method": method,
+        "server.address": parts.hostname,
+        "url.full": f"{parts.scheme}://{parts.netloc}{parts.path}"
+    }
+    with span(f"{method} {parts.hostname}", attributes, kind=SpanKind.CLIENT) as current:
+        yield current
+
+
+def _clean(attributes: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """OpenTelemetry only accepts primitive attribute values"""
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in (attributes or {}).items() if value is not None
+    }
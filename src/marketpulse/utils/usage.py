@@ -0,0 +1,207 @@
+# src/marketpulse/utils/usage.py
+
+import contextvars
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from .metrics import API_CALLS, BUDGET_ACTIONS, ESTIMATED_COST, LLM_TOKENS
+from .usage_log import get_usage_recorder
+
+# USD per million tokens; prompt tokens served from OpenAI's prompt cache are billed at the cached rate
+MODEL_PRICES = {
+    "gpt-4o-mini": {"prompt": 0.15, "cached_prompt": 0.075, "completion": 0.60},
+    "gpt-4o": {"prompt": 2.50, "cached_prompt": 1.25, "completion": 10.00},
+    "gpt-3.5-turbo": {"prompt": 0.50, "cached_prompt": 0.50, "completion": 1.50}
+}
+
+# USD per external API call
+API_PRICES = {
+    "bing": float(os.getenv("BING_PRICE_PER_CALL", "0.025")),
+    "alphavantage": float(os.getenv("ALPHAVANTAGE_PRICE_PER_CALL", "0"))
+}
+
+
+class BudgetExceeded(Exception):
+    """Raised at a stage boundary once the run has spent its token or cost budget"""
+
+
+@dataclass
+class UsageBudget:
+    """Limits for one run; None means unlimited"""
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_api_calls: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["UsageBudget"]:
+        if not data:
+            return None
+        return cls(**{key: data.get(key) for key in ("max_tokens", "max_cost_usd", "max_api_calls")})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+    """Estimated USD cost of one LLM call; unknown models are priced like gpt-4o-mini"""
+    prices = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4o-mini"])
+    uncached = max(prompt_tokens - cached_prompt_tokens, 0)
+    return (
+        uncached * prices["prompt"] + cached_prompt_tokens * prices["cached_prompt"] + completion_tokens * prices["completion"]
+    ) / 1_000_000
+
+
+class UsageLedger:
+    """Tokens, external API calls and estimated cost of one run, attributed to the stage that spent them"""
+
+    def __init__(self, budget: Optional[UsageBudget] = None, tenant: Optional[str] = None, run_id: Optional[str] = None):
+        self.budget = budget
+        # Who the run is for and which run it is, for the usage log
+        self.tenant = tenant
+        self.run_id = run_id
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        # Stages that were served stale or not run because the budget ran out
+        self.budget_actions: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+
+    def _stage(self, stage: str) -> Dict[str, Any]:
+        return self.stages.setdefault(stage, {
+            "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0, "api_calls": {}, "cost_usd": 0.0
+        })
+
+    def record_tokens(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0):
+        with self._lock:
+            entry = self._stage(stage)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cached_prompt_tokens"] += cached_prompt_tokens
+            entry["cost_usd"] += token_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens)
+
+    def record_api_call(self, stage: str, provider: str):
+        with self._lock:
+            entry = self._stage(stage)
+            entry["api_calls"][provider] = entry["api_calls"].get(provider, 0) + 1
+            entry["cost_usd"] += API_PRICES.get(provider, 0.0)
+
+    def record_budget_action(self, stage: str, action: str, reason: str):
+        with self._lock:
+            self.budget_actions.append({"stage": stage, "action": action, "reason": reason})
+        BUDGET_ACTIONS.labels(action=action).inc()
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in self.stages.values())
+
+    @property
+    def api_calls(self) -> int:
+        return sum(sum(entry["api_calls"].values()) for entry in self.stages.values())
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(entry["cost_usd"] for entry in self.stages.values())
+
+    def exceeded(self) -> Optional[str]:
+        """Why the token or cost budget is spent, or None while there is budget left"""
+        if self.budget is None:
+            return None
+        if self.budget.max_tokens is not None and self.total_tokens >= self.budget.max_tokens:
+            return f"token budget of {self.budget.max_tokens} spent"
+        if self.budget.max_cost_usd is not None and self.cost_usd >= self.budget.max_cost_usd:
+            return f"cost budget of ${self.budget.max_cost_usd:.4f} spent"
+        return None
+
+    def api_calls_exhausted(self) -> bool:
+        return self.budget is not None and self.budget.max_api_calls is not None and self.api_calls >= self.budget.max_api_calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {**entry, "api_calls": dict(entry["api_calls"]), "cost_usd": round(entry["cost_usd"], 6)}
+                for stage, entry in self.stages.items()
+            }
+            actions = list(self.budget_actions)
+        usage = {
+            "prompt_tokens": sum(entry["prompt_tokens"] for entry in stages.values()),
+            "completion_tokens": sum(entry["completion_tokens"] for entry in stages.values()),
+            "cached_prompt_tokens": sum(entry["cached_prompt_tokens"] for entry in stages.values()),
+            "api_calls": self.api_calls,
+            "estimated_cost_usd": round(self.cost_usd, 6),
+            "stages": stages
+        }
+        if self.budget is not None:
+            usage["budget"] = self.budget.to_dict()
+        if actions:
+            usage["budget_actions"] = actions
+        return usage
+
+
+_current_ledger: contextvars.ContextVar[Optional[UsageLedger]] = contextvars.ContextVar(
+    "marketpulse_usage_ledger", default=None
+)
+_current_stage: contextvars.ContextVar[str] = contextvars.ContextVar("marketpulse_usage_stage", default="unattributed")
+
+
+def set_usage_ledger(ledger: UsageLedger) -> contextvars.Token:
+    """Bind a ledger to the current run; crew threads and tool calls inherit it like the cancel token"""
+    return _current_ledger.set(ledger)
+
+
+def current_usage_ledger() -> Optional[UsageLedger]:
+    return _current_ledger.get()
+
+
+def set_usage_stage(stage: str) -> contextvars.Token:
+    """Attribute usage from here on (in this task and threads it starts) to a stage"""
+    return _current_stage.set(stage)
+
+
+def record_llm_usage(agent: str, model: str, usage: Any):
+    """Record a crew's reported token usage (CrewOutput.token_usage) in metrics and the run's ledger"""
+    counts = {}
+    for kind in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+        tokens = getattr(usage, kind, 0)
+        counts[kind] = int(tokens) if isinstance(tokens, (int, float)) else 0
+        if counts[kind]:
+            LLM_TOKENS.labels(agent=agent, kind=kind.replace("_tokens", "")).inc(counts[kind])
+    ESTIMATED_COST.labels(kind="llm").inc(token_cost(model, **counts))
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.record_tokens(_current_stage.get(), model, **counts)
+    return counts
+
+
+def record_api_call(provider: str, tool: str = None, operation: str = None, subject: str = None):
+    """Count one billable external API call (cache hits are free and not recorded) and add it to the usage log"""
+    API_CALLS.labels(provider=provider).inc()
+    ESTIMATED_COST.labels(kind="api").inc(API_PRICES.get(provider, 0.0))
+    ledger = _current_ledger.get()
+    stage = _current_stage.get()
+    if ledger is not None:
+        ledger.record_api_call(stage, provider)
+    get_usage_recorder().record(
+        provider, tool, operation, subject,
+        stage=stage if ledger is not None else None,
+        tenant=ledger.tenant if ledger is not None else None,
+        run_id=ledger.run_id if ledger is not None else None
+    )
+
+
+def allow_api_call(provider: str) -> bool:
+    """False once the run's API-call budget is spent; tools then answer without live data"""
+    ledger = _current_ledger.get()
+    if ledger is None or not ledger.api_calls_exhausted():
+        return True
+    ledger.record_budget_action(_current_stage.get(), "downgrade", f"{provider} call skipped, API call budget spent")
+    return False
+
+
+def check_stage_budget(stage: str):
+    """Stage boundary check: raise BudgetExceeded instead of starting an LLM stage the run cannot pay for"""
+    ledger = _current_ledger.get()
+    reason = ledger.exceeded() if ledger is not None else None
+    if reason is not None:
+        logging.error(f"Skipping {stage}: {reason}")
+        raise BudgetExceeded(reason)
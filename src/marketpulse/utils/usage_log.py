@@ -0,0 +1,160 @@
+# src/marketpulse/utils/usage_log.py
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+SUMMARY_FIELDS = ("provider", "tool", "day", "tenant", "stage", "operation")
+
+
+class UsageRecorder:
+    """
+    Buffered JSON-lines log of billable external API calls.
+    record() only appends to memory; a background thread writes batches. Each process writes
+    its own file per UTC day (usage-<day>-<pid>.jsonl), so workers never interleave lines, and
+    files roll over at max_bytes and are deleted after retention_days.
+    """
+
+    def __init__(self, directory: str = None, flush_seconds: float = None, flush_batch: int = None,
+                 max_bytes: int = None, retention_days: int = None):
+        self.directory = directory or os.getenv("USAGE_LOG_DIR", ".logs/usage")
+        self.flush_seconds = flush_seconds or float(os.getenv("USAGE_FLUSH_SECONDS", "2"))
+        self.flush_batch = flush_batch or int(os.getenv("USAGE_FLUSH_BATCH", "200"))
+        self.max_bytes = max_bytes or int(os.getenv("USAGE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+        self.retention_days = retention_days or int(os.getenv("USAGE_LOG_RETENTION_DAYS", "90"))
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # Serializes writers (the flusher thread, explicit flush() calls and atexit)
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+    def record(self, provider: str, tool: str, operation: str, subject: str, **context: Any):
+        """Queue one usage record; never touches the filesystem on the caller's thread"""
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "provider": provider,
+            "tool": tool,
+            "operation": operation,
+            "subject": subject,
+            **{key: value for key, value in context.items() if value is not None}
+        }
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.flush_batch
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def _ensure_flusher(self):
+        # A forked worker inherits the buffer object but not the thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._flush_forever, name="usage-recorder", daemon=True)
+            self._thread.start()
+
+    def _flush_forever(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def _path(self, day: str) -> str:
+        """This process's current file for a day, rolling over to a new part once max_bytes is reached"""
+        part = 0
+        while True:
+            suffix = f"-{part}" if part else ""
+            path = os.path.join(self.directory, f"usage-{day}-{os.getpid()}{suffix}.jsonl")
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_bytes:
+                return path
+            part += 1
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of records written"""
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+        if not pending:
+            return 0
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in pending:
+            by_day.setdefault(entry["ts"][:10], []).append(entry)
+        try:
+            with self._write_lock:
+                os.makedirs(self.directory, exist_ok=True)
+                for day, entries in by_day.items():
+                    path = self._path(day)
+                    # One write per batch instead of an open/append/close per API call
+                    with open(path, "a") as f:
+                        f.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries))
+                self._prune()
+        except OSError as e:
+            logging.error(f"Error writing usage log: {str(e)}")
+            with self._lock:
+                self._buffer = pending + self._buffer
+            return 0
+        return len(pending)
+
+    def _prune(self):
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).date().isoformat()
+        for path in glob.glob(os.path.join(self.directory, "usage-*.jsonl")):
+            if os.path.basename(path)[len("usage-"):len("usage-") + 10] < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def read_usage(directory: str = None, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Every usage record in the directory (from all workers), optionally from day `since` (YYYY-MM-DD) on"""
+    directory = directory or os.getenv("USAGE_LOG_DIR", ".logs/usage")
+    for path in sorted(glob.glob(os.path.join(directory, "usage-*.jsonl"))):
+        if since and os.path.basename(path)[len("usage-"):len("usage-") + 10] < since:
+            continue
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A worker killed mid-write can leave a partial last line
+                    continue
+
+
+def summarize_usage(records: Iterator[Dict[str, Any]], group_by: Sequence[str] = ("provider", "tool")) -> List[Dict[str, Any]]:
+    """Count calls per combination of the group_by fields (any of SUMMARY_FIELDS), busiest first"""
+    unknown = [field for field in group_by if field not in SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown usage fields: {', '.join(unknown)}. Available: {', '.join(SUMMARY_FIELDS)}")
+    counts: Counter = Counter()
+    for record in records:
+        record = {**record, "day": record.get("ts", "")[:10]}
+        counts[tuple(record.get(field) or "-" for field in group_by)] += 1
+    return [
+        {**dict(zip(group_by, key)), "calls": calls}
+        for key, calls in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+_usage_recorder: Optional[UsageRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_usage_recorder() -> UsageRecorder:
+    """Return the process-wide usage recorder, flushed at interpreter exit"""
+    global _usage_recorder
+    if _usage_recorder is None:
+        with _recorder_lock:
+            if _usage_recorder is None:
+                _usage_recorder = UsageRecorder()
+                atexit.register(_usage_recorder.flush)
+    return _usage_recorder
@@ -0,0 +1,137 @@
+# src/marketpulse/utils/wire_format.py
+
+import json
+import os
+import zlib
+from typing import Any, AsyncGenerator, AsyncIterable, Callable, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional wire format
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional compression
+    brotli = None
+
+MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+    "msgpack": "application/x-msgpack"
+}
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(value).encode("utf-8")
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    try:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    except TypeError:
+        # Anything orjson refuses (e.g. oversized ints) gets the stdlib treatment
+        return _stdlib_dumps(value)
+
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {"json": _stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = _orjson_dumps
+
+
+def get_encoder(name: str = None) -> Callable[[Any], bytes]:
+    """Return the JSON encoder named by EVENT_ENCODER, preferring orjson when it is installed"""
+    name = name or os.getenv("EVENT_ENCODER", "orjson" if orjson is not None else "json")
+    return ENCODERS.get(name, _stdlib_dumps)
+
+
+dumps = get_encoder()
+
+
+def available_formats() -> Dict[str, str]:
+    """Wire formats this process can serve, by name"""
+    return {name: media_type for name, media_type in MEDIA_TYPES.items() if name != "msgpack" or msgpack is not None}
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Pick the stream format from an Accept header; SSE unless NDJSON or msgpack is explicitly asked for"""
+    if not accept:
+        return "sse"
+    formats = available_formats()
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        for name, served in formats.items():
+            if media_type == served:
+                return name
+    return "sse"
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick a streaming compression from Accept-Encoding (brotli when installed, then gzip)"""
+    if not accept_encoding or os.getenv("STREAM_COMPRESSION", "true").lower() in ("0", "false", "no"):
+        return None
+    offered = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if "br" in offered and brotli is not None:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def encode_event(event: Dict[str, Any], wire_format: str = "sse", event_id: str = None) -> bytes:
+    """Serialize one stream event for the given wire format"""
+    if wire_format == "sse":
+        data = b"data: " + dumps(event) + b"\n\n"
+        return data if event_id is None else b"id: " + event_id.encode("utf-8") + b"\n" + data
+    if event_id is not None:
+        event = {**event, "id": event_id}
+    if wire_format == "ndjson":
+        return dumps(event) + b"\n"
+    if wire_format == "msgpack":
+        # msgpack objects are self-delimiting, so a stream is just concatenated packs
+        return msgpack.packb(event, use_bin_type=True)
+    raise ValueError(f"Unknown wire format: {wire_format}")
+
+
+class StreamCompressor:
+    """Incremental gzip/brotli compressor that flushes after every chunk so events are not held back"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=5)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.flush(zlib.Z_FINISH)
+        return self._compressor.finish()
+
+
+async def compress_stream(
+    chunks: AsyncIterable[Union[str, bytes]], encoding: Optional[str]
+) -> AsyncGenerator[bytes, None]:
+    """Compress a stream of chunks, keeping each chunk deliverable as soon as it is produced"""
+    if encoding is None:
+        async for chunk in chunks:
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        return
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if compressed:
+            yield compressed
+    yield compressor.finish()
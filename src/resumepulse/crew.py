@@ -9,6 +9,14 @@ from .tools.resume_tool import (
 )
 from dotenv import load_dotenv
 
+# LLM settings per agent; the flow hashes these into its stage cache keys
+AGENT_LLM_CONFIGS = {
+    "resume_parser_agent": {"temperature": 0.2, "model": "gpt-4o-mini"},
+    "profile_builder_agent": {"temperature": 0.7, "model": "gpt-4o-mini"},
+    "company_research_agent": {"temperature": 0.3, "model": "gpt-4o-mini"},
+    "resume_customizer_agent": {"temperature": 0.5, "model": "gpt-4o-mini"}
+}
+
 @CrewBase
 class ResumeCustomizationCrew:
     """Resume customization crew for tailoring resumes to specific job descriptions"""
@@ -26,7 +34,7 @@ class ResumeCustomizationCrew:
         return Agent(
             config=self.agents_config['resume_parser_agent'],
             tools=[self.resume_parser_tool],
-            llm_config={"temperature": 0.2, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["resume_parser_agent"],
             verbose=True
         )
 
@@ -35,7 +43,7 @@ class ResumeCustomizationCrew:
         return Agent(
             config=self.agents_config['profile_builder_agent'],
             tools=[self.profile_questions_tool],
-            llm_config={"temperature": 0.7, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["profile_builder_agent"],
             verbose=True
         )
 
@@ -44,7 +52,7 @@ class ResumeCustomizationCrew:
         return Agent(
             config=self.agents_config['company_research_agent'],
             tools=[self.job_description_tool, self.company_research_tool],
-            llm_config={"temperature": 0.3, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["company_research_agent"],
             verbose=True
         )
 
@@ -53,7 +61,7 @@ class ResumeCustomizationCrew:
         return Agent(
             config=self.agents_config['resume_customizer_agent'],
             tools=[self.resume_customizer_tool],
-            llm_config={"temperature": 0.5, "model": "gpt-4o-mini"},
+            llm_config=AGENT_LLM_CONFIGS["resume_customizer_agent"],
             verbose=True
         )
 
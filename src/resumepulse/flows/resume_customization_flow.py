@@ -1,16 +1,22 @@
 # src/resumepulse/flows/resume_customization_flow.py
 
-from crewai.flow.flow import Flow, listen, start, FlowState
+from crewai.flow.flow import Flow, FlowState, and_, listen, start
 from crewai import Agent, Crew, Process
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, AsyncGenerator, List
 import json
 import asyncio
 import logging
+import os
 import re
-from ..clean_json import clean_and_parse_json
-from ..crew import ResumeCustomizationCrew
-from ..utils.stream_utils import create_stream_event, process_task_result
+from marketpulse.clean_json import clean_and_parse_json
+from marketpulse.utils.stage_cache import compute_stage_key, get_stage_cache
+from marketpulse.utils.stream_utils import StreamEvent
+from marketpulse.utils.task_context import set_task_output
+from marketpulse.utils.task_graph import TaskGraph, run_graph
+from ..crew import ResumeCustomizationCrew, AGENT_LLM_CONFIGS
+
+TASKS_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "tasks.yaml")
 
 class ResumeCustomizationState(FlowState):
     resume_data: Dict[str, Any]
@@ -23,14 +29,43 @@ class ResumeCustomizationState(FlowState):
     customized_resume: Optional[Dict[str, Any]] = None
 
 class ResumeCustomizationFlow(Flow[ResumeCustomizationState]):
+    # Event name and progress messages for each stage, keyed by its task in tasks.yaml
+    STAGES = {
+        "parse_resume_task": {
+            "event": "parsed_resume",
+            "method": "parse_resume",
+            "status": "Starting resume parsing...",
+            "error": "Failed to parse resume"
+        },
+        "generate_profile_questions_task": {
+            "event": "profile_questions",
+            "method": "generate_profile_questions",
+            "status": "Generating profile enhancement questions...",
+            "error": "Failed to generate profile questions"
+        },
+        "analyze_company_task": {
+            "event": "company_analysis",
+            "method": "analyze_company",
+            "status": "Analyzing company and job description...",
+            "error": "Failed to analyze company and job description"
+        },
+        "generate_tailored_resume_task": {
+            "event": "customized_resume",
+            "method": "create_customized_resume",
+            "status": "Creating customized resume...",
+            "error": "Failed to create customized resume"
+        }
+    }
+
     def __init__(self, resume_data: Dict[str, Any], job_description: str, company_name: str):
-        self.initial_state = ResumeCustomizationState(
+        super().__init__(initial_state=ResumeCustomizationState(
             resume_data=resume_data,
             job_description=job_description,
             company_name=company_name
-        )
-        super().__init__()
+        ))
         self._initialize_crew()
+        self.stage_cache = get_stage_cache()
+        self.task_graph = TaskGraph.from_yaml(TASKS_CONFIG_PATH)
 
     def _initialize_crew(self):
         """Initialize crew instance with separate crews for each task"""
@@ -87,6 +122,36 @@ class ResumeCustomizationFlow(Flow[ResumeCustomizationState]):
                     logging.error(f"Failed to parse JSON: {str(e)}\nRaw text: {text[:200]}...")
                     return None
 
+    async def _kickoff_stage(self, crew: Crew, agent_name: str, task_name: str, inputs: Dict[str, Any],
+                       tools: List[Any] = None, context: Dict[str, Any] = None) -> Optional[Dict]:
+        """Kick off a single-task crew, serving a cached output when the same inputs were seen before"""
+        llm_config = AGENT_LLM_CONFIGS[agent_name]
+        key = compute_stage_key(
+            agent_config=self.crew_instance.agents_config.get(agent_name),
+            task_config=self.crew_instance.tasks_config.get(task_name),
+            model=llm_config["model"],
+            temperature=llm_config["temperature"],
+            inputs={"inputs": inputs, "context": context or {}},
+            tool_digests={
+                tool.name: tool.cache_digest() for tool in (tools or []) if hasattr(tool, 'cache_digest')
+            }
+        )
+
+        raw, fresh = self.stage_cache.lookup(key, stage=task_name)
+        if fresh:
+            # Downstream tasks read this one's output through `context:`, as if the crew had run
+            set_task_output(crew.tasks[0], raw)
+            return self._extract_json_from_response(raw)
+
+        result = await asyncio.to_thread(crew.kickoff, inputs=inputs)
+        if not hasattr(result.tasks_output[0], 'raw'):
+            return None
+        raw = result.tasks_output[0].raw
+        data = self._extract_json_from_response(raw)
+        if data:
+            self.stage_cache.set(key, raw, stage=task_name)
+        return data
+
     def _format_resume_for_task(self) -> str:
         """Format resume data for task input"""
         return json.dumps(self.state.resume_data)
@@ -118,54 +183,58 @@ class ResumeCustomizationFlow(Flow[ResumeCustomizationState]):
     async def parse_resume(self):
         """Start the process by parsing the resume"""
         try:
-            result = self.resume_parser_crew.kickoff(inputs={
-                "resume_json": self._format_resume_for_task()
-            })
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.parsed_resume = data
-                    return data
+            data = await self._kickoff_stage(
+                self.resume_parser_crew, "resume_parser_agent", "parse_resume_task",
+                inputs={"resume_json": self._format_resume_for_task()},
+                tools=[self.crew_instance.resume_parser_tool]
+            )
+            if data:
+                self.state.parsed_resume = data
+                return data
         except Exception as e:
             logging.error(f"Error in parse_resume: {str(e)}")
         return None
 
     @listen(parse_resume)
-    async def generate_profile_questions(self, parsed_resume_result):
+    async def generate_profile_questions(self, parsed_resume_result=None):
         """Generate questions to enhance the candidate's profile"""
         try:
-            result = self.profile_builder_crew.kickoff(inputs={
-                "resume_data": json.dumps(self.state.parsed_resume),
-                "job_description": self.state.job_description
-            })
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.profile_questions = data
-                    return data
+            data = await self._kickoff_stage(
+                self.profile_builder_crew, "profile_builder_agent", "generate_profile_questions_task",
+                inputs={
+                    "resume_data": json.dumps(self.state.parsed_resume),
+                    "job_description": self.state.job_description
+                },
+                tools=[self.crew_instance.profile_questions_tool]
+            )
+            if data:
+                self.state.profile_questions = data
+                return data
         except Exception as e:
             logging.error(f"Error in generate_profile_questions: {str(e)}")
         return None
 
     @listen(parse_resume)
-    async def analyze_company(self, parsed_resume_result):
+    async def analyze_company(self, parsed_resume_result=None):
         """Analyze the company and job description"""
         try:
-            result = self.company_research_crew.kickoff(inputs={
-                "company_name": self.state.company_name,
-                "job_description": self.state.job_description
-            })
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.company_analysis = data
-                    return data
+            data = await self._kickoff_stage(
+                self.company_research_crew, "company_research_agent", "analyze_company_task",
+                inputs={
+                    "company_name": self.state.company_name,
+                    "job_description": self.state.job_description
+                },
+                tools=[self.crew_instance.job_description_tool, self.crew_instance.company_research_tool]
+            )
+            if data:
+                self.state.company_analysis = data
+                return data
         except Exception as e:
             logging.error(f"Error in analyze_company: {str(e)}")
         return None
 
-    @listen(generate_profile_questions, analyze_company)
-    async def create_customized_resume(self, profile_questions_result, company_analysis_result):
+    @listen(and_(generate_profile_questions, analyze_company))
+    async def create_customized_resume(self, profile_questions_result=None, company_analysis_result=None):
         """Create a customized resume based on all collected information"""
         try:
             # For this demo, we'll simulate a user answering the questions
@@ -182,64 +251,51 @@ class ResumeCustomizationFlow(Flow[ResumeCustomizationState]):
             self.state.enhanced_profile = enhanced_profile
             
             # Generate the customized resume
-            result = self.resume_customizer_crew.kickoff(inputs={
-                "profile": json.dumps(enhanced_profile),
-                "job_description": self.state.job_description,
-                "company_analysis": json.dumps(self.state.company_analysis)
-            })
-            
-            if hasattr(result.tasks_output[0], 'raw'):
-                data = self._extract_json_from_response(result.tasks_output[0].raw)
-                if data:
-                    self.state.customized_resume = data
-                    return data
+            data = await self._kickoff_stage(
+                self.resume_customizer_crew, "resume_customizer_agent", "generate_tailored_resume_task",
+                inputs={
+                    "enhanced_profile": json.dumps(enhanced_profile),
+                    "job_description": self.state.job_description,
+                    "company_analysis": json.dumps(self.state.company_analysis)
+                },
+                tools=[self.crew_instance.resume_customizer_tool],
+                context={
+                    "parsed_resume": self.state.parsed_resume,
+                    "profile_questions": self.state.profile_questions
+                }
+            )
+            if data:
+                self.state.customized_resume = data
+                return data
         except Exception as e:
             logging.error(f"Error in create_customized_resume: {str(e)}")
         return None
 
-    async def stream_process(self) -> AsyncGenerator[str, None]:
-        """Stream the resume customization process"""
+    async def iter_events(self) -> AsyncGenerator[StreamEvent, None]:
+        """Run the resume customization, yielding typed events as stages whose context is ready finish"""
         try:
-            yield await create_stream_event("status", "Starting resume parsing...")
-            await asyncio.sleep(0.1)
-
-            parsed_resume = await self.parse_resume()
-            if parsed_resume:
-                yield await create_stream_event("task_complete", task="parsed_resume", data=parsed_resume)
-                yield await create_stream_event("status", "Generating profile enhancement questions...")
-                
-                # Start company analysis in parallel
-                company_task = asyncio.create_task(self.analyze_company(parsed_resume))
-                
-                profile_questions = await self.generate_profile_questions(parsed_resume)
-                if profile_questions:
-                    yield await create_stream_event("task_complete", task="profile_questions", data=profile_questions)
-                    yield await create_stream_event("status", "Analyzing company and job description...")
-                    
-                    # Wait for company analysis to complete
-                    company_analysis = await company_task
-                    if company_analysis:
-                        yield await create_stream_event("task_complete", task="company_analysis", data=company_analysis)
-                        yield await create_stream_event("status", "Creating customized resume...")
-                        
-                        # In a real application, we would wait for user answers here
-                        # For demo purposes, we're simulating user responses
-                        yield await create_stream_event("status", "Simulating user responses to profile questions...")
-                        await asyncio.sleep(1)  # Simulate waiting for responses
-                        
-                        customized_resume = await self.create_customized_resume(profile_questions, company_analysis)
-                        if customized_resume:
-                            yield await create_stream_event("task_complete", task="customized_resume", data=customized_resume)
-                            yield await create_stream_event("complete", "Resume customization complete")
-                        else:
-                            yield await create_stream_event("error", "Failed to create customized resume")
-                    else:
-                        yield await create_stream_event("error", "Failed to analyze company and job description")
-                else:
-                    yield await create_stream_event("error", "Failed to generate profile questions")
-            else:
-                yield await create_stream_event("error", "Failed to parse resume")
-                    
+            runners = {
+                task_name: getattr(self, stage["method"]) for task_name, stage in self.STAGES.items()
+            }
+            failed = False
+            async for node_event in run_graph(self.task_graph, runners):
+                stage = self.STAGES[node_event.node]
+                if node_event.kind == "started":
+                    yield StreamEvent("status", stage["status"], task=stage["event"])
+                elif node_event.kind == "completed":
+                    yield StreamEvent("task_complete", task=stage["event"], data=node_event.result)
+                elif node_event.kind == "failed":
+                    failed = True
+                    yield StreamEvent("error", stage["error"], task=stage["event"])
+
+            if not failed:
+                yield StreamEvent("complete", "Resume customization complete")
+
         except Exception as e:
-            logging.error(f"Error in stream_process: {str(e)}")
-            yield await create_stream_event("error", f"Error during processing: {str(e)}")
\ No newline at end of file
+            logging.error(f"Error in iter_events: {str(e)}")
+            yield StreamEvent("error", f"Error during processing: {str(e)}")
+
+    async def stream_process(self) -> AsyncGenerator[str, None]:
+        """Stream the resume customization process as JSON lines"""
+        async for event in self.iter_events():
+            yield json.dumps(event.to_dict()) + "\n"
@@ -1,6 +1,3 @@
-import logging
-logging.getLogger('opentelemetry.trace').setLevel(logging.ERROR)
-
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
@@ -240,9 +237,13 @@ class CompanyResearchTool(BaseTool):
         super().__init__()
         self.bing_search = BingSearchAPIWrapper(
             bing_subscription_key=os.getenv('BING_SUBSCRIPTION_KEY'),
-            bing_search_url="https://api.bing.microsoft.com/v7.0/search"
+            bing_search_url=os.getenv("BING_SEARCH_URL", "https://api.bing.microsoft.com/v7.0/search")
         )
 
+    def cache_digest(self) -> str:
+        """Identify the cache window research is currently served from (one per day)"""
+        return datetime.now().strftime('%Y-%m-%d')
+
     def _run(self, company_name: str, job_title: str = "") -> str:
         """Research company information"""
         cache_dir = ".cache/companies"
@@ -6,8 +6,10 @@ from fastapi.testclient import TestClient
 import os
 import json
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 from marketpulse.main import app
+from marketpulse.utils.usage_log import get_usage_recorder
 
 
 @pytest.fixture
@@ -15,6 +17,57 @@ def test_client():
     return TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def no_demo_refresh():
+    """Keep the app lifespan from starting real demo flows or background imports"""
+    with patch.dict(os.environ, {"DEMO_REFRESH_SECONDS": "0", "PREWARM_IMPORTS": "false"}):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def usage_log_dir(tmp_path, monkeypatch):
+    """Write usage records under the test's tmp_path instead of the working tree's .logs/"""
+    directory = str(tmp_path / "usage")
+    monkeypatch.setenv("USAGE_LOG_DIR", directory)
+    recorder = get_usage_recorder()
+    recorder.flush()
+    monkeypatch.setattr(recorder, "directory", directory)
+    yield directory
+    recorder.flush()
+
+
+@pytest.fixture
+def real_crews(monkeypatch, tmp_path):
+    """
+    Build crews from the shipped agents.yaml and tasks.yaml, `context:` links included, and answer each
+    task with the canned JSON in `answers[task name]` instead of an LLM. `contexts[task name]` lists
+    the context each run of the task was given.
+    """
+    import yaml
+    from crewai import Agent
+    from marketpulse.utils.stage_cache import StageCache
+
+    for name in ("OPENAI_API_KEY", "BING_SUBSCRIPTION_KEY", "ALPHAVANTAGE_API_KEY"):
+        monkeypatch.setenv(name, "test")
+    monkeypatch.setenv("CREWAI_DISABLE_TELEMETRY", "true")
+    monkeypatch.setenv("CREWAI_TRACING_ENABLED", "false")
+    monkeypatch.setattr("marketpulse.utils.stage_cache._stage_cache",
+                        StageCache(cache_dir=str(tmp_path / "stages"), enabled=False))
+    crews = SimpleNamespace(answers={}, contexts={})
+
+    def execute_task(agent, task, context=None, tools=None):
+        crews.contexts.setdefault(task.name, []).append(context or "")
+        return json.dumps(crews.answers.get(task.name, {}))
+
+    def load(stream):
+        return yaml.load(stream, Loader=yaml.SafeLoader)
+
+    with patch('crewai.project.crew_base.yaml.safe_load', side_effect=load), \
+         patch('marketpulse.utils.task_graph.yaml.safe_load', side_effect=load), \
+         patch.object(Agent, "execute_task", execute_task):
+        yield crews
+
+
 @pytest.fixture
 def mock_bing_wrapper():
     with patch('langchain_community.utilities.BingSearchAPIWrapper') as mock:
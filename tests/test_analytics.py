@@ -0,0 +1,86 @@
+# tests/test_analytics.py
+
+import json
+import os
+import pytest
+from marketpulse.analytics import compute_portfolio_metrics, load_cached_quotes
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "examples")
+
+
+@pytest.fixture
+def example_portfolio():
+    with open(os.path.join(EXAMPLES_DIR, "portfolio.json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def example_preferences():
+    with open(os.path.join(EXAMPLES_DIR, "preferences.json")) as f:
+        return json.load(f)
+
+
+def test_pnl_and_weights():
+    """P&L comes from quotes, weights from market value"""
+    portfolio = {"holdings": [
+        {"ticker": "AAA", "sector": "Tech", "shares": 10, "purchase_price": 100, "allocation": 50},
+        {"ticker": "BBB", "sector": "Energy", "shares": 10, "purchase_price": 100, "allocation": 50}
+    ]}
+    metrics = compute_portfolio_metrics(portfolio, {}, quotes={"AAA": 300.0, "BBB": 100.0})
+
+    aaa, bbb = metrics["holdings"]
+    assert aaa["unrealized_pnl"] == 2000.0
+    assert aaa["unrealized_pnl_pct"] == 200.0
+    assert aaa["weight"] == 75.0
+    assert aaa["allocation_drift"] == 25.0
+    assert bbb["unrealized_pnl"] == 0.0
+    assert metrics["total_market_value"] == 4000.0
+    assert metrics["sector_weights"] == {"Energy": 25.0, "Tech": 75.0}
+    # 0.75^2 + 0.25^2 = 0.625
+    assert metrics["hhi"] == 6250.0
+    assert metrics["unpriced"] == []
+
+
+def test_limit_breaches(example_portfolio, example_preferences):
+    """Positions outside max/min_position_size are flagged with their drift"""
+    quotes = {h["ticker"]: h["purchase_price"] for h in example_portfolio["holdings"]}
+    metrics = compute_portfolio_metrics(example_portfolio, example_preferences, quotes=quotes)
+
+    breaches = {(b["ticker"], b["limit"]) for b in metrics["limit_breaches"]}
+    weights = {h["ticker"]: h["weight"] for h in metrics["holdings"]}
+    for ticker, weight in weights.items():
+        assert ((ticker, "max") in breaches) == (weight > example_preferences["max_position_size"])
+        assert ((ticker, "min") in breaches) == (weight < example_preferences["min_position_size"])
+    assert sum(metrics["sector_weights"].values()) == pytest.approx(100, abs=0.1)
+    assert 0 < metrics["sector_hhi"] <= 10000
+
+
+def test_unpriced_holdings_fall_back_to_cost():
+    portfolio = {"holdings": [{"ticker": "ZZZ", "sector": "Tech", "shares": 5, "purchase_price": 10}]}
+    metrics = compute_portfolio_metrics(portfolio, {}, quotes={})
+    assert metrics["unpriced"] == ["ZZZ"]
+    assert metrics["holdings"][0]["unrealized_pnl"] == 0.0
+    assert metrics["hhi"] == 10000.0
+
+
+def test_stated_allocations_used_without_share_counts():
+    portfolio = {"holdings": [
+        {"ticker": "AAA", "sector": "Tech", "allocation": 30},
+        {"ticker": "BBB", "sector": "Tech", "allocation": 10}
+    ]}
+    metrics = compute_portfolio_metrics(portfolio, {"max_position_size": 50}, quotes={})
+    assert [h["weight"] for h in metrics["holdings"]] == [75.0, 25.0]
+    assert metrics["limit_breaches"][0]["ticker"] == "AAA"
+
+
+def test_empty_portfolio():
+    metrics = compute_portfolio_metrics({"holdings": []}, {}, quotes={})
+    assert metrics["holdings"] == []
+    assert metrics["hhi"] == 0.0
+
+
+def test_load_cached_quotes(tmp_path):
+    (tmp_path / "AAPL.json").write_text(json.dumps({"symbol": "AAPL", "price": "190.50"}))
+    (tmp_path / "BAD.json").write_text("Error: not json")
+    quotes = load_cached_quotes(["AAPL", "BAD", "MISSING"], cache_dir=str(tmp_path))
+    assert quotes == {"AAPL": 190.5}
@@ -1,5 +1,6 @@
 # tests/test_api.py
 
+import json
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
@@ -76,4 +77,79 @@ def test_sentiment_demo_response_format(mock_generator, test_client):
     # Test the endpoint
     response = test_client.get("/api/sentiment/demo")
     assert response.status_code == 200
-    assert response.headers["content-type"] == "text/event-stream"
\ No newline at end of file
+    assert response.headers["content-type"] == "text/event-stream"
+
+def test_admin_stage_cache_requires_token(test_client, monkeypatch):
+    """Admin cache endpoints are closed unless ADMIN_TOKEN is configured and supplied"""
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert test_client.get("/api/admin/cache/stages").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert test_client.get("/api/admin/cache/stages", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+
+@patch('marketpulse.main.get_stage_cache')
+def test_admin_stage_cache_invalidate(mock_get_cache, test_client, monkeypatch):
+    """Invalidation forwards the optional stage filter to the cache"""
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    mock_get_cache.return_value.invalidate.return_value = 3
+
+    response = test_client.delete(
+        "/api/admin/cache/stages?stage=collect_global_news_task",
+        headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"removed": 3}
+    mock_get_cache.return_value.invalidate.assert_called_once_with("collect_global_news_task")
+
+def test_last_event_id_parsing():
+    """Event ids round-trip through the Last-Event-ID header format"""
+    from marketpulse.utils.stream_utils import format_event_id, format_sse_event, parse_last_event_id
+    assert parse_last_event_id(format_event_id("abc123", 7)) == ("abc123", 7)
+    assert parse_last_event_id("demo-1700000000:2") == ("demo-1700000000", 2)
+    assert parse_last_event_id(None) is None
+    assert parse_last_event_id("garbage") is None
+    formatted = format_sse_event({"type": "complete"}, "abc123:7")
+    assert formatted.startswith("id: abc123:7\ndata: ") and formatted.endswith("\n\n")
+    assert json.loads(formatted.split("data: ", 1)[1]) == {"type": "complete"}
+
+def _request(forwarded=None, peer="203.0.113.9"):
+    from starlette.requests import Request
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+def test_client_key_ignores_spoofable_hops(monkeypatch):
+    """Only the hop appended by a trusted proxy identifies the client"""
+    from marketpulse.main import client_key
+    monkeypatch.delenv("TRUSTED_PROXY_COUNT", raising=False)
+    assert client_key(_request("198.51.100.1")) == "203.0.113.9"
+
+    monkeypatch.setenv("TRUSTED_PROXY_COUNT", "1")
+    assert client_key(_request("198.51.100.1, 192.0.2.7")) == "192.0.2.7"
+    monkeypatch.setenv("TRUSTED_PROXY_COUNT", "2")
+    assert client_key(_request("198.51.100.1, 192.0.2.7, 10.0.0.2")) == "192.0.2.7"
+    # Fewer hops than proxies: the request did not come through them
+    assert client_key(_request("192.0.2.7")) == "203.0.113.9"
+
+def test_position_limits_reach_portfolio_metrics(real_crews):
+    """Position limits survive request validation and show up as breaches in the portfolio_metrics event"""
+    from marketpulse.jobs import JobManager
+    data = {
+        "portfolio": {"holdings": [
+            {"ticker": "BIGCO", "sector": "Technology", "allocation": 80},
+            {"ticker": "SMALLCO", "sector": "Energy", "allocation": 20}
+        ]},
+        "preferences": {
+            "risk_tolerance": "moderate",
+            "investment_horizon": "medium-term",
+            "max_position_size": 50,
+            "min_position_size": 25
+        },
+        "stages": ["portfolio_metrics"]
+    }
+    with patch('marketpulse.main.get_job_manager', return_value=JobManager(workers=1)), TestClient(app) as client:
+        response = client.post("/api/sentiment/analyze", json=data)
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    [metrics] = [event["data"] for event in events if event.get("task") == "portfolio_metrics" and event.get("data")]
+    breaches = {(breach["ticker"], breach["limit"]): breach["drift"] for breach in metrics["limit_breaches"]}
+    assert breaches == {("BIGCO", "max"): 30.0, ("SMALLCO", "min"): -5.0}
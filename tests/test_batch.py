@@ -0,0 +1,239 @@
+# tests/test_batch.py
+
+import json
+import pytest
+from collections import Counter
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.batch import BatchAnalyzer, BatchItem, load_batch
+from marketpulse.jobs import JobManager
+from marketpulse.main import app
+from marketpulse.utils.usage import record_api_call
+
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+class FakeFlow:
+    """Stand-in for MarketSentimentFlow that records which stages ran"""
+    calls = Counter()
+
+    def __init__(self, portfolio, preferences):
+        self.state = SimpleNamespace(
+            portfolio=portfolio, preferences=preferences, global_news=None, portfolio_news=None,
+            influencer_data=None, sentiment_analysis=None, recommendations=None
+        )
+
+    def seed_stage(self, name, result):
+        setattr(self.state, name, result)
+
+    async def collect_global_news(self):
+        self.calls["global_news"] += 1
+        return {"major_events": []}
+
+    async def monitor_key_influencers(self):
+        self.calls["influencer_data"] += 1
+        return {"influencer_statements": []}
+
+    async def analyze_portfolio_news(self):
+        self.calls["portfolio_news"] += 1
+        return {
+            "company_news": [{"ticker": h["ticker"]} for h in self.state.portfolio["holdings"]],
+            "sector_news": []
+        }
+
+    async def analyze_market_sentiment(self):
+        self.calls["sentiment_analysis"] += 1
+        return {"overall_market_sentiment": "bullish"}
+
+    async def generate_recommendations(self):
+        self.calls["recommendations"] += 1
+        tickers = [c["ticker"] for c in self.state.portfolio_news["company_news"]]
+        return {"trading_recommendations": [{"ticker": t, "action": "hold"} for t in tickers]}
+
+
+def _item(item_id, *tickers):
+    holdings = [{"ticker": t, "sector": "Technology"} for t in tickers]
+    return BatchItem(id=item_id, portfolio={"holdings": holdings}, preferences=PREFERENCES)
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    FakeFlow.calls = Counter()
+
+
+@pytest.mark.asyncio
+async def test_shared_stages_run_once():
+    """Global stages run once and sentiment once per distinct ticker set"""
+    results = {}
+    items = [_item("a", "AAPL", "MSFT"), _item("b", "MSFT", "AAPL"), _item("c", "TSLA")]
+    analyzer = BatchAnalyzer(flow_factory=FakeFlow, concurrency=2,
+                             on_result=lambda item_id, result: results.__setitem__(item_id, result))
+
+    summary = await analyzer.run(items)
+
+    assert FakeFlow.calls["global_news"] == 1
+    assert FakeFlow.calls["influencer_data"] == 1
+    assert FakeFlow.calls["portfolio_news"] == 1
+    assert FakeFlow.calls["sentiment_analysis"] == 2
+    assert FakeFlow.calls["recommendations"] == 3
+    assert summary.succeeded == 3 and summary.failed == 0
+    assert summary.portfolios_per_minute > 0
+    # Each portfolio only sees news for its own holdings
+    assert [c["ticker"] for c in results["c"]["portfolio_news"]["company_news"]] == ["TSLA"]
+
+
+@pytest.mark.asyncio
+async def test_shared_stage_failure_fails_every_portfolio():
+    class BrokenFlow(FakeFlow):
+        async def collect_global_news(self):
+            return None
+
+    results = {}
+    analyzer = BatchAnalyzer(flow_factory=BrokenFlow,
+                             on_result=lambda item_id, result: results.__setitem__(item_id, result))
+    summary = await analyzer.run([_item("a", "AAPL"), _item("b", "MSFT")])
+
+    assert summary.failed == 2
+    assert all("error" in result for result in results.values())
+    assert BrokenFlow.calls["recommendations"] == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_results_reach_real_crew_context(real_crews):
+    """Per-portfolio stages run on fresh crews, so the shared results must be handed to them as task context"""
+    real_crews.answers.update({
+        "collect_global_news_task": {"major_events": [{"headline": "Fed holds rates"}]},
+        "monitor_key_influencers_task": {"influencer_statements": [{"statement": "Powell sounds dovish"}]},
+        "analyze_portfolio_news_task": {
+            "company_news": [{"ticker": "AAPL", "news_items": [{"headline": "Apple ships new chip"}]}],
+            "sector_news": []
+        },
+        "analyze_market_sentiment_task": {"overall_market_sentiment": "cautiously bullish"},
+        "generate_recommendations_task": {"trading_recommendations": [{"ticker": "AAPL", "action": "hold"}]}
+    })
+
+    summary = await BatchAnalyzer(concurrency=2).run([_item("a", "AAPL"), _item("b", "AAPL")])
+
+    assert summary.succeeded == 2
+    [sentiment_context] = real_crews.contexts["analyze_market_sentiment_task"]
+    for text in ("Fed holds rates", "Powell sounds dovish", "Apple ships new chip"):
+        assert text in sentiment_context
+    recommendation_contexts = real_crews.contexts["generate_recommendations_task"]
+    assert len(recommendation_contexts) == 2
+    assert all("cautiously bullish" in context for context in recommendation_contexts)
+
+
+def test_load_batch_from_jsonl(tmp_path):
+    source = tmp_path / "portfolios.jsonl"
+    source.write_text("\n".join([
+        json.dumps({"id": "client-1", "portfolio": {"holdings": []}, "preferences": PREFERENCES}),
+        json.dumps({"holdings": [{"ticker": "AAPL"}]})
+    ]))
+    items = load_batch(str(source), default_preferences={"risk_tolerance": "low"})
+    assert [item.id for item in items] == ["client-1", "2"]
+    assert items[1].preferences == {"risk_tolerance": "low"}
+
+
+def test_load_batch_from_directory(tmp_path):
+    (tmp_path / "alice.json").write_text(json.dumps({"holdings": [{"ticker": "AAPL"}]}))
+    (tmp_path / "notes.txt").write_text("ignored")
+    items = load_batch(str(tmp_path), default_preferences=PREFERENCES)
+    assert [item.id for item in items] == ["alice"]
+
+    with pytest.raises(ValueError):
+        load_batch(str(tmp_path))
+
+
+def _request_entry(portfolio_id, *tickers):
+    holdings = [{"ticker": t, "allocation": 10, "sector": "Technology"} for t in tickers]
+    entry = {"portfolio": {"holdings": holdings}, "preferences": PREFERENCES}
+    if portfolio_id:
+        entry["id"] = portfolio_id
+    return entry
+
+
+def test_batch_endpoint_multiplexes_results():
+    """Shared stages arrive once; each portfolio gets one tagged result on the same stream"""
+    body = {"portfolios": [_request_entry("alice", "AAPL"), _request_entry("bob", "AAPL"), _request_entry(None, "TSLA")]}
+    with patch('marketpulse.main.BatchAnalyzer', partial(BatchAnalyzer, flow_factory=FakeFlow)), TestClient(app) as client:
+        with client.stream("POST", "/api/sentiment/batch", json=body) as response:
+            assert response.headers["content-type"] == "text/event-stream"
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+
+    shared = [event["task"] for event in events if event["type"] == "task_complete"]
+    assert shared == ["global_news", "influencer_data"]
+    results = {event["portfolio_id"]: event["data"] for event in events if event["type"] == "portfolio_complete"}
+    assert set(results) == {"alice", "bob", "3"}
+    assert set(results["alice"]) == {"portfolio_news", "sentiment_analysis", "recommendations"}
+    assert events[-1]["type"] == "complete"
+    assert events[-1]["data"]["succeeded"] == 3
+    assert FakeFlow.calls["global_news"] == 1
+    assert FakeFlow.calls["sentiment_analysis"] == 2
+
+
+def test_batch_endpoint_validation():
+    with TestClient(app) as client:
+        assert client.post("/api/sentiment/batch", json={"portfolios": []}).status_code == 422
+        duplicate = {"portfolios": [_request_entry("a", "AAPL"), _request_entry("a", "MSFT")]}
+        assert client.post("/api/sentiment/batch", json=duplicate).status_code == 422
+        with patch.dict('os.environ', {"BATCH_MAX_PORTFOLIOS": "1"}):
+            too_many = {"portfolios": [_request_entry("a", "AAPL"), _request_entry("b", "MSFT")]}
+            assert client.post("/api/sentiment/batch", json=too_many).status_code == 422
+
+
+def test_batch_slots_are_reserved_up_front(monkeypatch):
+    """The limit holds for requests arriving together, and each slot is freed exactly once"""
+    from marketpulse import main
+    monkeypatch.setenv("BATCH_MAX_ACTIVE", "1")
+    release = main.reserve_batch_slot()
+    assert release is not None
+    assert main.reserve_batch_slot() is None
+
+    with TestClient(app) as client:
+        body = {"portfolios": [_request_entry("a", "AAPL")]}
+        assert client.post("/api/sentiment/batch", json=body).status_code == 429
+    release()
+    release()
+    assert main.active_batches == 0
+
+    with patch('marketpulse.main.BatchAnalyzer', partial(BatchAnalyzer, flow_factory=FakeFlow)), TestClient(app) as client:
+        with client.stream("POST", "/api/sentiment/batch", json=body) as response:
+            assert response.status_code == 200
+            list(response.iter_lines())
+    assert main.active_batches == 0
+
+
+class BilledFlow(FakeFlow):
+    """FakeFlow whose sentiment stage spends one Bing call"""
+
+    async def analyze_market_sentiment(self):
+        record_api_call("bing")
+        return await super().analyze_market_sentiment()
+
+
+def test_batch_is_admitted_and_billed_per_tenant():
+    """Batches take a client slot, run under the tenant's budget and are charged per portfolio"""
+    manager = JobManager(workers=1, max_per_client=1, tenant_daily_budget_usd=0.06)
+    body = {"portfolios": [_request_entry("a", "AAPL"), _request_entry("b", "TSLA")]}
+    with patch('marketpulse.main.get_job_manager', return_value=manager), \
+            patch('marketpulse.main.BatchAnalyzer', partial(BatchAnalyzer, flow_factory=BilledFlow)), \
+            TestClient(app) as client:
+        held = manager.admit_batch("testclient")
+        assert client.post("/api/sentiment/batch", json=body).status_code == 429
+        held.close()
+
+        with client.stream("POST", "/api/sentiment/batch", json=body) as response:
+            assert response.status_code == 200
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+        assert events[-1]["type"] == "complete"
+        assert events[-1]["usage"]["api_calls"] == 2
+        assert manager.tenant_remaining("testclient") == pytest.approx(0.01)
+        assert manager.client_jobs.get("testclient", 0) == 0
+
+        response = client.post("/api/sentiment/batch", json=body)
+        assert response.status_code == 200
+        response = client.post("/api/sentiment/batch", json=body)
+        assert response.status_code == 429
+        assert "budget" in response.json()["detail"]
@@ -11,6 +11,17 @@ from marketpulse.tools.market_tool import (
     StockQuoteTool,
     InfluencerMonitorTool
 )
+from marketpulse.utils.usage_log import get_usage_recorder, read_usage
+
+
+def logged_calls(provider, subject):
+    """Usage log records for one provider and subject, after flushing the buffered recorder"""
+    recorder = get_usage_recorder()
+    recorder.flush()
+    return [
+        record for record in read_usage(recorder.directory)
+        if record["provider"] == provider and record["subject"] == subject
+    ]
 
 
 @pytest.fixture
@@ -101,8 +112,8 @@ class TestToolCaching:
             assert mock_run.call_count == 1  # Still just 1 call
             assert result2 == "Mocked search results from Bing"
             
-            # Verify log file was created
-            assert os.path.exists(".logs/bing_usage.log")
+            # Verify the API call was metered
+            assert logged_calls("bing", "integration test query")[-1]["operation"] == "query"
     
     def test_stock_tool_cache_reuse(self, setup_cache_dirs):
         """Test that the stock tool properly reuses cache"""
@@ -132,8 +143,8 @@ class TestToolCaching:
             result2 = tool._run("TSLA")
             assert mock_get.call_count == 1  # Still just 1 call
             
-            # Verify log file was created
-            assert os.path.exists(".logs/alphavantage_usage.log")
+            # Verify the API call was metered
+            assert logged_calls("alphavantage", "TSLA")[-1]["operation"] == "quote"
     
     def test_influencer_tool_cache_reuse(self, setup_cache_dirs):
         """Test that the influencer tool properly reuses cache"""
@@ -159,8 +170,8 @@ class TestToolCaching:
             assert mock_run.call_count == 1  # Still just 1 call
             assert result2 == "Mocked search results from Bing"
             
-            # Verify log file was created
-            assert os.path.exists(".logs/bing_usage.log")
+            # Verify the API call was metered
+            assert logged_calls("bing", "Jerome Powell")[-1]["tool"] == tool.name
     
     def test_cache_expiry(self, setup_cache_dirs):
         """Test that cache properly expires after the designated time"""
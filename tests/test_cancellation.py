@@ -0,0 +1,174 @@
+# tests/test_cancellation.py
+
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.jobs import JobManager
+from marketpulse.main import app
+from marketpulse.tools.market_tool import StockQuoteTool
+from marketpulse.utils.cancellation import (
+    AnalysisCancelled, CancelToken, cancellation_step_callback, check_cancelled, set_cancel_token
+)
+
+PORTFOLIO = {"holdings": [{"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"}]}
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+def test_checkpoints_are_noops_without_a_token():
+    check_cancelled()
+    cancellation_step_callback(None)
+
+
+@pytest.mark.asyncio
+async def test_token_reaches_crew_threads():
+    token = CancelToken()
+    set_cancel_token(token)
+    token.cancel("client disconnected")
+    with pytest.raises(AnalysisCancelled):
+        await asyncio.to_thread(check_cancelled)
+
+
+@pytest.mark.asyncio
+async def test_tools_refuse_to_run_once_cancelled():
+    token = CancelToken()
+    set_cancel_token(token)
+    token.cancel()
+    with patch('marketpulse.tools.market_tool.requests.get') as mock_get:
+        with pytest.raises(AnalysisCancelled):
+            await asyncio.to_thread(StockQuoteTool()._run, "ZZZZ")
+    mock_get.assert_not_called()
+
+
+def make_slow_runner(thread_stopped: threading.Event):
+    """Runner whose 'crew' blocks in a thread and only stops at cancellation checkpoints"""
+    def crew_kickoff():
+        try:
+            for _ in range(500):
+                check_cancelled()
+                time.sleep(0.01)
+        finally:
+            thread_stopped.set()
+
+    async def runner(portfolio, preferences):
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        await asyncio.to_thread(crew_kickoff)
+        yield {"type": "complete"}
+
+    return runner
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_cancels_flow_within_a_second():
+    thread_stopped = threading.Event()
+    manager = JobManager(runner=make_slow_runner(thread_stopped), workers=1, abandon_grace_seconds=0.1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, cancel_when_abandoned=True)
+
+    stream = manager.follow(job)
+    await stream.__anext__()
+    await stream.aclose()
+
+    started = time.monotonic()
+    while (not job.finished or manager.running) and time.monotonic() - started < 1:
+        await asyncio.sleep(0.02)
+    assert job.status == "cancelled"
+    assert job.events[-1]["type"] == "cancelled"
+    assert manager.cancelled == 1
+    assert manager.running == 0
+    assert await asyncio.to_thread(thread_stopped.wait, 1)
+
+
+@pytest.mark.asyncio
+async def test_detached_jobs_survive_disconnects():
+    release = asyncio.Event()
+
+    async def runner(portfolio, preferences):
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        await release.wait()
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1, abandon_grace_seconds=0)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, cancel_when_abandoned=True)
+    # A jobs-API submission of the same request keeps the shared run alive
+    assert await manager.submit(PORTFOLIO, PREFERENCES) is job
+
+    stream = manager.follow(job)
+    await stream.__anext__()
+    await stream.aclose()
+    await asyncio.sleep(0.05)
+    release.set()
+    async for _ in job.subscribe():
+        pass
+    assert job.status == "completed"
+    assert manager.cancelled == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_queued_job_frees_its_slot():
+    release = asyncio.Event()
+
+    async def runner(portfolio, preferences):
+        await release.wait()
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1, max_queued=1)
+    running = await manager.submit(PORTFOLIO, PREFERENCES)
+    await asyncio.sleep(0.01)
+    queued = await manager.submit({"holdings": []}, PREFERENCES, client_id="10.0.0.1")
+
+    assert manager.cancel(queued, "client disconnected")
+    assert not manager.cancel(queued)
+    await asyncio.sleep(0)
+    assert queued.status == "cancelled"
+    assert manager.client_jobs == {}
+    # The slot is free again
+    await manager.submit({"holdings": [{"ticker": "MSFT"}]}, PREFERENCES)
+
+    release.set()
+    async for _ in running.subscribe():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_cancelling_before_the_run_starts_still_finishes_the_job():
+    started = []
+
+    async def runner(portfolio, preferences):
+        started.append(True)
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, client_id="10.0.0.1")
+    # The worker has created the run task, which has not got to its first line yet
+    while job.task is None:
+        await asyncio.sleep(0)
+    assert job.status == "queued"
+    assert manager.cancel(job, "client disconnected")
+
+    events = [event async for event in job.subscribe()]
+    assert events[-1]["type"] == "cancelled"
+    assert job.status == "cancelled"
+    assert not started
+    assert manager.inflight == {}
+    assert manager.client_jobs == {}
+    # An identical request starts a fresh run instead of joining the dead one
+    assert await manager.submit(PORTFOLIO, PREFERENCES) is not job
+
+
+def test_delete_job_endpoint_cancels():
+    async def runner(portfolio, preferences):
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        await asyncio.sleep(30)
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        job_id = client.post("/api/sentiment/jobs", json={"portfolio": PORTFOLIO, "preferences": PREFERENCES}).json()["job_id"]
+        assert client.delete(f"/api/jobs/{job_id}").status_code == 200
+        with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+            lines = [line for line in stream.iter_lines() if line.startswith("data: ")]
+        assert '"cancelled"' in lines[-1]
+        assert client.get(f"/api/jobs/{job_id}").json()["status"] == "cancelled"
+        assert client.delete("/api/jobs/unknown").status_code == 404
@@ -0,0 +1,150 @@
+# tests/test_cassette.py
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from marketpulse.utils.cassette import CassetteMiss, classify, configure_cassette, current_cassette, eject_cassette
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """Answers every request with its own path, query and body, so replays can be told apart"""
+    calls = 0
+
+    def _answer(self):
+        Upstream.calls += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.dumps({"path": self.path, "body": self.rfile.read(length).decode("utf-8"), "call": Upstream.calls})
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv("BING_SEARCH_URL", f"{url}/v7.0/search")
+    monkeypatch.setenv("ALPHAVANTAGE_URL", f"{url}/query")
+    Upstream.calls = 0
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_cassette():
+    yield
+    eject_cassette()
+
+
+def test_classify(upstream):
+    assert classify(f"{upstream}/v7.0/search?q=AAPL") == "bing"
+    assert classify(f"{upstream}/query?function=GLOBAL_QUOTE&symbol=AAPL") == "alphavantage"
+    assert classify("https://api.openai.com/v1/chat/completions") == "llm"
+    assert classify(f"{upstream}/health") is None
+
+
+def test_off_by_default(monkeypatch):
+    monkeypatch.delenv("CASSETTE_MODE", raising=False)
+    assert configure_cassette() is None
+    assert current_cassette() is None
+
+
+def test_requests_replay_without_upstream(upstream, tmp_path):
+    configure_cassette("record", str(tmp_path))
+    quote = requests.get(f"{upstream}/query?function=GLOBAL_QUOTE&symbol=AAPL&apikey=secret").json()
+    news = requests.get(f"{upstream}/v7.0/search", params={"q": "AAPL earnings"}).json()
+    eject_cassette()
+
+    stored = [json.loads(line) for line in gzip.open(tmp_path / "default.jsonl.gz", "rt")]
+    assert [entry["provider"] for entry in stored] == ["alphavantage", "bing"]
+    assert "apikey" not in stored[0]["url"]
+
+    configure_cassette("replay", str(tmp_path))
+    assert requests.get(f"{upstream}/v7.0/search", params={"q": "AAPL earnings"}).json() == news
+    # A different key does not change the match, so recordings are shareable
+    assert requests.get(f"{upstream}/query?function=GLOBAL_QUOTE&symbol=AAPL&apikey=other").json() == quote
+    assert Upstream.calls == 2
+
+
+def test_other_traffic_passes_through(upstream, tmp_path):
+    configure_cassette("record", str(tmp_path))
+    requests.get(f"{upstream}/health")
+    assert current_cassette().entries == []
+
+
+def test_llm_calls_match_on_body(upstream, tmp_path):
+    url = f"{upstream}/v1/chat/completions"
+    configure_cassette("record", str(tmp_path))
+    with httpx.Client() as client:
+        first = client.post(url, json={"model": "m", "messages": [{"role": "user", "content": "one"}]}).json()
+        second = client.post(url, json={"model": "m", "messages": [{"role": "user", "content": "two"}]}).json()
+    eject_cassette()
+
+    configure_cassette("replay", str(tmp_path))
+
+    async def replay():
+        async with httpx.AsyncClient() as client:
+            # Key order does not matter, only content
+            response = await client.post(url, json={"messages": [{"role": "user", "content": "two"}], "model": "m"})
+            return response.json()
+    assert asyncio.run(replay()) == second
+    with httpx.Client() as client:
+        assert client.post(url, json={"model": "m", "messages": [{"role": "user", "content": "one"}]}).json() == first
+    assert Upstream.calls == 2
+
+
+def test_unmatched_calls_fall_back_unless_strict(upstream, tmp_path, monkeypatch):
+    configure_cassette("record", str(tmp_path))
+    recorded = requests.get(f"{upstream}/v7.0/search", params={"q": "recorded"}).json()
+    eject_cassette()
+
+    configure_cassette("replay", str(tmp_path))
+    assert requests.get(f"{upstream}/v7.0/search", params={"q": "new"}).json() == recorded
+    with pytest.raises(CassetteMiss):
+        requests.get(f"{upstream}/query?function=GLOBAL_QUOTE&symbol=AAPL")
+
+    monkeypatch.setenv("CASSETTE_STRICT", "true")
+    configure_cassette("replay", str(tmp_path))
+    with pytest.raises(CassetteMiss):
+        requests.get(f"{upstream}/v7.0/search", params={"q": "new"})
+
+
+def test_replay_can_simulate_latency(upstream, tmp_path):
+    configure_cassette("record", str(tmp_path))
+    requests.get(f"{upstream}/v7.0/search", params={"q": "AAPL"})
+    eject_cassette()
+    path = tmp_path / "default.jsonl.gz"
+    entries = [json.loads(line) for line in gzip.open(path, "rt")]
+    entries[0]["elapsed"] = 0.2
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps(entries[0]) + "\n")
+
+    configure_cassette("replay", str(tmp_path), simulate_latency=True)
+    started = time.perf_counter()
+    requests.get(f"{upstream}/v7.0/search", params={"q": "AAPL"})
+    assert time.perf_counter() - started >= 0.2
+
+
+def test_replay_needs_a_recording(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        configure_cassette("replay", str(tmp_path), name="missing")
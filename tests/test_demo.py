@@ -0,0 +1,115 @@
+# tests/test_demo.py
+
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.demo import DemoStore
+from marketpulse.main import app
+
+EVENTS = [
+    {"type": "status", "message": "Starting market sentiment analysis..."},
+    {"type": "task_complete", "task": "recommendations", "data": {"summary": "Hold"}},
+    {"type": "complete", "message": "Market sentiment analysis complete"}
+]
+
+
+def make_runner(events, calls):
+    async def runner(portfolio, preferences):
+        calls.append(portfolio)
+        for event in events:
+            yield event
+    return runner
+
+
+@pytest.mark.asyncio
+async def test_refresh_stores_and_reloads(tmp_path):
+    calls = []
+    path = str(tmp_path / "demo.json")
+    store = DemoStore(path=path, refresh_seconds=60, runner=make_runner(EVENTS, calls))
+    assert not store.ready and store.is_stale()
+
+    assert await store.refresh()
+    assert store.ready and not store.is_stale()
+    assert store.events == EVENTS
+
+    # A restarted process picks up the stored run without calling the flow
+    reloaded = DemoStore(path=path, refresh_seconds=60, runner=make_runner(EVENTS, calls))
+    assert reloaded.events == EVENTS
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_incomplete_refresh_keeps_previous_result(tmp_path):
+    store = DemoStore(path=str(tmp_path / "demo.json"), refresh_seconds=60, runner=make_runner(EVENTS, []))
+    await store.refresh()
+    generated_at = store.generated_at
+
+    store.runner = make_runner(EVENTS[:1] + [{"type": "error", "message": "boom"}], [])
+    assert not await store.refresh()
+    assert store.events == EVENTS
+    assert store.generated_at == generated_at
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_refreshes(tmp_path):
+    """Workers sharing a result file run the flow once between them"""
+    calls = []
+    path = str(tmp_path / "demo.json")
+    leader = DemoStore(path=path, refresh_seconds=60, runner=make_runner(EVENTS, calls))
+    follower = DemoStore(path=path, refresh_seconds=60, runner=make_runner(EVENTS, calls))
+
+    lock = leader._lock_refresh()
+    assert await follower.refresh_if_stale() is None
+    assert calls == []
+
+    assert await leader.refresh()
+    lock.close()
+    # The follower picks up the leader's run instead of starting its own
+    assert await follower.refresh_if_stale()
+    assert follower.events == EVENTS
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_replay_pacing(tmp_path):
+    store = DemoStore(path=str(tmp_path / "demo.json"), refresh_seconds=60, runner=make_runner(EVENTS, []))
+    await store.refresh()
+    started = time.monotonic()
+    replayed = [chunk async for chunk in store.replay_encoded(pace=0.02)]
+    assert replayed == store.encoded_events()
+    assert [json.loads(chunk.decode().split("data: ", 1)[1]) for chunk in replayed] == EVENTS
+    assert time.monotonic() - started >= 0.04
+
+
+def test_demo_endpoint_replays_without_running_flow(tmp_path):
+    calls = []
+    store = DemoStore(path=str(tmp_path / "demo.json"), refresh_seconds=60, runner=make_runner(EVENTS, calls))
+    asyncio.run(store.refresh())
+
+    with patch('marketpulse.main.get_demo_store', return_value=store), \
+         patch('marketpulse.main.event_generator') as live_generator, \
+         TestClient(app) as client:
+        with client.stream("GET", "/api/sentiment/demo") as response:
+            assert response.headers["content-type"] == "text/event-stream"
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert events == EVENTS
+    assert len(calls) == 1
+    live_generator.assert_not_called()
+
+
+def test_demo_stream_resumes_from_last_event_id(tmp_path):
+    store = DemoStore(path=str(tmp_path / "demo.json"), refresh_seconds=60, runner=make_runner(EVENTS, []))
+    asyncio.run(store.refresh())
+
+    with patch('marketpulse.main.get_demo_store', return_value=store), TestClient(app) as client:
+        with client.stream("GET", "/api/sentiment/demo") as response:
+            ids = [line[len("id: "):] for line in response.iter_lines() if line.startswith("id: ")]
+        assert ids == [f"{store.run_id}:{i}" for i in range(3)]
+
+        with client.stream("GET", "/api/sentiment/demo", headers={"Last-Event-ID": ids[0]}) as response:
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+        assert events == EVENTS[1:]
@@ -0,0 +1,309 @@
+# tests/test_jobs.py
+
+import asyncio
+from collections import deque
+import json
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.jobs import AdmissionError, JobManager
+from marketpulse.main import app, event_generator
+
+PORTFOLIO = {"holdings": [{"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"}]}
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+async def fake_runner(portfolio, preferences):
+    yield {"type": "status", "message": "Starting market sentiment analysis..."}
+    await asyncio.sleep(0)
+    yield {"type": "task_complete", "task": "recommendations", "data": {"summary": "Hold"}}
+    yield {"type": "complete", "message": "Market sentiment analysis complete"}
+
+
+async def failing_runner(portfolio, preferences):
+    yield {"type": "status", "message": "Starting market sentiment analysis..."}
+    raise RuntimeError("crew exploded")
+
+
+async def _wait_finished(job):
+    async for _ in job.subscribe():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_before_flow_runs():
+    manager = JobManager(runner=fake_runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES)
+    assert job.status == "queued"
+
+    await _wait_finished(job)
+    assert job.status == "completed"
+    assert job.result == {"recommendations": {"summary": "Hold"}}
+    assert manager.get(job.id) is job
+
+
+@pytest.mark.asyncio
+async def test_late_subscribers_get_full_replay():
+    manager = JobManager(runner=fake_runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES)
+    await _wait_finished(job)
+
+    replayed = [event async for event in job.subscribe()]
+    assert [event["type"] for event in replayed] == ["status", "task_complete", "complete"]
+    assert [event["type"] async for event in job.subscribe(after=2)] == ["complete"]
+
+
+@pytest.mark.asyncio
+async def test_runner_errors_fail_the_job():
+    manager = JobManager(runner=failing_runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES)
+    await _wait_finished(job)
+    assert job.status == "failed"
+    assert "crew exploded" in job.error
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_is_bounded():
+    release = asyncio.Event()
+
+    async def blocking_runner(portfolio, preferences):
+        await release.wait()
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=blocking_runner, workers=1)
+    first = await manager.submit(PORTFOLIO, PREFERENCES, dedupe=False)
+    second = await manager.submit(PORTFOLIO, PREFERENCES, dedupe=False)
+    await asyncio.sleep(0.01)
+    assert first.status == "running"
+    assert second.status == "queued"
+
+    release.set()
+    await _wait_finished(second)
+    assert second.status == "completed"
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_expire_after_retention():
+    manager = JobManager(runner=fake_runner, workers=1, retention_seconds=0)
+    job = await manager.submit(PORTFOLIO, PREFERENCES)
+    await _wait_finished(job)
+    job.finished_at -= 1
+    assert manager.get(job.id) is None
+
+
+def test_job_api_submit_poll_and_stream():
+    """Submit returns 202 with a job id; polling and the SSE stream both see the result"""
+    manager = JobManager(runner=fake_runner, workers=1)
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        response = client.post("/api/sentiment/jobs", json={"portfolio": PORTFOLIO, "preferences": PREFERENCES})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+            events = [json.loads(line[len("data: "):]) for line in stream.iter_lines() if line.startswith("data: ")]
+        assert events[-1]["type"] == "complete"
+
+        status = client.get(f"/api/jobs/{job_id}").json()
+        assert status["status"] == "completed"
+        assert status["result"]["recommendations"] == {"summary": "Hold"}
+
+        assert client.get("/api/jobs/unknown").status_code == 404
+        assert client.get("/api/jobs/unknown/events").status_code == 404
+
+
+def test_job_stream_survives_expiry_after_lookup():
+    """A job pruned between the endpoint's 404 check and the first streamed event still streams"""
+    manager = JobManager(runner=fake_runner, workers=1)
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        response = client.post("/api/sentiment/jobs", json={"portfolio": PORTFOLIO, "preferences": PREFERENCES})
+        job_id = response.json()["job_id"]
+        job = manager.get(job_id)
+        with patch.object(manager, "get", side_effect=[job, None]):
+            with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+                events = [json.loads(line[len("data: "):]) for line in stream.iter_lines() if line.startswith("data: ")]
+        assert events[-1]["type"] == "complete"
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_flow():
+    """Duplicates attach to the in-flight job; late joiners still see every event"""
+    runs = []
+    release = asyncio.Event()
+
+    async def counting_runner(portfolio, preferences):
+        runs.append(portfolio)
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        await release.wait()
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=counting_runner, workers=4)
+    first = await manager.submit(PORTFOLIO, PREFERENCES)
+    await asyncio.sleep(0.01)
+    duplicate = await manager.submit(json.loads(json.dumps(PORTFOLIO)), dict(reversed(list(PREFERENCES.items()))))
+    other = await manager.submit(PORTFOLIO, {**PREFERENCES, "risk_tolerance": "high"})
+
+    assert duplicate is first
+    assert other is not first
+    assert manager.deduplicated == 1
+
+    release.set()
+    events = [event["type"] async for event in duplicate.subscribe()]
+    assert events == ["status", "complete"]
+    await _wait_finished(other)
+    assert len(runs) == 2
+
+    # Once finished, the same request starts a fresh analysis
+    assert await manager.submit(PORTFOLIO, PREFERENCES) is not first
+
+
+@pytest.mark.asyncio
+async def test_analyze_streams_fan_out_duplicates():
+    """Concurrent identical /analyze streams are served by a single flow"""
+    runs = []
+
+    async def counting_runner(portfolio, preferences):
+        runs.append(portfolio)
+        async for event in fake_runner(portfolio, preferences):
+            await asyncio.sleep(0.01)
+            yield event
+
+    manager = JobManager(runner=counting_runner, workers=4)
+
+    async def consume():
+        return [chunk.decode() async for chunk in event_generator(PORTFOLIO, PREFERENCES)]
+
+    with patch('marketpulse.main.get_job_manager', return_value=manager):
+        first, second = await asyncio.gather(consume(), consume())
+
+    assert len(runs) == 1
+    assert first == second
+    assert json.loads(first[-1].split("data: ", 1)[1])["type"] == "complete"
+
+
+@pytest.mark.asyncio
+async def test_replay_buffer_is_bounded():
+    async def chatty_runner(portfolio, preferences):
+        for i in range(5):
+            yield {"type": "status", "message": str(i)}
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=chatty_runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES)
+    job.events = deque(maxlen=3)
+    await _wait_finished(job)
+
+    assert job.next_event_id == 6
+    assert job.first_event_id == 3
+    # Dropped events are skipped; ids stay absolute
+    assert [event_id async for event_id, _ in job.subscribe_with_ids(after=0)] == [3, 4, 5]
+    assert [event_id async for event_id, _ in job.subscribe_with_ids(after=4)] == [4, 5]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_with_last_event_id_does_not_rerun():
+    runs = []
+
+    async def counting_runner(portfolio, preferences):
+        runs.append(portfolio)
+        async for event in fake_runner(portfolio, preferences):
+            yield event
+
+    manager = JobManager(runner=counting_runner, workers=1)
+    with patch('marketpulse.main.get_job_manager', return_value=manager):
+        first = [chunk.decode() async for chunk in event_generator(PORTFOLIO, PREFERENCES)]
+        last_seen = first[0].split("\n")[0][len("id: "):]
+        resumed = [chunk.decode() async for chunk in event_generator(PORTFOLIO, PREFERENCES, last_event_id=last_seen)]
+
+    assert len(runs) == 1
+    assert resumed == first[1:]
+    assert last_seen.endswith(":0")
+
+
+def _distinct(i):
+    return {"holdings": [{"ticker": f"T{i}", "allocation": 10, "sector": "Technology"}]}
+
+
+@pytest.mark.asyncio
+async def test_queue_positions_and_bounded_queue():
+    release = asyncio.Event()
+
+    async def blocking_runner(portfolio, preferences):
+        await release.wait()
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=blocking_runner, workers=1, max_queued=2, max_per_client=10)
+    running = await manager.submit(_distinct(0), PREFERENCES)
+    await asyncio.sleep(0.01)
+    first = await manager.submit(_distinct(1), PREFERENCES)
+    second = await manager.submit(_distinct(2), PREFERENCES)
+    assert first.events[-1] == {"type": "queued", "position": 1, "message": "Queued, position 1"}
+    assert second.events[-1]["position"] == 2
+
+    with pytest.raises(AdmissionError) as rejected:
+        await manager.submit(_distinct(3), PREFERENCES)
+    assert rejected.value.retry_after >= 1
+    # Identical requests still join the in-flight job when the queue is full
+    assert await manager.submit(_distinct(2), PREFERENCES) is second
+
+    release.set()
+    await _wait_finished(second)
+    # Second moved up as the queue drained
+    assert [event["position"] for event in second.events if event["type"] == "queued"] == [2, 1]
+    assert all(event["type"] != "queued" for event in running.events)
+
+
+@pytest.mark.asyncio
+async def test_per_client_limit():
+    release = asyncio.Event()
+
+    async def blocking_runner(portfolio, preferences):
+        await release.wait()
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=blocking_runner, workers=4, max_per_client=1)
+    job = await manager.submit(_distinct(0), PREFERENCES, client_id="10.0.0.1")
+    with pytest.raises(AdmissionError):
+        await manager.submit(_distinct(1), PREFERENCES, client_id="10.0.0.1")
+    assert (await manager.submit(_distinct(1), PREFERENCES, client_id="10.0.0.2")).client_id == "10.0.0.2"
+
+    release.set()
+    await _wait_finished(job)
+    await asyncio.sleep(0.01)
+    assert manager.client_jobs.get("10.0.0.1") is None
+    assert (await manager.submit(_distinct(2), PREFERENCES, client_id="10.0.0.1")).status == "queued"
+
+
+def test_full_queue_returns_429_with_retry_after():
+    manager = JobManager(runner=fake_runner, workers=1, max_queued=0)
+    body = {"portfolio": PORTFOLIO, "preferences": PREFERENCES}
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        for method, url in (("POST", "/api/sentiment/analyze"), ("POST", "/api/sentiment/jobs")):
+            response = client.request(method, url, json=body)
+            assert response.status_code == 429
+            assert int(response.headers["retry-after"]) >= 1
+    assert manager.rejected == 2
+
+
+def test_stages_reach_the_runner_and_split_dedupe():
+    """Requests for different stage sets never share a flow"""
+    seen = []
+
+    async def recording_runner(portfolio, preferences, stages=None):
+        seen.append(stages)
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=recording_runner, workers=2)
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        body = {"portfolio": PORTFOLIO, "preferences": PREFERENCES, "stages": ["sentiment_analysis"]}
+        first = client.post("/api/sentiment/jobs", json=body).json()["job_id"]
+        full = client.post("/api/sentiment/jobs", json={**body, "stages": None}).json()["job_id"]
+        assert first != full
+        for job_id in (first, full):
+            with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+                list(stream.iter_lines())
+
+        rejected = client.post("/api/sentiment/analyze", json={**body, "stages": ["everything"]})
+        assert rejected.status_code == 422
+        assert "Unknown stages" in rejected.json()["detail"]
+
+    assert sorted(seen, key=str) == sorted([["sentiment_analysis"], None], key=str)
@@ -0,0 +1,45 @@
+# tests/test_lazy_imports.py
+
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse import main
+from marketpulse.utils.lazy_imports import prewarm_imports
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_entry_points_do_not_import_crewai():
+    for module in ("marketpulse.main", "marketpulse.cli"):
+        result = subprocess.run(
+            [sys.executable, "-c", f"import sys, {module}; print('crewai' in sys.modules)"],
+            env={**os.environ, "PYTHONPATH": SRC}, capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "False", module
+
+
+def test_prewarm_records_timings_and_survives_failures():
+    timings = prewarm_imports(["json", "marketpulse.does_not_exist"])
+    assert "json" in timings
+    assert "marketpulse.does_not_exist" not in timings
+
+
+def test_health_is_served_while_prewarm_runs():
+    def slow_prewarm():
+        time.sleep(0.5)
+
+    with patch.dict(os.environ, {"PREWARM_IMPORTS": "true"}), \
+         patch('marketpulse.main.prewarm_imports', side_effect=slow_prewarm) as prewarm:
+        started = time.monotonic()
+        with TestClient(main.app) as client:
+            assert client.get("/health").status_code == 200
+            assert time.monotonic() - started < 0.5
+    prewarm.assert_called_once()
+
+
+def test_flow_class_still_reachable_from_main():
+    from marketpulse.flows.market_analysis_flow import MarketSentimentFlow
+    assert main.MarketSentimentFlow is MarketSentimentFlow
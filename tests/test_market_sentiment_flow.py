@@ -8,6 +8,7 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 from marketpulse.flows.market_analysis_flow import MarketSentimentFlow
+from marketpulse.utils.stage_cache import StageCache
 
 
 @pytest.fixture
@@ -193,4 +194,40 @@ def test_flow_extract_json(mock_yaml, mock_news_tool, mock_stock_tool, mock_infl
     # Test invalid JSON
     invalid_json = '{"test": value}'  # Missing quotes around value
     result = flow._extract_json_from_response(invalid_json)
-    assert result is None 
\ No newline at end of file
+    assert result is None 
+
+
+@pytest.mark.asyncio
+async def test_cached_stage_output_reaches_downstream_prompts(real_crews, tmp_path):
+    """A stage served from the cache still hands its output to the tasks that list it as context"""
+    stage_cache = StageCache(cache_dir=str(tmp_path / "stages"), ttl_seconds=60, enabled=True)
+    real_crews.answers["collect_global_news_task"] = {"market_events": [{"headline": "Fed holds rates"}]}
+
+    first = MarketSentimentFlow({"holdings": []}, {})
+    first.stage_cache = stage_cache
+    await first.collect_global_news()
+
+    # A new run with the same inputs gets global news from the cache, without running its crew
+    flow = MarketSentimentFlow({"holdings": []}, {})
+    flow.stage_cache = stage_cache
+    await flow.collect_global_news()
+    assert len(real_crews.contexts["collect_global_news_task"]) == 1
+    await flow.analyze_market_sentiment()
+    assert "Fed holds rates" in real_crews.contexts["analyze_market_sentiment_task"][0]
+
+
+@pytest.mark.asyncio
+async def test_chunked_portfolio_news_reaches_sentiment_prompt(real_crews, tmp_path):
+    """Chunks run on task copies; their merged result must still be the sentiment task's context"""
+    real_crews.answers["analyze_portfolio_news_task"] = {
+        "company_news": [{"ticker": "AAPL", "news_items": [{"headline": "Apple ships new chip"}]}]
+    }
+    holdings = [{"ticker": "AAPL", "sector": "Technology"}, {"ticker": "XOM", "sector": "Energy"}]
+    flow = MarketSentimentFlow({"holdings": holdings}, {})
+    flow.stage_cache = StageCache(cache_dir=str(tmp_path / "stages"), enabled=False)
+    flow.chunk_size = 1
+
+    await flow.analyze_portfolio_news()
+    assert len(real_crews.contexts["analyze_portfolio_news_task"]) == 2
+    await flow.analyze_market_sentiment()
+    assert "Apple ships new chip" in real_crews.contexts["analyze_market_sentiment_task"][0]
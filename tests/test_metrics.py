@@ -0,0 +1,80 @@
+# tests/test_metrics.py
+
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from marketpulse.jobs import JobManager
+from marketpulse.main import app
+from marketpulse.tools.market_tool import StockQuoteTool
+from prometheus_client import REGISTRY
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+PORTFOLIO = {"holdings": [{"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"}]}
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _worker(directory, code):
+    """Run code as a separate worker process in multiprocess mode"""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(directory), "PYTHONPATH": SRC}
+    script = f"from marketpulse.utils.metrics import *\n{code}"
+    return subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True).stdout
+
+
+def test_workers_merge_and_dead_workers_drop_their_gauges(tmp_path):
+    # One worker shuts down cleanly, one is killed mid-flow and never runs its shutdown
+    _worker(tmp_path, "JOBS.labels(outcome='completed').inc(2)\nFLOWS_IN_FLIGHT.inc()\nmark_worker_dead()")
+    _worker(tmp_path, "JOBS.labels(outcome='completed').inc(3)\nFLOWS_IN_FLIGHT.inc()")
+
+    output = _worker(tmp_path, "import os\nmark_dead_workers(multiprocess_dir())\nprint(os.getpid())\nprint(render().decode())")
+    pid, text = output.split("\n", 1)
+    # Counters keep exited workers' totals; gauges only count live workers
+    assert 'marketpulse_jobs_total{outcome="completed"} 5.0' in text
+    assert "marketpulse_flows_in_flight 0.0" in text
+    # Only the scraping worker's own live gauges are left
+    assert {path.name for path in tmp_path.glob("gauge_live*")} == {f"gauge_livesum_{pid}.db"}
+
+
+def test_tool_cache_hits_and_misses(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    hits = _value("marketpulse_tool_cache_total", tool="stock_quote", result="hit")
+    misses = _value("marketpulse_tool_cache_total", tool="stock_quote", result="miss")
+    response = MagicMock()
+    response.json.return_value = {"Global Quote": {"01. symbol": "ZZZZ", "05. price": "1.00"}}
+    with patch('requests.get', return_value=response):
+        tool = StockQuoteTool()
+        tool._run("ZZZZ")
+        tool._run("ZZZZ")
+    assert _value("marketpulse_tool_cache_total", tool="stock_quote", result="miss") == misses + 1
+    assert _value("marketpulse_tool_cache_total", tool="stock_quote", result="hit") == hits + 1
+
+
+def test_metrics_endpoint_reports_jobs_and_stream_bytes():
+    async def runner(portfolio, preferences):
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        await asyncio.sleep(0)
+        yield {"type": "complete"}
+
+    completed = _value("marketpulse_jobs_total", outcome="completed")
+    sent = _value("marketpulse_stream_bytes_sent_total", route="/api/sentiment/analyze", format="sse")
+    manager = JobManager(runner=runner, workers=1)
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        request = {"portfolio": PORTFOLIO, "preferences": PREFERENCES}
+        with client.stream("POST", "/api/sentiment/analyze", json=request, headers={"Accept-Encoding": "identity"}) as stream:
+            body = b"".join(stream.iter_bytes())
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=")
+    assert _value("marketpulse_jobs_total", outcome="completed") == completed + 1
+    assert _value("marketpulse_stream_bytes_sent_total", route="/api/sentiment/analyze", format="sse") == sent + len(body)
+    assert 'marketpulse_jobs_total{outcome="completed"}' in response.text
+    assert "marketpulse_flows_in_flight" in response.text
@@ -0,0 +1,55 @@
+# tests/test_portfolio_chunks.py
+
+import pytest
+from marketpulse.utils.portfolio_chunks import merge_portfolio_news, partition_holdings
+
+
+def _holding(ticker, sector, allocation=1):
+    return {"ticker": ticker, "company": f"{ticker} Inc.", "sector": sector, "allocation": allocation}
+
+
+def test_sector_partition_keeps_sectors_together():
+    """Small sectors share a chunk, nothing is split needlessly"""
+    holdings = [
+        _holding("AAPL", "Technology"), _holding("MSFT", "Technology"), _holding("NVDA", "Technology"),
+        _holding("XOM", "Energy"), _holding("JNJ", "Healthcare")
+    ]
+    chunks = partition_holdings(holdings, chunk_size=3)
+    assert [len(chunk) for chunk in chunks] == [3, 2]
+    assert {h["sector"] for h in chunks[0]} == {"Technology"}
+
+
+def test_sector_partition_splits_large_sectors():
+    holdings = [_holding(f"T{i}", "Technology") for i in range(7)]
+    chunks = partition_holdings(holdings, chunk_size=3)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert sum(len(chunk) for chunk in chunks) == len(holdings)
+
+
+def test_size_partition_orders_by_allocation():
+    holdings = [_holding("A", "X", 1), _holding("B", "X", 10), _holding("C", "X", 5)]
+    chunks = partition_holdings(holdings, chunk_size=2, strategy="size")
+    assert [[h["ticker"] for h in chunk] for chunk in chunks] == [["B", "C"], ["A"]]
+
+
+def test_partition_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        partition_holdings([], chunk_size=0)
+    with pytest.raises(ValueError):
+        partition_holdings([], chunk_size=5, strategy="alphabetical")
+
+
+def test_merge_combines_companies_and_sectors():
+    """Overlapping sectors are merged and duplicate items dropped"""
+    first = {
+        "company_news": [{"ticker": "AAPL", "news_items": [{"headline": "iPhone"}], "overall_sentiment": "positive"}],
+        "sector_news": [{"sector": "Technology", "developments": [{"development": "AI boom"}]}]
+    }
+    second = {
+        "company_news": [{"ticker": "MSFT", "news_items": [{"headline": "Azure"}]}],
+        "sector_news": [{"sector": "Technology", "developments": [{"development": "AI boom"}, {"development": "Chip tariffs"}]}]
+    }
+    merged = merge_portfolio_news([first, second])
+    assert [c["ticker"] for c in merged["company_news"]] == ["AAPL", "MSFT"]
+    assert len(merged["sector_news"]) == 1
+    assert [d["development"] for d in merged["sector_news"][0]["developments"]] == ["AI boom", "Chip tariffs"]
@@ -0,0 +1,107 @@
+# tests/test_profiling.py
+
+import os
+import threading
+import time
+import tracemalloc
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.jobs import JobManager
+from marketpulse.main import app
+from marketpulse.utils.profiling import profile_run
+
+PORTFOLIO = {"holdings": [{"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"}]}
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+def busy_cleanup(seconds):
+    """Stand-in for a CPU-heavy stage running on a crew thread"""
+    deadline = time.monotonic() + seconds
+    blobs = []
+    while time.monotonic() < deadline:
+        blobs.append("x" * 1000)
+    return blobs
+
+
+def test_profile_captures_cpu_stacks_and_allocations(tmp_path):
+    with profile_run("run-1", directory=str(tmp_path)) as report:
+        worker = threading.Thread(target=busy_cleanup, args=(0.2,))
+        worker.start()
+        worker.join()
+
+    assert report["samples"] > 0
+    folded = (tmp_path / "run-1.folded").read_text().splitlines()
+    assert any("busy_cleanup (test_profiling.py" in line for line in folded)
+    # Folded format: semicolon-separated stack, a space, then the sample count
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert report["top_allocators"] and os.path.exists(report["allocations"])
+    assert not tracemalloc.is_tracing()
+
+
+def test_one_profile_at_a_time(tmp_path):
+    with profile_run("first", directory=str(tmp_path)):
+        with profile_run("second", directory=str(tmp_path)) as second:
+            pass
+    assert "first" in second["skipped"]
+    assert not (tmp_path / "second.folded").exists()
+
+
+@pytest.mark.asyncio
+async def test_profiled_job_reports_profile_in_final_event(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    seen = []
+
+    async def runner(portfolio, preferences, **options):
+        seen.append(options)
+        busy_cleanup(0.05)
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, options={"profile": True})
+    events = [event async for event in job.subscribe()]
+
+    assert seen == [{}]
+    assert events[-1]["profile"]["flamegraph"] == str(tmp_path / f"{job.id}.folded")
+    assert job.to_dict()["profile"]["run_id"] == job.id
+
+
+def test_profiling_requires_admin_and_serves_the_flamegraph(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+
+    async def runner(portfolio, preferences):
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    body = {"portfolio": PORTFOLIO, "preferences": PREFERENCES}
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        denied = client.post("/api/sentiment/jobs", json=body, headers={"X-Profile": "true"})
+        assert denied.status_code == 401
+
+        submitted = client.post("/api/sentiment/jobs", json=body, headers={"X-Profile": "true", "X-Admin-Token": "secret"})
+        job_id = submitted.json()["job_id"]
+        for _ in range(100):
+            if client.get(f"/api/jobs/{job_id}").json()["status"] == "completed":
+                break
+            time.sleep(0.02)
+
+        profile = client.get(f"/api/admin/profiles/{job_id}", headers={"X-Admin-Token": "secret"})
+        assert profile.status_code == 200
+        assert client.get(f"/api/admin/profiles/{job_id}?kind=allocations", headers={"X-Admin-Token": "secret"}).status_code == 200
+        assert client.get("/api/admin/profiles/missing", headers={"X-Admin-Token": "secret"}).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_unprofiled_runs_do_not_trace_allocations():
+    traced = []
+
+    async def runner(portfolio, preferences):
+        traced.append(tracemalloc.is_tracing())
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES)
+    events = [event async for event in job.subscribe()]
+    assert traced == [False]
+    assert "profile" not in events[-1] and "profile" not in job.to_dict()
@@ -0,0 +1,98 @@
+# tests/test_stage_cache.py
+
+import os
+import time
+import pytest
+from marketpulse.utils.stage_cache import StageCache, compute_stage_key
+
+
+@pytest.fixture
+def stage_cache(tmp_path):
+    return StageCache(cache_dir=str(tmp_path / "stages"), ttl_seconds=60, enabled=True)
+
+
+def _key(**overrides):
+    params = {
+        "agent_config": {"role": "Analyst", "goal": "Analyze"},
+        "task_config": {"description": "Analyze {portfolio}", "agent": "analyst"},
+        "model": "gpt-4o-mini",
+        "temperature": 0.3,
+        "inputs": {"portfolio": '{"holdings": []}'},
+        "tool_digests": {"financial_news_search": "2025-03-24"}
+    }
+    params.update(overrides)
+    return compute_stage_key(**params)
+
+
+def test_key_is_stable_and_order_independent():
+    """Identical inputs hash to the same key regardless of dict ordering"""
+    first = _key(agent_config={"role": "Analyst", "goal": "Analyze"})
+    second = _key(agent_config={"goal": "Analyze", "role": "Analyst"})
+    assert first == second
+
+
+@pytest.mark.parametrize("override", [
+    {"model": "gpt-4o"},
+    {"temperature": 0.7},
+    {"inputs": {"portfolio": '{"holdings": [{"ticker": "AAPL"}]}'}},
+    {"tool_digests": {"financial_news_search": "2025-03-25"}},
+    {"task_config": {"description": "Something else", "agent": "analyst"}}
+])
+def test_key_changes_with_any_input(override):
+    """Every component of the stage contributes to the key"""
+    assert _key() != _key(**override)
+
+
+def test_get_set_and_hit_rate(stage_cache):
+    """Stored outputs are served back and counted as hits"""
+    key = _key()
+    assert stage_cache.get(key) is None
+
+    stage_cache.set(key, '{"result": 1}', stage="collect_global_news_task")
+    assert stage_cache.get(key) == '{"result": 1}'
+
+    stats = stage_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_expired_entries_are_misses(stage_cache):
+    """Entries older than the TTL are ignored"""
+    key = _key()
+    stage_cache.set(key, '{"result": 1}')
+    old = time.time() - 120
+    os.utime(stage_cache._path(key), (old, old))
+    assert stage_cache.get(key) is None
+
+
+def test_invalidate_by_stage(stage_cache):
+    """Invalidation can target a single stage or clear everything"""
+    stage_cache.set("a", "{}", stage="collect_global_news_task")
+    stage_cache.set("b", "{}", stage="generate_recommendations_task")
+
+    assert stage_cache.invalidate("collect_global_news_task") == 1
+    assert stage_cache.get("a") is None
+    assert stage_cache.get("b") == "{}"
+
+    assert stage_cache.invalidate() == 1
+    assert stage_cache.get("b") is None
+
+
+def test_disabled_cache_never_stores(tmp_path):
+    cache = StageCache(cache_dir=str(tmp_path), ttl_seconds=60, enabled=False)
+    cache.set("a", "{}")
+    assert cache.get("a") is None
+    assert not os.listdir(tmp_path)
+
+
+def test_lookup_returns_expired_entries_once(stage_cache):
+    """An expired entry comes back for budget fallbacks, but is a single miss"""
+    key = _key()
+    stage_cache.set(key, '{"result": 1}')
+    old = time.time() - 120
+    os.utime(stage_cache._path(key), (old, old))
+
+    assert stage_cache.lookup(key, stage="collect_global_news_task") == ('{"result": 1}', False)
+    assert stage_cache.stats()["misses"] == 1
+    assert stage_cache.stats()["hits"] == 0
@@ -4,6 +4,7 @@ import pytest
 import json
 from unittest.mock import patch, MagicMock
 from marketpulse.utils.stream_utils import (
+    StreamEvent,
     create_stream_event,
     process_task_result
 )
@@ -88,4 +89,36 @@ async def test_process_task_result_salvage_partial_json():
     event = await process_task_result("partial", mixed_text)
     parsed = json.loads(event.strip())
     assert parsed["type"] == "task_complete"
-    assert parsed["data"]["valid"] == "json"
\ No newline at end of file
+    assert parsed["data"]["valid"] == "json"
+
+def test_stream_event_round_trip():
+    """Typed events convert to the same dicts the SSE stream carries"""
+    event = StreamEvent("task_complete", task="recommendations", data={"summary": "Hold"})
+    assert event.to_dict() == {"type": "task_complete", "task": "recommendations", "data": {"summary": "Hold"}}
+    assert StreamEvent.from_dict(event.to_dict()) == event
+    assert StreamEvent("complete").to_dict() == {"type": "complete"}
+
+@pytest.mark.asyncio
+async def test_cli_consumes_typed_events(tmp_path):
+    """The CLI reads event objects from the flow without any SSE parsing"""
+    from marketpulse import cli
+
+    class FakeFlow:
+        def __init__(self, portfolio, preferences, stages=None):
+            pass
+
+        async def iter_events(self):
+            yield StreamEvent("status", "Starting market sentiment analysis...")
+            yield StreamEvent("task_complete", task="recommendations", data={"summary": "Hold"})
+            yield StreamEvent("complete", "Market sentiment analysis complete")
+
+    portfolio_file = tmp_path / "portfolio.json"
+    portfolio_file.write_text(json.dumps({"holdings": []}))
+    preferences_file = tmp_path / "preferences.json"
+    preferences_file.write_text(json.dumps({"risk_tolerance": "moderate"}))
+    output_file = tmp_path / "out.json"
+
+    with patch('marketpulse.flows.market_analysis_flow.MarketSentimentFlow', FakeFlow):
+        await cli.run_analysis(str(portfolio_file), str(preferences_file), str(output_file))
+
+    assert json.loads(output_file.read_text()) == {"recommendations": {"summary": "Hold"}}
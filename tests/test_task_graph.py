@@ -0,0 +1,149 @@
+# tests/test_task_graph.py
+
+import asyncio
+import os
+import pytest
+from marketpulse.utils.task_graph import TaskGraph, run_graph
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+
+@pytest.fixture
+def mock_config_files():
+    """Read the real tasks.yaml files instead of the crew config mocks"""
+    yield
+
+
+async def _collect(graph, runners):
+    return [(event.kind, event.node) async for event in run_graph(graph, runners)]
+
+
+def test_market_graph_from_tasks_yaml():
+    """Dependencies come straight from the `context:` lists"""
+    graph = TaskGraph.from_yaml(os.path.join(SRC_DIR, "marketpulse", "config", "tasks.yaml"))
+    assert graph.dependencies["collect_global_news_task"] == []
+    assert graph.dependencies["analyze_portfolio_news_task"] == []
+    assert graph.dependencies["monitor_key_influencers_task"] == []
+    assert set(graph.dependencies["analyze_market_sentiment_task"]) == {
+        "collect_global_news_task", "analyze_portfolio_news_task", "monitor_key_influencers_task"
+    }
+    assert graph.order[-1] == "generate_recommendations_task"
+
+
+def test_resume_graph_from_tasks_yaml():
+    graph = TaskGraph.from_yaml(os.path.join(SRC_DIR, "resumepulse", "config", "tasks.yaml"))
+    assert graph.dependencies["generate_profile_questions_task"] == ["parse_resume_task"]
+    assert graph.order[-1] == "generate_tailored_resume_task"
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="unknown"):
+        TaskGraph({"a": ["missing"]})
+    with pytest.raises(ValueError, match="Cycle"):
+        TaskGraph({"a": ["b"], "b": ["a"]})
+
+
+def test_add_node_wires_dependents():
+    graph = TaskGraph({"a": [], "b": ["a"]})
+    graph.add_node("pre", dependents=["b"])
+    assert "pre" in graph.dependencies["b"]
+    assert graph.order.index("pre") < graph.order.index("b")
+
+
+def test_closure_is_minimal():
+    """Requested outputs pull in their transitive dependencies and nothing else"""
+    graph = TaskGraph.from_yaml(os.path.join(SRC_DIR, "marketpulse", "config", "tasks.yaml"))
+    graph.add_node("compute_portfolio_metrics", dependents=["generate_recommendations_task"])
+    assert graph.closure(["analyze_portfolio_news_task"]) == {"analyze_portfolio_news_task"}
+    assert graph.closure(["analyze_market_sentiment_task"]) == {
+        "collect_global_news_task", "analyze_portfolio_news_task", "monitor_key_influencers_task",
+        "analyze_market_sentiment_task"
+    }
+    assert "compute_portfolio_metrics" in graph.closure(["generate_recommendations_task"])
+    with pytest.raises(ValueError, match="Unknown"):
+        graph.closure(["missing_task"])
+
+
+def test_stage_names_map_to_tasks():
+    from marketpulse.flows.market_analysis_flow import MarketSentimentFlow
+    assert MarketSentimentFlow.stage_tasks(None) is None
+    assert MarketSentimentFlow.stage_tasks(["sentiment_analysis", "portfolio_news"]) == [
+        "analyze_market_sentiment_task", "analyze_portfolio_news_task"
+    ]
+    with pytest.raises(ValueError, match="Unknown stages"):
+        MarketSentimentFlow.stage_tasks(["everything"])
+
+
+@pytest.mark.asyncio
+async def test_only_selected_runners_run():
+    """The flow passes only its selected tasks to run_graph; the rest never start"""
+    graph = TaskGraph({"a": [], "b": ["a"], "c": ["b"]})
+    selected = graph.closure(["b"])
+    calls = []
+
+    def runner(name):
+        async def run():
+            calls.append(name)
+            return {name: True}
+        return run
+
+    events = await _collect(graph, {name: runner(name) for name in "abc" if name in selected})
+    assert calls == ["a", "b"]
+    assert ("started", "c") not in events
+
+
+@pytest.mark.asyncio
+async def test_independent_nodes_run_concurrently():
+    """Roots start together and the join node waits for all of them"""
+    graph = TaskGraph({"a": [], "b": [], "c": ["a", "b"]})
+    both_started = asyncio.Event()
+    started = []
+
+    async def root(name):
+        started.append(name)
+        if len(started) == 2:
+            both_started.set()
+        # Would deadlock if the roots ran one after the other
+        await asyncio.wait_for(both_started.wait(), timeout=1)
+        return {name: True}
+
+    async def join():
+        return {"c": True}
+
+    events = await _collect(graph, {
+        "a": lambda: root("a"),
+        "b": lambda: root("b"),
+        "c": join
+    })
+    assert events[:2] == [("started", "a"), ("started", "b")]
+    assert events[-2:] == [("started", "c"), ("completed", "c")]
+
+
+@pytest.mark.asyncio
+async def test_failed_node_skips_dependents():
+    """A falsy result fails the node; unrelated branches still complete"""
+    graph = TaskGraph({"a": [], "b": [], "c": ["a"]})
+
+    async def fail():
+        return None
+
+    async def succeed():
+        return {"ok": True}
+
+    events = await _collect(graph, {"a": fail, "b": succeed, "c": succeed})
+    assert ("failed", "a") in events
+    assert ("completed", "b") in events
+    assert ("skipped", "c") in events
+    assert ("started", "c") not in events
+
+
+@pytest.mark.asyncio
+async def test_exceptions_are_reported_as_failures():
+    graph = TaskGraph({"a": []})
+
+    async def boom():
+        raise RuntimeError("crew exploded")
+
+    events = [event async for event in run_graph(graph, {"a": boom})]
+    assert events[-1].kind == "failed"
+    assert events[-1].error == "crew exploded"
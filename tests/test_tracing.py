@@ -0,0 +1,86 @@
+# tests/test_tracing.py
+
+import asyncio
+import json
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from marketpulse.jobs import JobManager
+from marketpulse.main import app
+from marketpulse.tools.market_tool import StockQuoteTool
+from marketpulse.utils.tracing import JsonLinesSpanExporter, configure_tracing, shutdown_tracing, span
+
+PORTFOLIO = {"holdings": [{"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"}]}
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    configure_tracing(exporter)
+    yield exporter
+    shutdown_tracing()
+
+
+def test_analyze_request_is_the_root_of_its_flow(exporter):
+    async def runner(portfolio, preferences):
+        with span("stage sentiment_analysis"):
+            await asyncio.sleep(0)
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    with patch('marketpulse.main.get_job_manager', return_value=manager), \
+         patch('marketpulse.main.configure_tracing'), patch('marketpulse.main.shutdown_tracing'), \
+         TestClient(app) as client:
+        with client.stream("POST", "/api/sentiment/analyze", json={"portfolio": PORTFOLIO, "preferences": PREFERENCES}) as stream:
+            list(stream.iter_lines())
+
+    spans = {finished.name: finished for finished in exporter.get_finished_spans()}
+    request, analysis, stage = spans["POST /api/sentiment/analyze"], spans["analysis"], spans["stage sentiment_analysis"]
+    assert request.parent is None
+    assert analysis.parent.span_id == request.context.span_id
+    assert stage.parent.span_id == analysis.context.span_id
+    assert request.attributes["marketpulse.job_id"] == analysis.attributes["marketpulse.job_id"]
+
+
+def test_tool_spans_record_cache_and_http(exporter, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("ALPHA_VANTAGE_API_KEY", "secret")
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"Global Quote": {"01. symbol": "ZZZZ", "05. price": "1.00"}}
+    with patch('requests.get', return_value=response):
+        tool = StockQuoteTool()
+        tool._run("ZZZZ")
+        tool._run("ZZZZ")
+
+    spans = exporter.get_finished_spans()
+    tool_spans = [finished for finished in spans if finished.name == "tool stock_quote"]
+    assert [finished.attributes["marketpulse.cache_hit"] for finished in tool_spans] == [False, True]
+    http = next(finished for finished in spans if finished.name == "GET www.alphavantage.co")
+    assert http.parent.span_id == tool_spans[0].context.span_id
+    assert http.attributes["http.response.status_code"] == 200
+    assert "secret" not in http.attributes["url.full"]
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    configure_tracing(JsonLinesSpanExporter(str(path)))
+    try:
+        with span("outer", {"holdings": 3}):
+            with span("inner"):
+                pass
+    finally:
+        shutdown_tracing()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [recorded["name"] for recorded in spans] == ["inner", "outer"]
+    assert spans[1]["attributes"] == {"holdings": 3}
+
+
+def test_tracing_is_off_by_default():
+    with patch.dict(os.environ, {"TRACING_EXPORTER": "none"}):
+        assert not configure_tracing()
+    with span("ignored") as current:
+        assert not current.is_recording()
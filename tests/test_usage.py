@@ -0,0 +1,149 @@
+# tests/test_usage.py
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.jobs import AdmissionError, JobManager
+from marketpulse.main import SentimentRequest, app, flow_options
+from marketpulse.tools.market_tool import StockQuoteTool
+from marketpulse.utils.usage import (
+    BudgetExceeded, UsageBudget, UsageLedger, check_stage_budget, record_api_call, record_llm_usage,
+    set_usage_ledger, set_usage_stage, token_cost
+)
+
+PORTFOLIO = {"holdings": [{"ticker": "AAPL", "company": "Apple Inc.", "allocation": 15, "sector": "Technology"}]}
+PREFERENCES = {"risk_tolerance": "moderate", "investment_horizon": "medium-term"}
+
+
+def crew_usage(prompt, completion, cached=0):
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, cached_prompt_tokens=cached)
+
+
+def test_token_cost_uses_cached_rate():
+    assert token_cost("gpt-4o-mini", 1_000_000, 0) == pytest.approx(0.15)
+    assert token_cost("gpt-4o-mini", 1_000_000, 1_000_000, cached_prompt_tokens=1_000_000) == pytest.approx(0.675)
+
+
+@pytest.mark.asyncio
+async def test_usage_is_attributed_to_stages_across_threads():
+    ledger = UsageLedger()
+    set_usage_ledger(ledger)
+
+    def crew_thread():
+        record_llm_usage("portfolio_news_agent", "gpt-4o-mini", crew_usage(1000, 200))
+        record_api_call("bing")
+
+    set_usage_stage("analyze_portfolio_news_task")
+    await asyncio.to_thread(crew_thread)
+    set_usage_stage("collect_global_news_task")
+    record_api_call("alphavantage")
+
+    usage = ledger.to_dict()
+    assert usage["prompt_tokens"] == 1000
+    assert usage["api_calls"] == 2
+    assert usage["stages"]["analyze_portfolio_news_task"]["api_calls"] == {"bing": 1}
+    assert usage["stages"]["collect_global_news_task"]["api_calls"] == {"alphavantage": 1}
+    assert usage["estimated_cost_usd"] > 0
+
+
+@pytest.mark.asyncio
+async def test_stage_budget_short_circuits():
+    ledger = UsageLedger(UsageBudget(max_tokens=1000))
+    set_usage_ledger(ledger)
+    check_stage_budget("collect_global_news_task")
+    record_llm_usage("global_news_agent", "gpt-4o-mini", crew_usage(900, 100))
+    with pytest.raises(BudgetExceeded):
+        check_stage_budget("analyze_market_sentiment_task")
+
+
+@pytest.mark.asyncio
+async def test_tools_downgrade_once_api_budget_is_spent(tmp_path, monkeypatch):
+    # Async so the ledger is bound in this test's own task context only
+    monkeypatch.chdir(tmp_path)
+    ledger = UsageLedger(UsageBudget(max_api_calls=0))
+    set_usage_ledger(ledger)
+    with patch('requests.get') as mock_get:
+        result = StockQuoteTool()._run("ZZZZ")
+    mock_get.assert_not_called()
+    assert "API call budget" in result
+    assert ledger.to_dict()["budget_actions"][0]["action"] == "downgrade"
+
+
+@pytest.mark.asyncio
+async def test_final_event_reports_usage_and_budget_stays_out_of_runner():
+    seen = []
+
+    async def runner(portfolio, preferences, **options):
+        seen.append(options)
+        set_usage_stage("analyze_market_sentiment_task")
+        record_llm_usage("sentiment_analysis_agent", "gpt-4o-mini", crew_usage(500, 50))
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, options={"budget": {"max_tokens": 10000}})
+    events = [event async for event in job.subscribe()]
+
+    assert seen == [{}]
+    usage = events[-1]["usage"]
+    assert usage["prompt_tokens"] == 500
+    assert usage["budget"] == {"max_tokens": 10000}
+    assert job.to_dict()["usage"] == usage
+
+
+@pytest.mark.asyncio
+async def test_tenant_daily_budget_rejects_further_runs():
+    async def runner(portfolio, preferences):
+        record_llm_usage("portfolio_strategy_agent", "gpt-4o", crew_usage(100_000, 10_000))
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1, tenant_daily_budget_usd=0.1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, client_id="10.0.0.1")
+    async for _ in job.subscribe():
+        pass
+    # 100k prompt + 10k completion tokens of gpt-4o is $0.35
+    assert manager.tenant_remaining("10.0.0.1") < 0
+    with pytest.raises(AdmissionError) as rejected:
+        await manager.submit({"holdings": []}, PREFERENCES, client_id="10.0.0.1")
+    assert rejected.value.retry_after > 0
+    assert manager.tenant_remaining("10.0.0.2") == 0.1
+
+
+@pytest.mark.asyncio
+async def test_tenant_budget_follows_the_tenant_across_addresses():
+    async def runner(portfolio, preferences):
+        record_llm_usage("portfolio_strategy_agent", "gpt-4o", crew_usage(100_000, 10_000))
+        yield {"type": "complete"}
+
+    manager = JobManager(runner=runner, workers=1, tenant_daily_budget_usd=0.1)
+    job = await manager.submit(PORTFOLIO, PREFERENCES, client_id="10.0.0.1", tenant="tenant:acme")
+    async for _ in job.subscribe():
+        pass
+    assert manager.tenant_remaining("tenant:acme") < 0
+    assert manager.tenant_remaining("10.0.0.1") == 0.1
+    # A fresh address does not reset the tenant's spend
+    with pytest.raises(AdmissionError):
+        await manager.submit({"holdings": []}, PREFERENCES, client_id="10.0.0.9", tenant="tenant:acme")
+
+
+def test_tenants_come_from_configured_api_keys(monkeypatch):
+    monkeypatch.setenv("TENANT_API_KEYS", "k-acme=acme,k-globex=globex")
+    manager = JobManager(runner=lambda portfolio, preferences: None, workers=1)
+    body = {"portfolio": PORTFOLIO, "preferences": PREFERENCES}
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        assert client.post("/api/sentiment/jobs", json=body, headers={"X-API-Key": "nope"}).status_code == 401
+        response = client.post("/api/sentiment/jobs", json=body, headers={"X-API-Key": "k-globex"})
+        assert response.status_code == 202
+        assert manager.get(response.json()["job_id"]).tenant == "tenant:globex"
+        response = client.post("/api/sentiment/jobs", json={**body, "stages": ["global_news"]})
+        assert manager.get(response.json()["job_id"]).tenant == "testclient"
+
+
+def test_budget_is_validated_and_becomes_a_job_option():
+    manager = JobManager(runner=lambda portfolio, preferences: None, workers=1)
+    body = {"portfolio": PORTFOLIO, "preferences": PREFERENCES}
+    with patch('marketpulse.main.get_job_manager', return_value=manager), TestClient(app) as client:
+        assert client.post("/api/sentiment/jobs", json={**body, "budget": {"max_tokens": -1}}).status_code == 422
+    assert flow_options(SentimentRequest(**body, budget={"max_cost_usd": 0.05})) == {"budget": {"max_cost_usd": 0.05}}
+    assert flow_options(SentimentRequest(**body, budget={})) == {}
@@ -0,0 +1,100 @@
+# tests/test_usage_log.py
+
+import json
+import os
+import pytest
+import time
+from unittest.mock import patch
+from marketpulse.cli import main
+from marketpulse.utils.usage import UsageLedger, record_api_call, set_usage_ledger, set_usage_stage
+from marketpulse.utils.usage_log import UsageRecorder, read_usage, summarize_usage
+
+
+def test_records_stay_in_memory_until_flushed(tmp_path):
+    recorder = UsageRecorder(str(tmp_path), flush_seconds=3600)
+    recorder.record("bing", "financial_news_search", "query", "AAPL earnings")
+    recorder.record("alphavantage", "stock_quote", "quote", "AAPL")
+    assert list(tmp_path.iterdir()) == []
+
+    assert recorder.flush() == 2
+    [path] = tmp_path.iterdir()
+    assert path.name.endswith(f"-{os.getpid()}.jsonl")
+    assert [record["provider"] for record in read_usage(str(tmp_path))] == ["bing", "alphavantage"]
+
+
+def test_full_batch_wakes_the_flusher(tmp_path):
+    recorder = UsageRecorder(str(tmp_path), flush_seconds=3600, flush_batch=2)
+    recorder.record("bing", "financial_news_search", "query", "a")
+    recorder.record("bing", "financial_news_search", "query", "b")
+    deadline = time.monotonic() + 2
+    while not list(read_usage(str(tmp_path))) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(list(read_usage(str(tmp_path)))) == 2
+
+
+def test_files_roll_over_and_partial_lines_are_skipped(tmp_path):
+    recorder = UsageRecorder(str(tmp_path), flush_seconds=3600, max_bytes=1)
+    for subject in ("a", "b"):
+        recorder.record("bing", "financial_news_search", "query", subject)
+        recorder.flush()
+    assert len(list(tmp_path.iterdir())) == 2
+
+    # Another worker's file, cut off mid-line when it was killed
+    day = next(read_usage(str(tmp_path)))["ts"][:10]
+    (tmp_path / f"usage-{day}-1.jsonl").write_text('{"provider":"bing","tool":"x"}\n{"provider":"bi')
+    assert len(list(read_usage(str(tmp_path)))) == 3
+
+
+def test_old_files_are_pruned(tmp_path):
+    (tmp_path / "usage-2000-01-01-1.jsonl").write_text("{}\n")
+    recorder = UsageRecorder(str(tmp_path), flush_seconds=3600, retention_days=30)
+    recorder.record("bing", "financial_news_search", "query", "a")
+    recorder.flush()
+    assert not (tmp_path / "usage-2000-01-01-1.jsonl").exists()
+
+
+def test_summary_groups_by_fields():
+    records = [
+        {"ts": "2026-01-02T10:00:00.000+00:00", "provider": "bing", "tool": "influencer_monitor", "tenant": "a"},
+        {"ts": "2026-01-02T11:00:00.000+00:00", "provider": "bing", "tool": "financial_news_search", "tenant": "a"},
+        {"ts": "2026-01-03T09:00:00.000+00:00", "provider": "bing", "tool": "financial_news_search"}
+    ]
+    assert summarize_usage(records, ["provider", "day"]) == [
+        {"provider": "bing", "day": "2026-01-02", "calls": 2},
+        {"provider": "bing", "day": "2026-01-03", "calls": 1}
+    ]
+    assert summarize_usage(records, ["tenant"]) == [{"tenant": "a", "calls": 2}, {"tenant": "-", "calls": 1}]
+    with pytest.raises(ValueError):
+        summarize_usage(records, ["model"])
+
+
+@pytest.mark.asyncio
+async def test_api_calls_carry_run_context(tmp_path):
+    # Async so the ledger is bound in this test's own task context only
+    recorder = UsageRecorder(str(tmp_path), flush_seconds=3600)
+    set_usage_ledger(UsageLedger(tenant="10.0.0.1", run_id="job-1"))
+    set_usage_stage("collect_global_news_task")
+    with patch('marketpulse.utils.usage.get_usage_recorder', return_value=recorder):
+        record_api_call("bing", "financial_news_search", "query", "markets")
+    recorder.flush()
+    [record] = read_usage(str(tmp_path))
+    assert record["tenant"] == "10.0.0.1"
+    assert record["run_id"] == "job-1"
+    assert record["stage"] == "collect_global_news_task"
+
+
+def test_cli_prints_summary(tmp_path, capsys):
+    recorder = UsageRecorder(str(tmp_path), flush_seconds=3600)
+    recorder.record("bing", "financial_news_search", "query", "a")
+    recorder.record("alphavantage", "stock_quote", "quote", "AAPL")
+    recorder.flush()
+
+    with patch('sys.argv', ["marketpulse", "usage", "--dir", str(tmp_path), "--by", "provider", "--json"]):
+        main()
+    rows = json.loads(capsys.readouterr().out)
+    assert sorted(row["provider"] for row in rows) == ["alphavantage", "bing"]
+
+    with patch('sys.argv', ["marketpulse", "usage", "--dir", str(tmp_path), "--by", "tool,day"]):
+        main()
+    output = capsys.readouterr().out
+    assert "financial_news_search" in output and "Total: 2 calls" in output
@@ -0,0 +1,90 @@
+# tests/test_wire_format.py
+
+import asyncio
+import json
+import zlib
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from marketpulse.demo import DemoStore
+from marketpulse.main import app
+from marketpulse.utils import wire_format
+from marketpulse.utils.wire_format import (
+    StreamCompressor, compress_stream, encode_event, negotiate_encoding, negotiate_format
+)
+
+EVENT = {"type": "task_complete", "task": "recommendations", "data": {"summary": "Hold", "weights": {1: 0.5}}}
+
+
+def test_format_negotiation():
+    assert negotiate_format(None) == "sse"
+    assert negotiate_format("text/event-stream") == "sse"
+    assert negotiate_format("application/x-ndjson, text/event-stream;q=0.5") == "ndjson"
+    assert negotiate_format("*/*") == "sse"
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding(None) is None
+
+
+def test_sse_and_ndjson_encoding():
+    sse = encode_event(EVENT, "sse", "run:3")
+    assert sse.startswith(b"id: run:3\ndata: ") and sse.endswith(b"\n\n")
+    assert json.loads(sse.split(b"data: ", 1)[1])["data"]["summary"] == "Hold"
+
+    line = encode_event(EVENT, "ndjson", "run:3")
+    assert line.endswith(b"\n") and line.count(b"\n") == 1
+    assert json.loads(line)["id"] == "run:3"
+
+
+def test_encoders_agree():
+    for name, encoder in wire_format.ENCODERS.items():
+        assert json.loads(encoder(EVENT)) == json.loads(json.dumps(EVENT)), name
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    packed = encode_event(EVENT, "msgpack", "run:0") + encode_event({"type": "complete"}, "msgpack", "run:1")
+    unpacker = msgpack.Unpacker(strict_map_key=False)
+    unpacker.feed(packed)
+    assert [event["type"] for event in unpacker] == ["task_complete", "complete"]
+
+
+@pytest.mark.asyncio
+async def test_gzip_stream_flushes_every_event():
+    async def chunks():
+        yield encode_event({"type": "status", "message": "Starting"})
+        yield encode_event({"type": "complete"})
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = []
+    async for compressed in compress_stream(chunks(), "gzip"):
+        # Each compressed chunk decodes on its own, so clients see events without waiting for the end
+        received.append(decompressor.decompress(compressed))
+    assert received[0].startswith(b"data: ")
+    assert b"".join(received).count(b"data: ") == 2
+
+
+def test_unknown_encoding_rejected():
+    with pytest.raises(ValueError):
+        StreamCompressor("zstd")
+
+
+def test_demo_endpoint_serves_ndjson_gzip(tmp_path):
+    async def runner(portfolio, preferences):
+        yield {"type": "status", "message": "Starting market sentiment analysis..."}
+        yield EVENT
+        yield {"type": "complete"}
+
+    store = DemoStore(path=str(tmp_path / "demo.json"), refresh_seconds=60, runner=runner)
+    asyncio.run(store.refresh())
+
+    with patch('marketpulse.main.get_demo_store', return_value=store), TestClient(app) as client:
+        response = client.get("/api/sentiment/demo", headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx transparently decompresses
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["type"] for event in events] == ["status", "task_complete", "complete"]
+    assert events[0]["id"] == f"{store.run_id}:0"
+    # Encoded once and reused for every visitor
+    assert store.encoded_events("ndjson") is store.encoded_events("ndjson")